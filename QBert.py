@@ -5,14 +5,60 @@ import math
 import random # Needed for enemy logic
 import time # Needed for timing enemy movement
 import os 
+import io
+import logging
+import copy
+import collections
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__)) # <--- ENSURE THIS LINE IS PRESENT AND CORRECT
 from ball import Ball # Import the Ball class
 from disc import Disc # Import the Disc class
+import gamelog # Logging setup (ring buffer + background writer)
+from assets import Asset, AssetLoader # Background asset loading
+from assetpack import AssetPack, PACK_FILE # Optional packed, pre-decoded assets
+from snapshot import GameSnapshot, ENTITY_ACTIVE, PLAYER_VISIBLE # Per-tick state copies for tools
+from simthread import SimulationThread, SnapshotBuffer, Stats # Optional split simulation/render threads
+from latency import LatencyHistogram # Input-to-screen latency
+from forecast import DangerForecast, ForecastTables, Track, HINT_RADIUS # Enemy danger forecast for bots and hints
+from levels import load_levels # Level definition files, compiled to per-level tables
+from presentation import Display, parse_size # Fixed-size framebuffer, scaled to the window
+from hopanim import Hop, build_hop_tables, FALL_DURATION, ENEMY_HOP_DURATION # Hop arcs drawn between cubes
+from renderquality import (QualityController, quality_setting, QUALITY_NAMES, QUALITY_FULL, QUALITY_NO_OUTLINES, # Adaptive render quality
+                           QUALITY_FLAT_TILES, QUALITY_LOW_RES)
+import telemetry # Gameplay event log
+
+# Per-subsystem loggers; ball.py and disc.py have their own
+game_logger = logging.getLogger("qbert.game")
+player_logger = logging.getLogger("qbert.player")
+coily_logger = logging.getLogger("qbert.coily")
+sound_logger = logging.getLogger("qbert.sound")
 
 # --- Constants ---
+# Logical framebuffer. The layout below is designed at BASE_WIDTH x BASE_HEIGHT; QBERT_RESOLUTION
+# (e.g. 400x350, same aspect) draws everything at a smaller size, and the display scales it up
+# (see presentation.py), so per-frame draw cost doesn't follow the window or screen size
+BASE_WIDTH = 800
+BASE_HEIGHT = 700
+MIN_LOGICAL_WIDTH = 320 # Smaller than this and the sprites lose their feet and noses
+
+def logical_scale(resolution):
+    """The layout scale for a QBERT_RESOLUTION value ("WxH" with the base aspect; empty for the base size)."""
+    if not resolution:
+        return 1
+    width, height = parse_size(resolution)
+    if width * BASE_HEIGHT != height * BASE_WIDTH or not MIN_LOGICAL_WIDTH <= width <= BASE_WIDTH:
+        raise ValueError(f"QBERT_RESOLUTION must be {BASE_WIDTH}x{BASE_HEIGHT} or a smaller size with "
+                         f"the same aspect, at least {MIN_LOGICAL_WIDTH} wide (e.g. 400x350), not {resolution!r}")
+    return width / BASE_WIDTH
+
+LOGICAL_SCALE = logical_scale(os.environ.get("QBERT_RESOLUTION"))
+
+def px(value):
+    """A length in the base layout, in logical pixels."""
+    return int(value * LOGICAL_SCALE + 0.5)
+
 # Screen dimensions
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 700
+SCREEN_WIDTH = px(BASE_WIDTH)
+SCREEN_HEIGHT = px(BASE_HEIGHT)
 
 # Colors (RGB) - VGA-like Palette
 VGA_BLACK = (0, 0, 0)
@@ -53,9 +99,9 @@ CUBES_PER_ROW = [i + 1 for i in range(PYRAMID_ROWS)]
 TOTAL_CUBES = sum(CUBES_PER_ROW)
 
 # Cube visual properties for drawing
-ISO_CUBE_WIDTH = 80          # Width of the top rhombus face
-ISO_CUBE_TOP_H = 50          # Height of the top rhombus face
-ISO_CUBE_SIDE_V_H = 50       # Vertical height of the side faces
+ISO_CUBE_WIDTH = px(80)      # Width of the top rhombus face
+ISO_CUBE_TOP_H = px(50)      # Height of the top rhombus face
+ISO_CUBE_SIDE_V_H = px(50)   # Vertical height of the side faces
 
 # Cube grid positioning properties
 GRID_COL_SPACING = ISO_CUBE_WIDTH      # Horizontal distance between cube centers in a row
@@ -63,17 +109,17 @@ GRID_ROW_SPACING = ISO_CUBE_TOP_H * 0.75 # Vertical distance between cube center
 
 # Pyramid positioning
 PYRAMID_TOP_X = SCREEN_WIDTH // 2
-PYRAMID_TOP_Y = 100 # Y-coordinate for the center of the top-most cube's top face
+PYRAMID_TOP_Y = px(100) # Y-coordinate for the center of the top-most cube's top face
 
 # Ball properties
 BALL_COLOR = VGA_RED
-BALL_RADIUS = 10
+BALL_RADIUS = px(10)
 BALL_MOVE_INTERVAL = 700 # Milliseconds between ball hops
 BALL_SPAWN_DELAY = 2000 # Milliseconds after level/life start for ball to appear
 
 # Disc properties
 DISC_COLOR = VGA_WHITE
-DISC_RADIUS = 25 # Approximate radius for drawing
+DISC_RADIUS = px(25) # Approximate radius for drawing
 DISC_COOLDOWN_DURATION = 5000 # 5 seconds
 # Adjusted X positions to be further from the pyramid
 DISC_LEFT_X = PYRAMID_TOP_X - GRID_COL_SPACING * 3.5 # Further left
@@ -88,16 +134,19 @@ DISC_JUMP_OFF_POINTS_LEFT = [(r, 0) for r in range(1, PYRAMID_ROWS)]
 DISC_JUMP_OFF_POINTS_RIGHT = [(r, r) for r in range(1, PYRAMID_ROWS)]
 
 # Player properties
-PLAYER_WIDTH = 20
-PLAYER_HEIGHT = 25
-PLAYER_FEET_HEIGHT = 5
-PLAYER_FEET_WIDTH = 6
-PLAYER_NOSE_SIZE = 4
+PLAYER_WIDTH = px(20)
+PLAYER_HEIGHT = px(25)
+PLAYER_FEET_HEIGHT = px(5)
+PLAYER_FEET_WIDTH = px(6)
+PLAYER_NOSE_SIZE = px(4)
 PLAYER_START_LIVES = 3
 
 # Enemy properties
-COILY_SNAKE_WIDTH = 18
-COILY_SNAKE_HEIGHT = 22
+COILY_SNAKE_WIDTH = px(18)
+COILY_SNAKE_HEIGHT = px(22)
+
+# Hop arcs, for this layout's scale
+HOP_TABLES = build_hop_tables(LOGICAL_SCALE)
 # COILY_MOVE_INTERVAL_SNAKE = 600 # Milliseconds between snake hops (REMOVED/COMMENTED)
 COILY_INTERVAL_LEVEL_1 = 1500  # Milliseconds for Coily's speed at level 1
 COILY_INTERVAL_LEVEL_10 = 500   # Milliseconds for Coily's speed at level 10 (max speed)
@@ -109,6 +158,8 @@ STATE_GAME_OVER = 2
 STATE_LEVEL_COMPLETE = 3 # This might be bypassed or repurposed
 STATE_PLAYER_DIED = 4
 STATE_SPLASH_SCREEN = 5
+STATE_NAMES = {STATE_PLAYING: "playing", STATE_GAME_OVER: "game over", STATE_LEVEL_COMPLETE: "level complete",
+               STATE_PLAYER_DIED: "player died", STATE_SPLASH_SCREEN: "splash screen"}
 
 
 # --- Sound System ---
@@ -125,23 +176,94 @@ sound_files = {
     "disc_ride": "level_complete.mp3", # Using level_complete for now
     "coily_fall": "fall.mp3" # Sound for Coily falling
 }
-loaded_sounds = {}
+loaded_sounds = {} # sound_name -> Sound, or None if its file could not be loaded
+BACKGROUND_MUSIC_FILE = 'background_music.mp3'
+FONT_NAME = 'Consolas'
+FONT_SIZE = px(30)
+SMALL_FONT_SIZE = px(20)
+DEFAULT_FONT_SIZE = px(35)       # pygame's built-in font runs smaller, so it gets a larger size
+SMALL_DEFAULT_FONT_SIZE = px(25)
 
 def play_sound(sound_name):
-    """Plays a sound effect, loading it if necessary."""
-    # ... (code to check if sound_name in sound_files or loaded_sounds) ...
+    """Plays a sound effect, loading it if the asset loader hasn't provided it yet."""
+    if not pygame.mixer.get_init(): # No audio (e.g. game logic driven headless by a tool)
+        return
+
+    if sound_name not in loaded_sounds:
+        file_name = sound_files[sound_name] # Get the base filename
+        file_path = os.path.join(SCRIPT_DIR, file_name)
+        try:
+            loaded_sounds[sound_name] = pygame.mixer.Sound(file_path)
+        except pygame.error as e:
+            sound_logger.error("Error loading sound %s from %s: %s", sound_name, file_path, e)
+            loaded_sounds[sound_name] = None # Don't retry the file on every play
+
+    sound = loaded_sounds[sound_name]
+    if sound is not None:
+        sound.play()
 
-    file_name = sound_files[sound_name] # Get the base filename
-    file_path = os.path.join(SCRIPT_DIR, file_name) # <--- THIS LINE BUILDS THE CORRECT FULL PATH
+def build_asset_loader():
+    """Declares the game's fonts, sound effects and music for the background asset loader."""
+    def load_file_bytes(file_name):
+        with open(os.path.join(SCRIPT_DIR, file_name), 'rb') as f:
+            return f.read()
+
+    def open_pack(deps):
+        # A missing pack is normal (e.g. running from a source checkout): use the loose files
+        pack_path = os.path.join(SCRIPT_DIR, PACK_FILE)
+        if not os.path.exists(pack_path):
+            return None
+        pack = AssetPack(pack_path)
+        if pack.mixer_format != pygame.mixer.get_init():
+            pack.close()
+            raise ValueError(f"{PACK_FILE} was built for mixer format {pack.mixer_format}, rebuild it with assetpack.py")
+        return pack
+
+    def load_sound_file(pack, file_name):
+        if pack is not None and file_name in pack:
+            return pack.sound(file_name) # Pre-decoded PCM, no file open or MP3 decode
+        return pygame.mixer.Sound(os.path.join(SCRIPT_DIR, file_name))
+
+    def load_music(pack):
+        if pack is not None and BACKGROUND_MUSIC_FILE in pack:
+            return pack.data(BACKGROUND_MUSIC_FILE)
+        return load_file_bytes(BACKGROUND_MUSIC_FILE)
+
+    game_assets = [
+        Asset("pack", open_pack), # Falls back to None, i.e. loose files
+        # Font lookup can be slow on machines with many fonts; a missing font falls back to pygame's default.
+        # SDL_ttf isn't thread-safe, so small_font waits for game_font: never two Fonts built at once
+        Asset("font_path", lambda deps: pygame.font.match_font(FONT_NAME)),
+        Asset("game_font", lambda deps: pygame.font.Font(deps["font_path"], FONT_SIZE), deps=["font_path"],
+              fallback=lambda deps: pygame.font.Font(None, DEFAULT_FONT_SIZE)),
+        Asset("small_font", lambda deps: pygame.font.Font(deps["font_path"], SMALL_FONT_SIZE), deps=["font_path", "game_font"],
+              fallback=lambda deps: pygame.font.Font(None, SMALL_DEFAULT_FONT_SIZE)),
+        # Music is only read here; the main loop hands it to the mixer whenever it arrives
+        Asset("music", lambda deps: load_music(deps["pack"]), deps=["pack"], critical=False),
+    ]
+    # One asset per file: several sound names share a file
+    for file_name in sorted(set(sound_files.values())):
+        game_assets.append(Asset(f"sfx:{file_name}",
+                                 lambda deps, file_name=file_name: load_sound_file(deps["pack"], file_name),
+                                 deps=["pack"]))
+    return AssetLoader(game_assets)
+
+def install_loaded_sounds(loader):
+    """Points every sound name at its decoded file from the loader."""
+    for sound_name, file_name in sound_files.items():
+        loaded_sounds[sound_name] = loader.get(f"sfx:{file_name}")
+
+def start_background_music(music_data):
+    if music_data is None:
+        return
     try:
-        sound = pygame.mixer.Sound(file_path) # Pygame now gets the full, correct path
-        loaded_sounds[sound_name] = sound
-        sound.play()
+        pygame.mixer.music.load(io.BytesIO(music_data), "mp3")
+        pygame.mixer.music.play(-1)
     except pygame.error as e:
-        print(f"Error loading/playing sound {sound_name} from {file_path}: {e}")
+        sound_logger.error("Error loading background music: %s", e)
 
 # --- Helper Functions ---
-def get_cube_screen_center_pos(grid_row, grid_col):
+def compute_cube_screen_center_pos(grid_row, grid_col):
     """Calculates the screen coordinates (x, y) for the CENTER of a cube's TOP FACE."""
     if not (0 <= grid_row < PYRAMID_ROWS and 0 <= grid_col < CUBES_PER_ROW[grid_row]):
         return None
@@ -153,9 +275,96 @@ def get_cube_screen_center_pos(grid_row, grid_col):
     screen_y = PYRAMID_TOP_Y + grid_row * GRID_ROW_SPACING
     return int(screen_x), int(screen_y)
 
+def grid_step_offset(dr, dc):
+    """Screen offset (dx, dy) of a hop by (dr, dc), including hops off the pyramid."""
+    return (dc - dr / 2.0) * GRID_COL_SPACING, dr * GRID_ROW_SPACING
+
+def compute_coily_moves(grid_row, grid_col, rows=PYRAMID_ROWS):
+    """Coily's possible (delta row, delta col) hops from a cube, in the order the AI tries them."""
+    possible_moves = []
+    # Potential moves down-left and down-right from current position
+    # (relative to Coily's current grid position)
+    # For Coily, moving "down" the pyramid means increasing row index
+    if grid_row + 1 < rows:
+        # Down-left from Coily's perspective on the grid
+        if grid_col < CUBES_PER_ROW[grid_row + 1]:
+            possible_moves.append((1, 0)) # dr=1 (down), dc=0 (left relative to next row start)
+        # Down-right from Coily's perspective on the grid
+        if grid_col + 1 < CUBES_PER_ROW[grid_row + 1]:
+             possible_moves.append((1, 1)) # dr=1 (down), dc=1 (right relative to next row start)
+
+    # Potential moves up-left and up-right
+    # For Coily, moving "up" the pyramid means decreasing row index
+    if grid_row - 1 >= 0:
+        # Up-left
+        if grid_col -1 >= 0 and grid_col -1 < CUBES_PER_ROW[grid_row -1]:
+             possible_moves.append((-1, -1)) # dr=-1 (up), dc=-1 (left relative to current col)
+        # Up-right
+        if grid_col >=0 and grid_col < CUBES_PER_ROW[grid_row-1]:
+             possible_moves.append((-1, 0)) # dr=-1 (up), dc=0 (right relative to current col)
+    return tuple(possible_moves)
+
+def compute_coily_interval(level):
+    """Milliseconds between Coily's hops on a level, speeding up linearly until MAX_LEVEL_FOR_SPEED_SCALING."""
+    level_for_calc = min(level, MAX_LEVEL_FOR_SPEED_SCALING)
+
+    if level_for_calc <= 1:
+        current_coily_interval = COILY_INTERVAL_LEVEL_1
+    elif level_for_calc >= MAX_LEVEL_FOR_SPEED_SCALING:
+        current_coily_interval = COILY_INTERVAL_LEVEL_10
+    else:
+        scale_factor = (level_for_calc - 1) / (MAX_LEVEL_FOR_SPEED_SCALING - 1)
+        current_coily_interval = COILY_INTERVAL_LEVEL_1 - (COILY_INTERVAL_LEVEL_1 - COILY_INTERVAL_LEVEL_10) * scale_factor
+    
+    return int(current_coily_interval)
+
+# --- Pyramid Tables ---
+# Computed once per pyramid size and shared read-only by every GameSession in the process
+PyramidTables = collections.namedtuple("PyramidTables", [
+    "rows",
+    "cells",       # (row, col) in pyramid_cubes order; a smaller pyramid's cells are a prefix of a bigger one's
+    "index",       # (row, col) -> index in cells
+    "coily_moves", # (row, col) -> Coily's hops that stay on this pyramid
+    "forecast",    # forecast.ForecastTables, filled in as sessions ask for forecasts
+])
+_pyramid_tables = {}
+
+def pyramid_tables(rows):
+    """The shared tables for a pyramid of `rows` rows (at most PYRAMID_ROWS, which the screen is laid out for)."""
+    tables = _pyramid_tables.get(rows)
+    if tables is None:
+        cells = [(r, c) for r in range(rows) for c in range(CUBES_PER_ROW[r])]
+        coily_moves = {cell: compute_coily_moves(*cell, rows) for cell in cells}
+        tables = _pyramid_tables[rows] = PyramidTables(rows, cells, {cell: i for i, cell in enumerate(cells)},
+                                                       coily_moves, ForecastTables(cells, coily_moves))
+    return tables
+
+FULL_PYRAMID = pyramid_tables(PYRAMID_ROWS)
+CUBE_CELLS = FULL_PYRAMID.cells
+CUBE_INDEX = FULL_PYRAMID.index
+CUBE_SCREEN_POS = {cell: compute_cube_screen_center_pos(*cell) for cell in CUBE_CELLS}
+COILY_MOVES = FULL_PYRAMID.coily_moves
+COILY_INTERVALS = [compute_coily_interval(level) for level in range(MAX_LEVEL_FOR_SPEED_SCALING + 1)]
+
+# --- Levels ---
+# Each level's pyramid, cube colors and landing rule, enemies and timings, see levels.py
+LEVELS_DIR = os.path.join(SCRIPT_DIR, "levels")
+LEVEL_DEFAULTS = {
+    "max_rows": PYRAMID_ROWS,
+    "coily_intervals": COILY_INTERVALS, # Coily speeds up with the level unless a file sets coily_interval
+    "ball_interval": BALL_MOVE_INTERVAL,
+    "ball_spawn_delay": BALL_SPAWN_DELAY,
+}
+BUILTIN_LEVEL = {"name": "Classic", "colors": [list(map(list, INITIAL_CUBE_COLORS)), list(map(list, TARGET_CUBE_COLORS))]}
+LEVELS = load_levels(LEVELS_DIR, LEVEL_DEFAULTS, BUILTIN_LEVEL) # Used by sessions not given their own LevelTable
+
+def get_cube_screen_center_pos(grid_row, grid_col):
+    """Screen coordinates (x, y) of the center of a cube's top face, or None off the pyramid."""
+    return CUBE_SCREEN_POS.get((grid_row, grid_col))
+
 def draw_iso_cube_detailed(surface, center_x, center_y, width, top_h, side_v_h,
                            color_top, color_left_side, color_right_side, color_outline):
-    """Draws an isometric cube with distinct top, left, and right faces."""
+    """Draws an isometric cube with distinct top, left, and right faces; color_outline None skips outlines."""
     half_width = width // 2
     half_top_h = top_h // 2
 
@@ -179,18 +388,73 @@ def draw_iso_cube_detailed(surface, center_x, center_y, width, top_h, side_v_h,
     # Points: top-left of top face, bottom-of-top-face, bottom-front-of-cube, bottom-left-of-side
     left_face_points = [p_top_left, p_top_bottom, p_side_bottom_mid, p_side_bottom_left]
     pygame.draw.polygon(surface, color_left_side, left_face_points)
-    pygame.draw.polygon(surface, color_outline, left_face_points, 1)
+    if color_outline is not None:
+        pygame.draw.polygon(surface, color_outline, left_face_points, 1)
 
     # Right side face polygon
     # Points: top-right-of-top-face, bottom-of-top-face, bottom-front-of-cube, bottom-right-of-side
     right_face_points = [p_top_right, p_top_bottom, p_side_bottom_mid, p_side_bottom_right]
     pygame.draw.polygon(surface, color_right_side, right_face_points)
-    pygame.draw.polygon(surface, color_outline, right_face_points, 1)
+    if color_outline is not None:
+        pygame.draw.polygon(surface, color_outline, right_face_points, 1)
 
     # Top face polygon (drawn last to be on top)
     top_face_points = [p_top_tip, p_top_left, p_top_bottom, p_top_right]
     pygame.draw.polygon(surface, color_top, top_face_points)
-    pygame.draw.polygon(surface, color_outline, top_face_points, 1)
+    if color_outline is not None:
+        pygame.draw.polygon(surface, color_outline, top_face_points, 1)
+
+# --- Reduced Quality Drawing ---
+# Used when frames run over budget, see renderquality.py
+TILE_COLORKEY = (255, 0, 255) # Not a game color; transparent around a cube tile
+LOW_RES_SCALE = 2
+# Screen area the full pyramid covers; the low resolution pass only scales up this much
+PYRAMID_AREA = pygame.Rect(PYRAMID_TOP_X - GRID_COL_SPACING * (PYRAMID_ROWS - 1) / 2 - ISO_CUBE_WIDTH // 2,
+                           PYRAMID_TOP_Y - ISO_CUBE_TOP_H // 2,
+                           GRID_COL_SPACING * (PYRAMID_ROWS - 1) + ISO_CUBE_WIDTH + 2,
+                           GRID_ROW_SPACING * (PYRAMID_ROWS - 1) + ISO_CUBE_TOP_H + ISO_CUBE_SIDE_V_H + 2)
+_cube_tiles = {} # (colors, scale) -> Surface
+_low_res_surface = None # Reused by draw_pyramid_low_res()
+
+def get_cube_tile(colors, scale=1):
+    """A cube drawn once without outlines, for blitting with its top face center at (width // 2, top_h // 2)."""
+    tile = _cube_tiles.get((colors, scale))
+    if tile is None:
+        width, top_h, side_v_h = ISO_CUBE_WIDTH // scale, ISO_CUBE_TOP_H // scale, ISO_CUBE_SIDE_V_H // scale
+        tile = pygame.Surface((width + 1, top_h + side_v_h + 1))
+        if pygame.display.get_surface() is not None:
+            tile = tile.convert() # Same pixel format as the screen, so blits need no conversion
+        tile.fill(TILE_COLORKEY)
+        draw_iso_cube_detailed(tile, width // 2, top_h // 2, width, top_h, side_v_h, *colors, None)
+        tile.set_colorkey(TILE_COLORKEY, pygame.RLEACCEL)
+        _cube_tiles[(colors, scale)] = tile
+    return tile
+
+def draw_pyramid_low_res(surface, cubes):
+    """Fills the background and draws the cubes at 1/LOW_RES_SCALE size, scaled up over the pyramid's area."""
+    global _low_res_surface
+    screen_rect = surface.get_rect()
+    area = PYRAMID_AREA.clip(screen_rect)
+    size = (-(-area.width // LOW_RES_SCALE) + 7 & ~7, area.height // LOW_RES_SCALE) # SDL fills odd widths much slower
+    area = pygame.Rect(area.topleft, (size[0] * LOW_RES_SCALE, size[1] * LOW_RES_SCALE)).clip(screen_rect)
+    size = (area.width // LOW_RES_SCALE, area.height // LOW_RES_SCALE)
+    # Background around the pyramid's area only; the scaled-up pass covers the rest
+    surface.fill(COLOR_BACKGROUND, (0, 0, screen_rect.width, area.top))
+    surface.fill(COLOR_BACKGROUND, (0, area.bottom, screen_rect.width, screen_rect.height - area.bottom))
+    surface.fill(COLOR_BACKGROUND, (0, area.top, area.left, area.height))
+    surface.fill(COLOR_BACKGROUND, (area.right, area.top, screen_rect.width - area.right, area.height))
+    if _low_res_surface is None or _low_res_surface.get_size() != size:
+        _low_res_surface = pygame.Surface(size)
+        if pygame.display.get_surface() is not None:
+            _low_res_surface = _low_res_surface.convert()
+    small = _low_res_surface
+    small.fill(COLOR_BACKGROUND)
+    for cube in cubes:
+        if cube.screen_center_pos:
+            x, y = cube.screen_center_pos
+            small.blit(get_cube_tile(cube.current_colors, LOW_RES_SCALE),
+                       ((x - area.x - ISO_CUBE_WIDTH // 2) // LOW_RES_SCALE, (y - area.y - ISO_CUBE_TOP_H // 2) // LOW_RES_SCALE))
+    pygame.transform.scale(small, area.size, surface.subsurface(area))
 
 
 # --- Classes ---
@@ -205,30 +469,45 @@ class Cube:
         self.target_colors = target_colors   # Tuple: (top, left, right)
         self.current_colors = initial_colors
         self.screen_center_pos = get_cube_screen_center_pos(grid_row, grid_col)
-        self.is_target_color = False # Based on the top face's color state
-
-    def change_color(self):
-        """Changes the cube's color set to the target color set."""
-        if self.current_colors[0] == self.initial_colors[0]: # Check based on top color
-            self.current_colors = self.target_colors
-            self.is_target_color = True
-            play_sound("change_color")
-            return True
-        return False
+        self.step = 0 # Index into the level's color steps
+        self.is_target_color = False # True on the level's target step
+
+    def use_level(self, rules):
+        """Takes a level's first and target colors (levels.LevelRules) and goes back to the first."""
+        self.initial_colors = rules.colors[0]
+        self.target_colors = rules.colors[rules.target]
+        self.reset_color()
+
+    def land(self, rules):
+        """Moves the cube to the color step the level's landing rule gives; True if that changed it."""
+        step = rules.next_step[self.step]
+        if step == self.step:
+            return False
+        self.step = step
+        self.current_colors = rules.colors[step]
+        self.is_target_color = rules.is_target[step]
+        play_sound("change_color")
+        return True
 
     def reset_color(self):
         """Resets the cube to its initial color set."""
+        self.step = 0
         self.current_colors = self.initial_colors
         self.is_target_color = False
 
-    def draw(self, surface):
+    def draw(self, surface, quality=QUALITY_FULL):
         """Draws the cube on the screen."""
         if self.screen_center_pos:
+            if quality >= QUALITY_FLAT_TILES:
+                tile = get_cube_tile(self.current_colors)
+                surface.blit(tile, (self.screen_center_pos[0] - ISO_CUBE_WIDTH // 2,
+                                    self.screen_center_pos[1] - ISO_CUBE_TOP_H // 2))
+                return
             draw_iso_cube_detailed(surface,
                                    self.screen_center_pos[0], self.screen_center_pos[1],
                                    ISO_CUBE_WIDTH, ISO_CUBE_TOP_H, ISO_CUBE_SIDE_V_H,
                                    self.current_colors[0], self.current_colors[1], self.current_colors[2],
-                                   COLOR_OUTLINE)
+                                   COLOR_OUTLINE if quality == QUALITY_FULL else None)
 
 class Player:
     """Represents the player character (Q*bert)."""
@@ -237,14 +516,16 @@ class Player:
         self.start_col = start_col
         self.grid_row = start_row
         self.grid_col = start_col
+        self.pyramid_rows = PYRAMID_ROWS # Of the current level's pyramid
         self.update_screen_pos()
         self.lives = PLAYER_START_LIVES
         self.is_active = True
         self.is_visible = True # For teleportation visual cue
+        self.hop = None # hopanim.Hop being drawn, if any
 
     def update_screen_pos(self):
         """Updates the player's screen position based on grid position."""
-        pos = get_cube_screen_center_pos(self.grid_row, self.grid_col)
+        pos = get_cube_screen_center_pos(self.grid_row, self.grid_col) if self.grid_row < self.pyramid_rows else None
         if pos:
             # Player's center Y should be slightly above the center of the cube's top face
             self.screen_x = pos[0]
@@ -263,7 +544,7 @@ class Player:
         new_row = self.grid_row + dr
         new_col = self.grid_col + dc
 
-        if 0 <= new_row < PYRAMID_ROWS and 0 <= new_col < CUBES_PER_ROW[new_row]:
+        if 0 <= new_row < self.pyramid_rows and 0 <= new_col < CUBES_PER_ROW[new_row]:
             self.grid_row = new_row
             self.grid_col = new_col
             if not self.update_screen_pos(): # Should not fail if grid pos is valid
@@ -283,6 +564,7 @@ class Player:
         self.grid_col = self.start_col
         self.update_screen_pos()
         self.is_active = True
+        self.hop = None
 
     def reset_lives(self):
         self.lives = PLAYER_START_LIVES
@@ -291,18 +573,22 @@ class Player:
         self.lives -= 1
         self.is_active = False
         play_sound("player_die")
-        print(f"Player died! Lives left: {self.lives}")
-
-    def draw(self, surface):
-        if not self.is_visible:
-            return
-            
-        if self.screen_x > 0 and self.is_active:
-            # Simple blocky player
+        player_logger.info("Player died! Lives left: %d", self.lives)
+
+    def draw(self, surface, outlines=True, now=None):
+        """Draws Q*bert at rest, or along his hop at tick `now` (also while falling or riding a disc)."""
+        pose = self.hop.at(now) if self.hop is not None and now is not None else None
+        if pose is None and self.is_visible and self.screen_x > 0 and self.is_active:
+            pose = (self.screen_x, self.screen_y, 1, 1)
+
+        if pose is not None:
+            x, y, squash_x, squash_y = pose
+            # Simple blocky player; squashing keeps the feet where they'd be at rest
+            width, height = round(PLAYER_WIDTH * squash_x), round(PLAYER_HEIGHT * squash_y)
             body_rect = pygame.Rect(
-                self.screen_x - PLAYER_WIDTH // 2,
-                self.screen_y - PLAYER_HEIGHT // 2,
-                PLAYER_WIDTH, PLAYER_HEIGHT
+                x - width // 2,
+                y - PLAYER_HEIGHT // 2 + PLAYER_HEIGHT - height,
+                width, height
             )
             pygame.draw.rect(surface, COLOR_PLAYER_BODY, body_rect)
 
@@ -322,35 +608,33 @@ class Player:
             pygame.draw.rect(surface, COLOR_PLAYER_NOSE_BG, nose_rect)
 
             # Outlines
-            pygame.draw.rect(surface, COLOR_OUTLINE, body_rect, 1)
-            pygame.draw.rect(surface, COLOR_OUTLINE, foot_left_rect, 1)
-            pygame.draw.rect(surface, COLOR_OUTLINE, foot_right_rect, 1)
+            if outlines:
+                pygame.draw.rect(surface, COLOR_OUTLINE, body_rect, 1)
+                pygame.draw.rect(surface, COLOR_OUTLINE, foot_left_rect, 1)
+                pygame.draw.rect(surface, COLOR_OUTLINE, foot_right_rect, 1)
 
 
     def get_current_cube_index(self):
         if not self.is_active: return -1
-        if not (0 <= self.grid_row < PYRAMID_ROWS and 0 <= self.grid_col < CUBES_PER_ROW[self.grid_row]):
-            return -1 # Player is off the valid grid
-        index = 0
-        for r in range(self.grid_row):
-            index += CUBES_PER_ROW[r]
-        index += self.grid_col
-        return index
+        if self.grid_row >= self.pyramid_rows: return -1
+        return CUBE_INDEX.get((self.grid_row, self.grid_col), -1) # -1: off the valid grid
 
 class Enemy:
     """Represents the Coily enemy."""
-    def __init__(self):
+    def __init__(self, session):
+        self.session = session # The GameSession whose disc-chase flags and score Coily uses
         self.reset()
         self.last_move_time = pygame.time.get_ticks()
 
     def reset(self):
-        self.grid_row = PYRAMID_ROWS - 1
+        self.grid_row = self.session.pyramid.rows - 1
         self.grid_col = random.randint(0, CUBES_PER_ROW[self.grid_row] - 1)
         self.is_snake = True # Always starts as snake
-        self.is_active = True
+        self.is_active = self.session.rules.coily # Not every level has Coily
+        self.hop = None # hopanim.Hop being drawn, if any
         self.update_screen_pos()
         self.last_move_time = pygame.time.get_ticks()
-        print(f"Coily reset as snake at ({self.grid_row}, {self.grid_col})")
+        coily_logger.debug("Coily reset as snake at (%d, %d)", self.grid_row, self.grid_col)
 
     def update_screen_pos(self):
         pos = get_cube_screen_center_pos(self.grid_row, self.grid_col)
@@ -360,27 +644,30 @@ class Enemy:
             return True
         else:
             if self.is_active:
-                print(f"Coily position invalid ({self.grid_row}, {self.grid_col}) - Deactivating")
+                coily_logger.debug("Coily position invalid (%d, %d) - Deactivating", self.grid_row, self.grid_col)
             self.is_active = False
             self.screen_x = -100
             self.screen_y = -100
             return False
 
     def move(self, player_pos):
-        global current_level, coily_chasing_disc, qbert_used_disc_coord, qbert_disc_jump_deltas # Access global flags
+        session = self.session
 
         if not self.is_active: return
 
         current_time = pygame.time.get_ticks()
 
         # Coily AI modification for disc chasing
-        if coily_chasing_disc and qbert_used_disc_coord:
-            target_row, target_col = qbert_used_disc_coord
+        if session.coily_chasing_disc and session.qbert_used_disc_coord:
+            target_row, target_col = session.qbert_used_disc_coord
 
             if self.grid_row == target_row and self.grid_col == target_col:
                 # Coily is on the jump-off cube, make the "fooled" jump
-                if qbert_disc_jump_deltas:
-                    dr_off, dc_off = qbert_disc_jump_deltas
+                if session.qbert_disc_jump_deltas:
+                    dr_off, dc_off = session.qbert_disc_jump_deltas
+                    dx, dy = grid_step_offset(dr_off, dc_off)
+                    self.hop = Hop(HOP_TABLES.fall, current_time, FALL_DURATION, (self.screen_x, self.screen_y),
+                                   (self.screen_x + dx, self.screen_y + dy))
                     
                     self.grid_row += dr_off
                     self.grid_col += dc_off
@@ -388,20 +675,16 @@ class Enemy:
 
                     play_sound("coily_fall")
                     self.is_active = False
-                    print(f"Coily fooled and jumped off from ({target_row},{target_col}) following Q*bert's jump ({dr_off}, {dc_off})!")
-                    score += 500 # Bonus for fooling Coily
+                    coily_logger.info("Coily fooled and jumped off from (%d,%d) following Q*bert's jump (%d, %d)!", target_row, target_col, dr_off, dc_off)
+                    session.score += 500 # Bonus for fooling Coily
+                    session.log_event(telemetry.EVENT_COILY_FOOLED, target_row, target_col)
 
-                    # Reset global flags for Coily's chase
-                    coily_chasing_disc = False
-                    qbert_used_disc_coord = None
-                    qbert_disc_jump_deltas = None
+                    session.clear_disc_chase()
                     return # Coily's turn is over
                 else: # Should not happen if flags are set correctly
-                    print("Error: Coily on disc jump coord but no jump deltas for Q*bert found.")
+                    coily_logger.error("Coily on disc jump coord but no jump deltas for Q*bert found.")
                     # Fallback to normal behavior or just reset flags
-                    coily_chasing_disc = False
-                    qbert_used_disc_coord = None
-                    qbert_disc_jump_deltas = None
+                    session.clear_disc_chase()
                     # Continue with normal AI for this turn but targeting player
                     player_row_target, player_col_target = player_pos
             else:
@@ -411,19 +694,8 @@ class Enemy:
             # Normal chase: player_pos is Q*bert's current actual position
             player_row_target, player_col_target = player_pos
 
-        # Dynamically calculate Coily's move interval based on current_level
-        level_for_calc = min(current_level, MAX_LEVEL_FOR_SPEED_SCALING)
-
-        if level_for_calc <= 1:
-            current_coily_interval = COILY_INTERVAL_LEVEL_1
-        elif level_for_calc >= MAX_LEVEL_FOR_SPEED_SCALING:
-            current_coily_interval = COILY_INTERVAL_LEVEL_10
-        else:
-            scale_factor = (level_for_calc - 1) / (MAX_LEVEL_FOR_SPEED_SCALING - 1)
-            current_coily_interval = COILY_INTERVAL_LEVEL_1 - (COILY_INTERVAL_LEVEL_1 - COILY_INTERVAL_LEVEL_10) * scale_factor
-        
-        current_coily_interval = int(current_coily_interval)
-
+        # Coily's move interval comes from the level's rules (by default it speeds up with the level)
+        current_coily_interval = session.rules.coily_interval
 
         if current_time - self.last_move_time > current_coily_interval:
             self.last_move_time = current_time
@@ -439,31 +711,10 @@ class Enemy:
             # If player is below, Coily will try to move towards one of the two spots on the row below.
             # This is a common Q*bert AI pattern for Coily.
 
-            possible_moves = []
-            # Potential moves down-left and down-right from current position
-            # (relative to Coily's current grid position)
-            # For Coily, moving "down" the pyramid means increasing row index
-            if self.grid_row + 1 < PYRAMID_ROWS:
-                # Down-left from Coily's perspective on the grid
-                if self.grid_col < CUBES_PER_ROW[self.grid_row + 1]:
-                    possible_moves.append((1, 0)) # dr=1 (down), dc=0 (left relative to next row start)
-                # Down-right from Coily's perspective on the grid
-                if self.grid_col + 1 < CUBES_PER_ROW[self.grid_row + 1]:
-                     possible_moves.append((1, 1)) # dr=1 (down), dc=1 (right relative to next row start)
-
-            # Potential moves up-left and up-right
-            # For Coily, moving "up" the pyramid means decreasing row index
-            if self.grid_row - 1 >= 0:
-                # Up-left
-                if self.grid_col -1 >= 0 and self.grid_col -1 < CUBES_PER_ROW[self.grid_row -1]:
-                     possible_moves.append((-1, -1)) # dr=-1 (up), dc=-1 (left relative to current col)
-                # Up-right
-                if self.grid_col >=0 and self.grid_col < CUBES_PER_ROW[self.grid_row-1]:
-                     possible_moves.append((-1, 0)) # dr=-1 (up), dc=0 (right relative to current col)
-
+            possible_moves = session.pyramid.coily_moves.get((self.grid_row, self.grid_col), ()) # Only hops that stay on the pyramid
 
             if not possible_moves: # No valid moves (e.g., stuck at top)
-                if self.is_active: print(f"Coily has no valid moves from ({self.grid_row}, {self.grid_col})")
+                if self.is_active: coily_logger.debug("Coily has no valid moves from (%d, %d)", self.grid_row, self.grid_col)
                 # self.is_active = False # Or Coily just stays put
                 return
 
@@ -474,10 +725,6 @@ class Enemy:
 
             for move_dr, move_dc in possible_moves:
                 next_row, next_col = self.grid_row + move_dr, self.grid_col + move_dc
-                # Ensure the calculated next_col is valid for next_row
-                if not (0 <= next_row < PYRAMID_ROWS and 0 <= next_col < CUBES_PER_ROW[next_row]):
-                    continue
-
                 dist_sq = (next_row - player_row_target)**2 + (next_col - player_col_target)**2
                 if dist_sq < min_dist_sq:
                     min_dist_sq = dist_sq
@@ -498,26 +745,37 @@ class Enemy:
             final_new_col = self.grid_col + dc
 
             # Final check, though the loop should ensure this
-            if 0 <= final_new_row < PYRAMID_ROWS and 0 <= final_new_col < CUBES_PER_ROW[final_new_row]:
+            if (final_new_row, final_new_col) in session.pyramid.index:
+                start_pos = (self.screen_x, self.screen_y)
                 self.grid_row = final_new_row
                 self.grid_col = final_new_col
                 self.update_screen_pos()
+                self.hop = Hop(HOP_TABLES.diagonal[(dr, dc)], current_time, min(ENEMY_HOP_DURATION, current_coily_interval),
+                               start_pos, (self.screen_x, self.screen_y))
             else:
                 if self.is_active:
-                    print(f"Coily attempted invalid final move from ({self.grid_row-dr},{self.grid_col-dc}) to ({final_new_row},{final_new_col}). Deactivating.")
+                    coily_logger.warning("Coily attempted invalid final move from (%d,%d) to (%d,%d). Deactivating.", self.grid_row - dr, self.grid_col - dc, final_new_row, final_new_col)
                 self.is_active = False # Fell off
                 self.screen_x = -100
 
 
-    def draw(self, surface):
-        if self.screen_x > 0 and self.is_active:
+    def draw(self, surface, outlines=True, now=None):
+        """Draws Coily at rest, or along its hop at tick `now` (also while falling off)."""
+        pose = self.hop.at(now) if self.hop is not None and now is not None else None
+        if pose is None and self.screen_x > 0 and self.is_active:
+            pose = (self.screen_x, self.screen_y, 1, 1)
+
+        if pose is not None:
+            x, y, squash_x, squash_y = pose
+            width, height = round(COILY_SNAKE_WIDTH * squash_x), round(COILY_SNAKE_HEIGHT * squash_y)
             body_rect = pygame.Rect(
-                self.screen_x - COILY_SNAKE_WIDTH // 2,
-                self.screen_y - COILY_SNAKE_HEIGHT // 2,
-                COILY_SNAKE_WIDTH, COILY_SNAKE_HEIGHT
+                x - width // 2,
+                y - COILY_SNAKE_HEIGHT // 2 + COILY_SNAKE_HEIGHT - height,
+                width, height
             )
             pygame.draw.rect(surface, COLOR_COILY_SNAKE, body_rect)
-            pygame.draw.rect(surface, COLOR_OUTLINE, body_rect, 1)
+            if outlines:
+                pygame.draw.rect(surface, COLOR_OUTLINE, body_rect, 1)
 
             # Eyes
             eye_size = 3
@@ -527,496 +785,1147 @@ class Enemy:
             pygame.draw.circle(surface, COLOR_COILY_EYES, (body_rect.centerx + eye_x_offset, body_rect.centery - eye_y_offset), eye_size // 2)
 
 
-# --- Game Reset Function ---
-def reset_game():
-    global score, game_state, player, coily, pyramid_cubes, player_death_timer, current_level, red_ball, ball_activation_time, left_disc, right_disc, coily_chasing_disc, qbert_used_disc_coord, qbert_disc_jump_deltas
-    print("Resetting game...")
-    score = 0
-    current_level = 1 # Reset level to 1
-    player.reset_lives()
-    player.reset_position()
-    coily.reset() 
-
-    if 'red_ball' in globals(): 
-        red_ball.is_active = False 
-    ball_activation_time = pygame.time.get_ticks() + BALL_SPAWN_DELAY
-
-    if 'left_disc' in globals() and 'right_disc' in globals():
-        left_disc.activate()
-        right_disc.activate()
-    
-    # Reset Coily disc chase flags
-    coily_chasing_disc = False
-    qbert_used_disc_coord = None
-    qbert_disc_jump_deltas = None
-
-    for cube in pyramid_cubes:
-        cube.reset_color()
-
-    start_cube_index = player.get_current_cube_index()
-    if 0 <= start_cube_index < len(pyramid_cubes):
-        pyramid_cubes[start_cube_index].change_color() # Initial landing
-
-    game_state = STATE_PLAYING
-    player_death_timer = 0 # Reset death timer
-
-
-def start_next_level():
-    global game_state, player, coily, pyramid_cubes, player_death_timer, current_level, red_ball, ball_activation_time, left_disc, right_disc, coily_chasing_disc, qbert_used_disc_coord, qbert_disc_jump_deltas
-    print(f"Starting next level: {current_level}")
-
-    player.reset_position()
-    player.is_active = True 
-
-    coily.reset()
-    coily.is_active = True
-
-    if 'red_ball' in globals():
-        red_ball.is_active = False 
-    ball_activation_time = pygame.time.get_ticks() + BALL_SPAWN_DELAY
-    
-    if 'left_disc' in globals() and 'right_disc' in globals():
-        left_disc.activate()
-        right_disc.activate()
-
-    # Reset Coily disc chase flags
-    coily_chasing_disc = False
-    qbert_used_disc_coord = None
-    qbert_disc_jump_deltas = None
-
-    for cube in pyramid_cubes:
-        cube.reset_color()
-
-    start_cube_index = player.get_current_cube_index()
-    if 0 <= start_cube_index < len(pyramid_cubes):
-        pyramid_cubes[start_cube_index].change_color() # No score for this initial landing
-
-    game_state = STATE_PLAYING
-    player_death_timer = 0
-
-
-# --- Game Setup ---
-pygame.init()
-pygame.mixer.init() 
-pygame.font.init()
-
-try:
-    background_music_filename = 'background_music.mp3' # Define the filename
-    background_music_path = os.path.join(SCRIPT_DIR, background_music_filename) # <--- BUILD FULL PATH
-    pygame.mixer.music.load(background_music_path) # <--- USE FULL PATH
-    pygame.mixer.music.play(-1)
-except pygame.error as e:
-    # The error message you see is coming from this print statement
-    print(f"Error loading background music: {e}")
-
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Q*bert VGA Style")
-clock = pygame.time.Clock()
-
-try:
-    game_font = pygame.font.SysFont('Consolas', 30) # Or "Arial"
-    small_font = pygame.font.SysFont('Consolas', 20)
-except pygame.error:
-    game_font = pygame.font.Font(None, 35) # Fallback
-    small_font = pygame.font.Font(None, 25)
-
-pyramid_cubes = []
-for r in range(PYRAMID_ROWS):
-    for c in range(CUBES_PER_ROW[r]):
-        pyramid_cubes.append(Cube(r, c))
-
-player = Player(0, 0) # Start player at the top cube (0,0)
-coily = Enemy()
-# Initialize the red ball - start it inactive. Its initial_start_row/col from Ball's __init__
-# will be used if reset() is called without arguments before activation.
-# Pass the required functions and configurations to the Ball constructor.
-red_ball = Ball(
-    start_row=0, 
-    start_col=0, 
-    color=BALL_COLOR, 
-    radius=BALL_RADIUS, 
-    move_interval=BALL_MOVE_INTERVAL,
-    get_cube_screen_center_pos_func=get_cube_screen_center_pos,
-    play_sound_func=play_sound,
-    pyramid_rows_config=PYRAMID_ROWS,
-    cubes_per_row_config=CUBES_PER_ROW
-)
-red_ball.is_active = False 
-ball_activation_time = 0 
-
-# Initialize Discs
-left_disc = Disc(DISC_LEFT_X, DISC_LEFT_Y, DISC_RADIUS, DISC_COLOR, DISC_COOLDOWN_DURATION)
-right_disc = Disc(DISC_RIGHT_X, DISC_RIGHT_Y, DISC_RADIUS, DISC_COLOR, DISC_COOLDOWN_DURATION) # Corrected typo
-# Activate discs initially (will also be done in reset_game)
-left_disc.activate()
-right_disc.activate()
-
-
-score = 0
-current_level = 1  # Initialize current level
-game_state = STATE_PLAYING
-player_death_timer = 0
+# --- Game Session ---
 PLAYER_DEATH_PAUSE = 1500 # Milliseconds for player death pause
-splash_screen_start_time = 0 # For level complete splash screen
-
-# Player teleportation state
-player_is_teleporting = False
-player_teleport_start_time = 0
-player_teleport_duration = 500 # 0.5 seconds
-player_target_after_teleport = (0,0) # Always teleport to top cube
-
-# Coily disc chase global flags
-qbert_used_disc_coord = None 
-qbert_disc_jump_deltas = None 
-coily_chasing_disc = False 
-
-# Set initial ball_activation_time (e.g. when game first starts)
-# This will also be reset in reset_game and start_next_level
-ball_activation_time = pygame.time.get_ticks() + BALL_SPAWN_DELAY
-
-# Initial landing on the first cube
-start_cube_idx = player.get_current_cube_index()
-if 0 <= start_cube_idx < len(pyramid_cubes):
-    pyramid_cubes[start_cube_idx].change_color() # No score for initial landing
-
-running = True
-
-# --- Main Game Loop ---
-while running:
-    current_time_ticks = pygame.time.get_ticks()
-
-    # Update disc cooldowns
-    if 'left_disc' in globals(): left_disc.update_cooldown()
-    if 'right_disc' in globals(): right_disc.update_cooldown()
-
-    # Handle player teleportation visual cue
-    if player_is_teleporting:
-        if current_time_ticks - player_teleport_start_time > player_teleport_duration:
-            player.grid_row = player_target_after_teleport[0]
-            player.grid_col = player_target_after_teleport[1]
-            player.update_screen_pos()
-            player.is_visible = True
-
-            # Land on top cube & change color/score
-            top_cube_index = player.get_current_cube_index()
-            if 0 <= top_cube_index < len(pyramid_cubes):
-                landed_cube = pyramid_cubes[top_cube_index]
-                if landed_cube.change_color(): # True if color actually changed
-                    score += 25
-            play_sound("land") # Play land sound upon reappearing
-
-            player_is_teleporting = False
-            print(f"Player teleported to ({player.grid_row},{player.grid_col}) and is now visible.")
-
-
-    # Activate ball if spawn delay has passed and game is playing
-    if not red_ball.is_active and game_state == STATE_PLAYING and \
-       current_time_ticks > ball_activation_time:
-        
-        # Determine a safe starting row/col for the ball.
-        # Try to spawn on row 1. If player is at (0,0), common first jumps are (1,0) or (1,1).
-        # Spawning on row 1 at a random column is a simple strategy.
-        start_row_ball = 1 
-        
-        if PYRAMID_ROWS > 1 and CUBES_PER_ROW[1] > 0:
-            start_col_ball = random.randint(0, CUBES_PER_ROW[1] - 1)
-        else: # Fallback to top row if row 1 is not viable (e.g. PYRAMID_ROWS = 1)
-            start_row_ball = 0
-            start_col_ball = 0
-
-        # Ensure chosen start position is valid before resetting the ball
-        if 0 <= start_row_ball < PYRAMID_ROWS and \
-           0 <= start_col_ball < CUBES_PER_ROW[start_row_ball]:
-            red_ball.reset(start_row=start_row_ball, start_col=start_col_ball)
-            # red_ball.reset() already sets is_active = True
-            print(f"Red ball activated at ({start_row_ball}, {start_col_ball})")
-        else:
-            # Fallback if the calculated position is somehow invalid (should be rare)
-            red_ball.reset(start_row=0, start_col=0) 
-            print(f"Red ball activated at fallback (0,0)")
+SPLASH_SCREEN_DURATION = 5000 # 5 seconds
+PLAYER_TELEPORT_DURATION = 500 # 0.5 seconds
+PLAYER_TARGET_AFTER_TELEPORT = (0,0) # Always teleport to top cube
+HOP_DURATION = 180 # Milliseconds from one move until the next may start
+INPUT_BUFFER_MOVES = 1 # Moves pressed during a hop that are kept for when it lands
+
+# Keys that move the player, mapped to (delta row, delta col)
+MOVE_KEY_DELTAS = {
+    pygame.K_LEFT: (-1, -1),  # Up-Left
+    pygame.K_UP: (-1, 0),     # Up-Right
+    pygame.K_DOWN: (1, 0),    # Down-Left
+    pygame.K_RIGHT: (1, 1),   # Down-Right
+}
 
+def pointer_key(pos, game_state, player):
+    """The key a click or tap at framebuffer position `pos` stands for, or None.
 
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                running = False
+    While playing it's the hop towards that quarter of the screen around
+    Q*bert; on the game over and level complete screens, the key that goes on.
+    """
+    if game_state == STATE_GAME_OVER:
+        return pygame.K_r
+    if game_state == STATE_LEVEL_COMPLETE:
+        return pygame.K_n
+    if game_state != STATE_PLAYING:
+        return None
+    left = pos[0] < player.screen_x
+    if pos[1] < player.screen_y:
+        return pygame.K_LEFT if left else pygame.K_UP
+    return pygame.K_DOWN if left else pygame.K_RIGHT
+
+class GameSession:
+    """One game: the pyramid, Q*bert, the enemies, discs, score and state machine.
+
+    Everything a game changes lives on its session, so one process can run
+    any number of them side by side (see sessionbench.py); the pyramid tables
+    and constants above are shared read-only. The main loop calls update()
+    once per frame; the pieces are split out so tools (e.g. fuzzer.py) can
+    drive the game logic without a window.
+    """
+    def __init__(self, event_log=None, high_scores=None, levels=None):
+        self.event_log = event_log     # telemetry.TelemetryLog when QBERT_TELEMETRY_DIR is set
+        self.high_scores = high_scores # leaderboard.Leaderboard unless QBERT_LEADERBOARD is set to ""
+        self.levels = levels if levels is not None else LEVELS # levels.LevelTable
+        self.rules = self.levels.rules(1) # The current level's levels.LevelRules
+        self.pyramid = pyramid_tables(self.rules.pyramid_rows)
+
+        self.pyramid_cubes = [Cube(r, c) for r, c in self.pyramid.cells]
+        self.player = Player(0, 0) # Start player at the top cube (0,0)
+        self.coily = Enemy(self)
+        # Initialize the red ball - start it inactive. Its initial_start_row/col from Ball's __init__
+        # will be used if reset() is called without arguments before activation.
+        # Pass the required functions and configurations to the Ball constructor.
+        self.red_ball = Ball(
+            start_row=0, 
+            start_col=0, 
+            color=BALL_COLOR, 
+            radius=BALL_RADIUS, 
+            move_interval=BALL_MOVE_INTERVAL,
+            get_cube_screen_center_pos_func=get_cube_screen_center_pos,
+            play_sound_func=play_sound,
+            pyramid_rows_config=PYRAMID_ROWS,
+            cubes_per_row_config=CUBES_PER_ROW,
+            hop_tables=HOP_TABLES
+        )
+        self.red_ball.is_active = False 
+        self.ball_activation_time = 0 
+        self.left_disc = Disc(DISC_LEFT_X, DISC_LEFT_Y, DISC_RADIUS, DISC_COLOR, DISC_COOLDOWN_DURATION)
+        self.right_disc = Disc(DISC_RIGHT_X, DISC_RIGHT_Y, DISC_RADIUS, DISC_COLOR, DISC_COOLDOWN_DURATION)
+
+        self.score = 0
+        self.current_level = 1
+        self.game_started_ticks = 0 # For the game duration on the leaderboard
+        self.game_state = STATE_PLAYING
+        self.player_death_timer = 0
+        self.splash_screen_start_time = 0 # For level complete splash screen
+
+        # Player teleportation state
+        self.player_is_teleporting = False
+        self.player_teleport_start_time = 0
+
+        # Coily disc chase flags
+        self.qbert_used_disc_coord = None 
+        self.qbert_disc_jump_deltas = None 
+        self.coily_chasing_disc = False 
+
+        # Move input: one hop at a time, presses during a hop wait in the buffer
+        self.hop_duration = HOP_DURATION
+        self.input_buffer_size = INPUT_BUFFER_MOVES
+        self.input_buffer = collections.deque() # (key, read time) pressed while a hop was in progress
+        self.hop_ready_time = 0 # Ticks when the current hop lands and the next move may start
+        self.dropped_moves = 0  # Presses ignored because the buffer was full
+        self.moves_to_present = [] # (read time, was buffered) of moves not yet shown on screen
+
+        self.forecast = None # DangerForecast once enable_forecast() is called
+
+    def log_event(self, event_type, row=0, col=0, detail=0, value=0):
+        """Records a gameplay event for telemetry, if it's enabled."""
+        if self.event_log is not None:
+            self.event_log.emit(event_type, self.current_level, row, col, detail, value)
+
+    def flip_cube(self, index):
+        """Applies the level's landing rule to a cube; returns the points that scores (0 if it didn't change)."""
+        cube = self.pyramid_cubes[index]
+        points = self.rules.points[cube.step]
+        if cube.land(self.rules):
+            self.log_event(telemetry.EVENT_CUBE_FLIP, cube.grid_row, cube.grid_col, cube.step)
+            return points
+        return 0
+
+    def enable_forecast(self):
+        """Starts keeping a DangerForecast of the enemies, updated every frame."""
+        if self.forecast is None:
+            self.forecast = DangerForecast(self.pyramid.forecast)
+            self.update_forecast(pygame.time.get_ticks())
+        return self.forecast
+
+    def clear_disc_chase(self):
+        self.coily_chasing_disc = False
+        self.qbert_used_disc_coord = None
+        self.qbert_disc_jump_deltas = None
+
+    def reset_game(self):
+        game_logger.info("Resetting game...")
+        self.score = 0
+        self.current_level = 1 # Reset level to 1
+        self.player.reset_lives()
+        self.game_started_ticks = pygame.time.get_ticks()
+        self.start_level()
+        self.log_event(telemetry.EVENT_GAME_START)
+        self.log_event(telemetry.EVENT_LEVEL_START)
+
+    def start_next_level(self):
+        game_logger.info("Starting next level: %d", self.current_level)
+        self.start_level()
+        self.log_event(telemetry.EVENT_LEVEL_START)
+
+    def use_level_rules(self):
+        """Switches the pyramid, cube colors and enemy timings to the current level's rules."""
+        rules = self.rules = self.levels.rules(self.current_level)
+        if rules.pyramid_rows != self.pyramid.rows:
+            self.pyramid = pyramid_tables(rules.pyramid_rows)
+            self.pyramid_cubes = [Cube(r, c) for r, c in self.pyramid.cells]
+        self.player.pyramid_rows = rules.pyramid_rows
+        self.red_ball.PYRAMID_ROWS = rules.pyramid_rows
+        self.red_ball.move_interval = rules.ball_interval
+        for cube in self.pyramid_cubes:
+            cube.use_level(rules)
+
+    def start_level(self):
+        """Puts everything back at its start position and the pyramid back to its initial colors."""
+        self.use_level_rules()
+        self.player.reset_position()
+        self.player.is_active = True 
+
+        self.coily.reset() # Active if the level has Coily
+
+        self.red_ball.is_active = False 
+        self.ball_activation_time = pygame.time.get_ticks() + self.rules.ball_spawn_delay
+        self.input_buffer.clear()
+        self.hop_ready_time = 0
+
+        self.left_disc.activate()
+        self.right_disc.activate()
+
+        # Reset Coily disc chase flags
+        self.clear_disc_chase()
+
+        start_cube_index = self.player.get_current_cube_index()
+        if 0 <= start_cube_index < len(self.pyramid_cubes):
+            self.flip_cube(start_cube_index) # No score for this initial landing
+
+        self.game_state = STATE_PLAYING
+        self.player_death_timer = 0
+
+    # --- Frame Update ---
+    def update_teleport(self, current_time_ticks):
+        """Finishes a disc ride once the teleport duration has passed."""
+        player = self.player
+
+        if self.player_is_teleporting:
+            if current_time_ticks - self.player_teleport_start_time > PLAYER_TELEPORT_DURATION:
+                player.grid_row = PLAYER_TARGET_AFTER_TELEPORT[0]
+                player.grid_col = PLAYER_TARGET_AFTER_TELEPORT[1]
+                player.update_screen_pos()
+                player.is_visible = True
+                player.is_active = True
+
+                # Land on top cube & change color/score; with some landing rules that can finish the level
+                self.land_player_on_cube()
+                play_sound("land") # Play land sound upon reappearing
+
+                self.player_is_teleporting = False
+                player_logger.debug("Player teleported to (%d,%d) and is now visible.", player.grid_row, player.grid_col)
+
+    def update_ball_spawn(self, current_time_ticks):
+        """Activates the red ball once its spawn delay has passed."""
+        red_ball = self.red_ball
+
+        # Activate ball if spawn delay has passed and game is playing
+        if not red_ball.is_active and self.game_state == STATE_PLAYING and self.rules.red_ball and \
+           current_time_ticks > self.ball_activation_time:
+            
+            # Determine a safe starting row/col for the ball.
+            # Try to spawn on row 1. If player is at (0,0), common first jumps are (1,0) or (1,1).
+            # Spawning on row 1 at a random column is a simple strategy.
+            start_row_ball = 1 
             
-            if game_state == STATE_GAME_OVER:
-                if event.key == pygame.K_r:
-                    reset_game()
-            elif game_state == STATE_LEVEL_COMPLETE:
-                if event.key == pygame.K_n:
-                    start_next_level()
+            if self.pyramid.rows > 1 and CUBES_PER_ROW[1] > 0:
+                start_col_ball = random.randint(0, CUBES_PER_ROW[1] - 1)
+            else: # Fallback to top row if row 1 is not viable (e.g. PYRAMID_ROWS = 1)
+                start_row_ball = 0
+                start_col_ball = 0
+
+            # Ensure chosen start position is valid before resetting the ball
+            if 0 <= start_row_ball < self.pyramid.rows and \
+               0 <= start_col_ball < CUBES_PER_ROW[start_row_ball]:
+                red_ball.reset(start_row=start_row_ball, start_col=start_col_ball)
+                # red_ball.reset() already sets is_active = True
+                game_logger.debug("Red ball activated at (%d, %d)", start_row_ball, start_col_ball)
+            else:
+                # Fallback if the calculated position is somehow invalid (should be rare)
+                red_ball.reset(start_row=0, start_col=0) 
+                game_logger.debug("Red ball activated at fallback (0,0)")
+
+    def land_player_on_cube(self, scored=True):
+        """Flips the cube under the player and checks for level completion."""
+        current_cube_index = self.player.get_current_cube_index()
+        if 0 <= current_cube_index < len(self.pyramid_cubes):
+            points = self.flip_cube(current_cube_index)
+            if scored:
+                self.score += points
             
-            elif game_state == STATE_PLAYING and player.is_active and not player_is_teleporting:
-                original_player_row = player.grid_row
-                original_player_col = player.grid_col
-                move_attempt_dr, move_attempt_dc = 0, 0 # Store the delta of the move
+            # Check for level complete
+            all_cubes_target = all(c.is_target_color for c in self.pyramid_cubes)
+            if all_cubes_target:
+                previous_level = self.current_level # Store for splash screen display
+                self.log_event(telemetry.EVENT_LEVEL_COMPLETE) # Logged against the level just finished
+                self.current_level += 1 # Increment level
+                self.score += 1000 # Bonus for level complete
+                play_sound("level_complete")
+                game_logger.info("Level %d Complete! Advancing to level %d", previous_level, self.current_level)
                 
-                moved_successfully = False 
-                used_disc_this_turn = False # Flag to check if disc was used
-
-                if event.key == pygame.K_LEFT:  # Up-Left
-                    move_attempt_dr, move_attempt_dc = -1, -1
-                    moved_successfully = player.move(move_attempt_dr, move_attempt_dc)
-                elif event.key == pygame.K_UP: # Up-Right
-                    move_attempt_dr, move_attempt_dc = -1, 0
-                    moved_successfully = player.move(move_attempt_dr, move_attempt_dc)
-                elif event.key == pygame.K_DOWN: # Down-Left
-                    move_attempt_dr, move_attempt_dc = 1, 0
-                    moved_successfully = player.move(move_attempt_dr, move_attempt_dc)
-                elif event.key == pygame.K_RIGHT: # Down-Right
-                    move_attempt_dr, move_attempt_dc = 1, 1
-                    moved_successfully = player.move(move_attempt_dr, move_attempt_dc)
-
-                fell_off_pyramid = False 
-                used_disc_this_turn = False # Ensure this is reset for each key press event
-                # print(f"[DEBUG] Before 'if not moved_successfully': original_pos=({original_player_row},{original_player_col}), move_attempt=({move_attempt_dr},{move_attempt_dc}), moved_successfully={moved_successfully}")
-
-                if not moved_successfully: # Player attempted to move off-grid or invalid move
-                    # print(f"[DEBUG] Inside 'if not moved_successfully'. Player potentially fell or will use disc. Player pos after move attempt: ({player.grid_row},{player.grid_col}), screen_x: {player.screen_x}")
-                    # Check for disc interaction
-                    # Player.move already updated player.grid_row/col to off-grid values and set screen_x/y < 0
-                    # So we use original_player_row/col for checking jump-off points
-                    
-                    # Calculate jump types first
-                    is_left_jump = (move_attempt_dr == -1 and move_attempt_dc == -1) or \
-                                   (move_attempt_dr == 1 and move_attempt_dc == 0)
-                    is_right_jump = (move_attempt_dr == -1 and move_attempt_dc == 0) or \
-                                    (move_attempt_dr == 1 and move_attempt_dc == 1)
-                    # print(f"[DEBUG] is_left_jump={is_left_jump}, is_right_jump={is_right_jump}")
-
-                    # Now, the conditional chain for disc checks
-                    if (original_player_row, original_player_col) in DISC_JUMP_OFF_POINTS_LEFT and \
-                       is_left_jump and left_disc.is_active:
-                        play_sound("disc_ride")
-                        player.is_visible = False # Make player invisible
-                        player_is_teleporting = True
-                        player_teleport_start_time = current_time_ticks
-                        
-                        left_disc.deactivate()
-                        used_disc_this_turn = True
-                        
-                        qbert_used_disc_coord = (original_player_row, original_player_col)
-                        qbert_disc_jump_deltas = (move_attempt_dr, move_attempt_dc)
-                        coily_chasing_disc = True
-                        print(f"Q*bert started teleport via LEFT disc from ({original_player_row},{original_player_col}).")
-
-                    elif (original_player_row, original_player_col) in DISC_JUMP_OFF_POINTS_RIGHT and \
-                         is_right_jump and right_disc.is_active:
-                        play_sound("disc_ride")
-                        player.is_visible = False # Make player invisible
-                        player_is_teleporting = True
-                        player_teleport_start_time = current_time_ticks
-
-                        right_disc.deactivate()
-                        used_disc_this_turn = True
-                        
-                        qbert_used_disc_coord = (original_player_row, original_player_col)
-                        qbert_disc_jump_deltas = (move_attempt_dr, move_attempt_dc)
-                        coily_chasing_disc = True
-                        print(f"Q*bert started teleport via RIGHT disc from ({original_player_row},{original_player_col}).")
-                    
-                    # print(f"[DEBUG] After disc checks: used_disc_this_turn={used_disc_this_turn}, player.screen_x={player.screen_x}")
-                    if not used_disc_this_turn and player.screen_x < 0: # Still fell off (no disc used or other invalid move)
-                        # print(f"[DEBUG] Player genuinely fell off - no disc used. Player screen_x: {player.screen_x}")
-                        play_sound("fall") # Play "fall" sound only if no disc was used
-                        # Reset Coily chase flags if Q*bert just falls without using a disc
-                        coily_chasing_disc = False
-                        qbert_used_disc_coord = None
-                        qbert_disc_jump_deltas = None
-                        fell_off_pyramid = True
+                self.game_state = STATE_SPLASH_SCREEN # Transition to splash screen
+                self.splash_screen_start_time = pygame.time.get_ticks()
                 
-                # This 'if fell_off_pyramid' block is now correctly conditional on no disc being used.
-                if fell_off_pyramid: 
-                    player.die() 
-                    game_state = STATE_PLAYER_DIED
-                    player_death_timer = current_time_ticks
-                    # Reset Coily chase flags as player died (already done above if fall was immediate, but good for clarity)
-                    coily_chasing_disc = False
-                    qbert_used_disc_coord = None
-                    qbert_disc_jump_deltas = None
-                elif moved_successfully or used_disc_this_turn: # Player landed on a valid cube OR used a disc
-                    if not used_disc_this_turn: # Only reset Coily chase flags if it was a normal move on pyramid
-                        coily_chasing_disc = False
-                        qbert_used_disc_coord = None
-                        qbert_disc_jump_deltas = None
-
-                    # Cube interaction logic (color change, level complete)
-                    # This should only happen if Q*bert is on a cube, i.e. not just after using a disc to teleport (unless teleporting to a cube)
-                    # The disc logic already handles landing on cube (0,0) and changing its color.
-                    # So, if used_disc_this_turn is True, this part for cube color might be redundant or handled.
-                    # If moved_successfully is True (normal jump on pyramid), then this is needed.
-                    if moved_successfully and not used_disc_this_turn: 
-                        current_cube_index = player.get_current_cube_index()
-                        if 0 <= current_cube_index < len(pyramid_cubes):
-                            landed_cube = pyramid_cubes[current_cube_index]
-                            if landed_cube.change_color(): # True if color actually changed
-                                score += 25
-                            
-                            # Check for level complete (only if a normal move completed the level)
-                            all_cubes_target = all(c.is_target_color for c in pyramid_cubes)
-                            if all_cubes_target:
-                                previous_level = current_level 
-                                current_level += 1 
-                                score += 1000 
-                                play_sound("level_complete")
-                                print(f"Level {previous_level} Complete! Advancing to level {current_level}")
-                                game_state = STATE_SPLASH_SCREEN 
-                                splash_screen_start_time = pygame.time.get_ticks()
-                                coily.is_active = False 
-                                if 'red_ball' in globals():
-                                    red_ball.is_active = False 
-                        else: # Should not happen if moved_successfully is true
-                            pass 
-                    # If a disc was used, level completion check is not relevant for that specific "move"
-                    # but the game continues. If Q*bert is on the last cube and then uses a disc,
-                    # level completion should have been triggered by the move *onto* that last cube.
-
-                # The moved_successfully path for cube logic (outside 'if not moved_successfully')
-                elif moved_successfully and not used_disc_this_turn: # Redundant check, already handled by structure, but for clarity
-                    current_cube_index = player.get_current_cube_index()
-                    if 0 <= current_cube_index < len(pyramid_cubes):
-                        landed_cube = pyramid_cubes[current_cube_index]
-                        if landed_cube.change_color(): # True if color actually changed
-                            score += 25
-                        
-                        # Check for level complete
-                        all_cubes_target = all(c.is_target_color for c in pyramid_cubes)
-                        if all_cubes_target:
-                            previous_level = current_level # Store for splash screen display
-                            current_level += 1 # Increment level
-                            score += 1000 # Bonus for level complete
-                            play_sound("level_complete")
-                            print(f"Level {previous_level} Complete! Advancing to level {current_level}")
-                            
-                            game_state = STATE_SPLASH_SCREEN # Transition to splash screen
-                            splash_screen_start_time = pygame.time.get_ticks()
-                            
-                            coily.is_active = False 
-                            if 'red_ball' in globals():
-                                red_ball.is_active = False 
-                            
-                            # Player should not be able to move during splash screen
-                            # Player's active state will be handled by start_next_level()
-                    else:
-                        # This case should ideally be covered by fell_off_pyramid
-                        # but as a safeguard if player.move returned true but index is bad
-                        # print(f"Error: Player landed on invalid cube index: {current_cube_index} after move.")
-                        # player.die()
-                        # game_state = STATE_PLAYER_DIED
-                        # player_death_timer = current_time_ticks
-                        pass # Player landed, color changed, score handled.
-
-
-    if game_state == STATE_PLAYER_DIED:
-        if current_time_ticks - player_death_timer > PLAYER_DEATH_PAUSE:
-            if player.lives <= 0:
-                game_state = STATE_GAME_OVER
-                play_sound("game_over")
-            else:
-                player.reset_position()
-                coily.reset() 
-                if 'red_ball' in globals():
-                    red_ball.is_active = False 
-                ball_activation_time = current_time_ticks + BALL_SPAWN_DELAY 
-
-                # Reset Coily disc chase flags on player respawn
-                coily_chasing_disc = False
-                qbert_used_disc_coord = None
-                qbert_disc_jump_deltas = None
-
-                # Recolor starting cube if it's not already target color
-                start_cube_idx_respawn = player.get_current_cube_index()
-                if 0 <= start_cube_idx_respawn < len(pyramid_cubes):
-                    if not pyramid_cubes[start_cube_idx_respawn].is_target_color:
-                         pyramid_cubes[start_cube_idx_respawn].change_color() # No score for respawn landing
-
-                game_state = STATE_PLAYING
-
-    if game_state == STATE_PLAYING:
-        if coily.is_active:
-            coily.move((player.grid_row, player.grid_col))
-            # Coily collision with player
-            if player.is_active and coily.is_active and \
-               player.grid_row == coily.grid_row and \
-               player.grid_col == coily.grid_col:
-                print("Collision with Coily!")
-                player.die()
-                game_state = STATE_PLAYER_DIED
-                player_death_timer = current_time_ticks
+                self.coily.is_active = False 
+                self.red_ball.is_active = False 
+                
+                # Player should not be able to move during splash screen
+                # Player's active state will be handled by start_next_level()
+
+    def handle_key(self, key, current_time_ticks, read_at=None):
+        """Handles a single KEYDOWN for the current game state; read_at is when it was read (perf_counter)."""
+        player = self.player
+
+        if self.game_state == STATE_GAME_OVER:
+            if key == pygame.K_r:
+                self.reset_game()
+        elif self.game_state == STATE_LEVEL_COMPLETE:
+            if key == pygame.K_n:
+                self.start_next_level()
+        
+        elif self.game_state == STATE_PLAYING and player.is_active and not self.player_is_teleporting:
+            if key not in MOVE_KEY_DELTAS:
+                return
+
+            if self.input_buffer or current_time_ticks < self.hop_ready_time:
+                # Mid-hop: keep the move for when the hop lands, up to the buffer size
+                if len(self.input_buffer) < self.input_buffer_size:
+                    self.input_buffer.append((key, read_at))
+                else:
+                    self.dropped_moves += 1
+                return
+            self.move_player(key, current_time_ticks, read_at)
+
+    def move_player(self, key, current_time_ticks, read_at=None, buffered=False):
+        """Hops Q*bert in the direction of a move key: onto a cube, onto a disc or off the pyramid."""
+        player = self.player
+        self.hop_ready_time = current_time_ticks + self.hop_duration
+        if read_at is not None: # For the input latency histogram, see MainLoop
+            self.moves_to_present.append((read_at, buffered))
+
+        original_player_row = player.grid_row
+        original_player_col = player.grid_col
+        start_pos = (player.screen_x, player.screen_y) # Where the hop is drawn from
+        move_attempt_dr, move_attempt_dc = MOVE_KEY_DELTAS[key] # Store the delta of the move
+        moved_successfully = player.move(move_attempt_dr, move_attempt_dc)
+
+        fell_off_pyramid = False 
+        used_disc_this_turn = False # Flag to check if disc was used
+
+        if not moved_successfully: # Player attempted to move off-grid or invalid move
+            # Check for disc interaction
+            # Player.move already updated player.grid_row/col to off-grid values and set screen_x/y < 0
+            # So we use original_player_row/col for checking jump-off points
+            
+            # Calculate jump types first
+            is_left_jump = (move_attempt_dr == -1 and move_attempt_dc == -1) or \
+                           (move_attempt_dr == 1 and move_attempt_dc == 0)
+            is_right_jump = (move_attempt_dr == -1 and move_attempt_dc == 0) or \
+                            (move_attempt_dr == 1 and move_attempt_dc == 1)
+
+            # Now, the conditional chain for disc checks
+            if (original_player_row, original_player_col) in DISC_JUMP_OFF_POINTS_LEFT and \
+               is_left_jump and self.left_disc.is_active:
+                play_sound("disc_ride")
+                player.is_visible = False # Make player invisible
+                player.is_active = False # Riding the disc, not on any cube until update_teleport()
+                self.player_is_teleporting = True
+                self.player_teleport_start_time = current_time_ticks
+                player.hop = self.disc_ride_hop(self.left_disc, start_pos, current_time_ticks)
+
+                self.left_disc.deactivate()
+                used_disc_this_turn = True
+                self.log_event(telemetry.EVENT_DISC_USE, original_player_row, original_player_col, telemetry.DISC_LEFT)
+                
+                self.qbert_used_disc_coord = (original_player_row, original_player_col)
+                self.qbert_disc_jump_deltas = (move_attempt_dr, move_attempt_dc)
+                self.coily_chasing_disc = True
+                player_logger.info("Q*bert started teleport via LEFT disc from (%d,%d).", original_player_row, original_player_col)
+
+            elif (original_player_row, original_player_col) in DISC_JUMP_OFF_POINTS_RIGHT and \
+                 is_right_jump and self.right_disc.is_active:
+                play_sound("disc_ride")
+                player.is_visible = False # Make player invisible
+                player.is_active = False # Riding the disc, not on any cube until update_teleport()
+                self.player_is_teleporting = True
+                self.player_teleport_start_time = current_time_ticks
+                player.hop = self.disc_ride_hop(self.right_disc, start_pos, current_time_ticks)
+
+                self.right_disc.deactivate()
+                used_disc_this_turn = True
+                self.log_event(telemetry.EVENT_DISC_USE, original_player_row, original_player_col, telemetry.DISC_RIGHT)
+                
+                self.qbert_used_disc_coord = (original_player_row, original_player_col)
+                self.qbert_disc_jump_deltas = (move_attempt_dr, move_attempt_dc)
+                self.coily_chasing_disc = True
+                player_logger.info("Q*bert started teleport via RIGHT disc from (%d,%d).", original_player_row, original_player_col)
+            
+            if not used_disc_this_turn and player.screen_x < 0: # Still fell off (no disc used or other invalid move)
+                play_sound("fall") # Play "fall" sound only if no disc was used
+                fell_off_pyramid = True
         
+        # This 'if fell_off_pyramid' block is now correctly conditional on no disc being used.
+        if fell_off_pyramid: 
+            self.log_event(telemetry.EVENT_DEATH, original_player_row, original_player_col, telemetry.DEATH_FALL)
+            dx, dy = grid_step_offset(move_attempt_dr, move_attempt_dc)
+            player.hop = Hop(HOP_TABLES.fall, current_time_ticks, FALL_DURATION, start_pos, (start_pos[0] + dx, start_pos[1] + dy))
+            player.die() 
+            self.game_state = STATE_PLAYER_DIED
+            self.player_death_timer = current_time_ticks
+            # Reset Coily chase flags as player died
+            self.clear_disc_chase()
+        elif moved_successfully: # Player landed on a valid cube with a normal move
+            self.log_event(telemetry.EVENT_MOVE, player.grid_row, player.grid_col)
+            # Drawn in the air for hop_duration; the logic has already landed
+            player.hop = Hop(HOP_TABLES.diagonal[(move_attempt_dr, move_attempt_dc)], current_time_ticks, self.hop_duration,
+                             start_pos, (player.screen_x, player.screen_y))
+            # Only reset Coily chase flags if it was a normal move on pyramid
+            self.clear_disc_chase()
+
+            # Cube interaction logic (color change, level complete).
+            # A disc ride lands on cube (0,0) in update_teleport(), and if Q*bert is on the
+            # last cube and then uses a disc, level completion was triggered by the move *onto* that cube.
+            self.land_player_on_cube()
+
+    def disc_ride_hop(self, disc, start_pos, current_time_ticks):
+        """The drawn hop onto `disc` and up to the top cube, lasting the whole teleport."""
+        top_x, top_y = get_cube_screen_center_pos(*PLAYER_TARGET_AFTER_TELEPORT)
+        return Hop(HOP_TABLES.disc, current_time_ticks, PLAYER_TELEPORT_DURATION, start_pos,
+                   (top_x, top_y - PLAYER_HEIGHT // 2), (disc.screen_x, disc.screen_y - PLAYER_HEIGHT // 2))
+
+    def update_player_death(self, current_time_ticks):
+        """Respawns the player, or ends the game, after the death pause."""
+        player = self.player
+
+        if self.game_state == STATE_PLAYER_DIED:
+            if current_time_ticks - self.player_death_timer > PLAYER_DEATH_PAUSE:
+                if player.lives <= 0:
+                    self.game_state = STATE_GAME_OVER
+                    play_sound("game_over")
+                    self.log_event(telemetry.EVENT_GAME_OVER, value=self.score)
+                    if self.high_scores is not None:
+                        self.high_scores.record(self.score, self.current_level, current_time_ticks - self.game_started_ticks)
+                else:
+                    player.reset_position()
+                    self.coily.reset() 
+                    self.red_ball.is_active = False 
+                    self.ball_activation_time = current_time_ticks + self.rules.ball_spawn_delay
+
+                    # Reset Coily disc chase flags on player respawn
+                    self.clear_disc_chase()
+
+                    self.game_state = STATE_PLAYING
+
+                    # Recolor starting cube if it's not already target color
+                    start_cube_idx_respawn = player.get_current_cube_index()
+                    if 0 <= start_cube_idx_respawn < len(self.pyramid_cubes) and \
+                       not self.pyramid_cubes[start_cube_idx_respawn].is_target_color:
+                        self.land_player_on_cube(scored=False) # No score for respawn landing
+
+    def update_enemies(self, current_time_ticks):
+        """Moves Coily and the red ball and checks them for collisions with the player."""
+        player, coily, red_ball = self.player, self.coily, self.red_ball
+
+        if self.game_state == STATE_PLAYING:
+            if coily.is_active:
+                coily.move((player.grid_row, player.grid_col))
+                # Coily collision with player
+                if player.is_active and coily.is_active and \
+                   player.grid_row == coily.grid_row and \
+                   player.grid_col == coily.grid_col:
+                    game_logger.info("Collision with Coily!")
+                    self.log_event(telemetry.EVENT_DEATH, player.grid_row, player.grid_col, telemetry.DEATH_COILY)
+                    player.die()
+                    self.game_state = STATE_PLAYER_DIED
+                    self.player_death_timer = current_time_ticks
+            
+            if red_ball.is_active:
+                red_ball.move()
+                # Ball collision with player
+                if player.is_active and red_ball.is_active and \
+                   player.grid_row == red_ball.grid_row and \
+                   player.grid_col == red_ball.grid_col:
+                    game_logger.info("Collision with Red Ball!")
+                    self.log_event(telemetry.EVENT_DEATH, player.grid_row, player.grid_col, telemetry.DEATH_BALL)
+                    player.die() # Player dies on collision
+                    self.game_state = STATE_PLAYER_DIED
+                    self.player_death_timer = current_time_ticks
+
+    def update_splash(self, current_time_ticks):
+        """Moves on to the next level once the splash screen has been shown long enough."""
+        if self.game_state == STATE_SPLASH_SCREEN:
+            if current_time_ticks - self.splash_screen_start_time > SPLASH_SCREEN_DURATION:
+                self.start_next_level() # This will set game_state = STATE_PLAYING
+
+    def update_input_buffer(self, current_time_ticks):
+        """Plays the oldest buffered move once the hop in progress has landed."""
+        if not self.input_buffer:
+            return
+        if self.game_state != STATE_PLAYING or not self.player.is_active or self.player_is_teleporting:
+            self.input_buffer.clear() # Presses from before a death, disc ride or level end don't carry over
+            return
+        if current_time_ticks >= self.hop_ready_time:
+            key, read_at = self.input_buffer.popleft()
+            self.move_player(key, current_time_ticks, read_at, buffered=True)
+
+    def update(self, current_time_ticks, keys, read_times=None):
+        """Runs one frame of game logic; keys is the list of KEYDOWN keys seen this frame.
+
+        read_times, if given, holds the perf_counter() time each key was read, for latency tracking.
+        """
+        # Update disc cooldowns
+        self.left_disc.update_cooldown()
+        self.right_disc.update_cooldown()
+
+        self.update_teleport(current_time_ticks)
+        self.update_ball_spawn(current_time_ticks)
+        self.update_input_buffer(current_time_ticks)
+        for i, key in enumerate(keys):
+            self.handle_key(key, current_time_ticks, read_times[i] if read_times else None)
+        self.update_player_death(current_time_ticks)
+        self.update_enemies(current_time_ticks)
+        self.update_splash(current_time_ticks)
+        if self.forecast is not None:
+            self.update_forecast(current_time_ticks)
+
+    def update_forecast(self, current_time_ticks):
+        """Rebuilds the forecast track of each enemy that hopped, spawned, died or changed target."""
+        forecast, coily, red_ball = self.forecast, self.coily, self.red_ball
+        if self.game_state != STATE_PLAYING: # Enemies only move while playing
+            if forecast.stale("coily", None): forecast.set_track("coily", None)
+            if forecast.stale("ball", None): forecast.set_track("ball", None)
+            return
+
+        if not coily.is_active:
+            if forecast.stale("coily", None): forecast.set_track("coily", None)
+        else:
+            coily_cell = (coily.grid_row, coily.grid_col)
+            chasing_disc = self.coily_chasing_disc and self.qbert_used_disc_coord is not None
+            target = self.qbert_used_disc_coord if chasing_disc else (self.player.grid_row, self.player.grid_col)
+            if forecast.stale("coily", (coily_cell, target, coily.last_move_time, self.current_level, self.pyramid.rows)):
+                tables = self.pyramid.forecast
+                if chasing_disc and coily_cell == target:
+                    layers = tables.fall(coily_cell) # Next hop is the fooled jump off the pyramid
+                else:
+                    layers = tables.coily(coily_cell, target)
+                forecast.set_track("coily", Track(layers, coily.last_move_time, self.rules.coily_interval))
+
         if red_ball.is_active:
-            red_ball.move()
-            # Ball collision with player (to be added later, for now just moves)
-            if player.is_active and red_ball.is_active and \
-               player.grid_row == red_ball.grid_row and \
-               player.grid_col == red_ball.grid_col:
-                print("Collision with Red Ball!") # Placeholder for collision logic
-                player.die() # Player dies on collision
-                game_state = STATE_PLAYER_DIED
-                player_death_timer = current_time_ticks
-
-
-    screen.fill(COLOR_BACKGROUND)
-    for cube in pyramid_cubes:
-        cube.draw(screen)
+            ball_cell = (red_ball.grid_row, red_ball.grid_col)
+            if forecast.stale("ball", (ball_cell, red_ball.last_move_time, self.pyramid.rows)):
+                forecast.set_track("ball", Track(self.pyramid.forecast.ball(ball_cell), red_ball.last_move_time,
+                                                 red_ball.move_interval))
+        elif not self.rules.red_ball:
+            if forecast.stale("ball", None): forecast.set_track("ball", None)
+        else:
+            # update_ball_spawn() brings it in on the first frame past ball_activation_time
+            spawn_at = max(self.ball_activation_time, current_time_ticks) + 1
+            if forecast.stale("ball", (spawn_at, self.pyramid.rows)):
+                forecast.set_track("ball", Track(self.pyramid.forecast.ball_spawn, spawn_at, red_ball.move_interval))
+
+    def idle_timeout(self, current_time_ticks):
+        """Milliseconds the loop may sleep before the next scheduled state change."""
+        if self.game_state == STATE_SPLASH_SCREEN:
+            # +1: update_splash() moves on only once the duration is strictly exceeded
+            remaining = self.splash_screen_start_time + SPLASH_SCREEN_DURATION + 1 - current_time_ticks
+            return max(0, min(remaining, IDLE_WAKE_INTERVAL))
+        return IDLE_WAKE_INTERVAL
+
+    def draw(self, surface, quality=QUALITY_FULL, now=None):
+        """Draws the pyramid, entities, HUD and any state overlay; with `now` (ticks), hops in progress too."""
+        top_scores = self.high_scores.top_scores if self.high_scores is not None else ()
+        draw_scene(surface, self.pyramid_cubes, self.player, self.coily, self.red_ball, self.left_disc, self.right_disc,
+                   self.score, self.player.lives, self.current_level, self.game_state, top_scores, quality, now)
+
+    # --- State Snapshots ---
+    # Spectators, the shared-memory export and other tools take one GameSnapshot per tick.
+    def snapshot(self):
+        """Captures the current drawable game state as a GameSnapshot."""
+        player, coily, red_ball = self.player, self.coily, self.red_ball
+        return GameSnapshot(
+            bytes(cube.step for cube in self.pyramid_cubes),
+            player.grid_row, player.grid_col,
+            (ENTITY_ACTIVE if player.is_active else 0) | (PLAYER_VISIBLE if player.is_visible else 0),
+            coily.grid_row, coily.grid_col, ENTITY_ACTIVE if coily.is_active else 0,
+            red_ball.grid_row, red_ball.grid_col, ENTITY_ACTIVE if red_ball.is_active else 0,
+            (1 if self.left_disc.is_active else 0) | (2 if self.right_disc.is_active else 0),
+            self.score, player.lives, self.current_level, self.game_state,
+        )
+
+    def apply_snapshot(self, snapshot):
+        """Sets the session's game objects to match a snapshot, e.g. to draw it with draw()."""
+        if snapshot.level != self.current_level:
+            self.current_level = snapshot.level
+            self.use_level_rules() # Pyramid size and colors
+        set_drawables(snapshot, self.rules, self.pyramid_cubes, self.player, self.coily, self.red_ball, self.left_disc, self.right_disc)
+        self.score = snapshot.score
+        self.player.lives = snapshot.lives
+        self.game_state = snapshot.game_state
+
+
+# States whose screen is static: after one frame the loop sleeps in pygame.event.wait()
+IDLE_STATES = (STATE_GAME_OVER, STATE_SPLASH_SCREEN, STATE_LEVEL_COMPLETE)
+IDLE_WAKE_INTERVAL = 1000 # Longest idle wait (ms), so late assets and leaderboard updates still show up
+IDLE_POLL_INTERVAL = 20   # Sleep step (ms) where SDL cannot block on events
+POLLING_DRIVERS = ("dummy", "offscreen") # SDL emulates event waits there by polling every millisecond
+
+def wait_for_events(timeout):
+    """Blocks until input arrives or `timeout` ms pass; returns the pending events."""
+    if pygame.display.get_driver() not in POLLING_DRIVERS:
+        event = pygame.event.wait(timeout)
+        return [] if event.type == pygame.NOEVENT else [event] + pygame.event.get()
+    deadline = pygame.time.get_ticks() + timeout
+    while True:
+        events = pygame.event.get()
+        remaining = deadline - pygame.time.get_ticks()
+        if events or remaining <= 0:
+            return events
+        pygame.time.wait(min(remaining, IDLE_POLL_INTERVAL))
+
+
+def draw_scene(surface, cubes, player, coily, red_ball, left_disc, right_disc, score, lives, level, state, top_scores=(),
+               quality=QUALITY_FULL, now=None):
+    """Draws the given objects and HUD values; GameSession.draw() passes its own.
+
+    quality is a renderquality.QUALITY_* level; higher levels draw less detail, faster.
+    now is the tick count to draw hops in progress at (see hopanim.py); without
+    it every entity is drawn at rest on its cube, as snapshots describe them.
+    """
+    if quality >= QUALITY_LOW_RES:
+        draw_pyramid_low_res(surface, cubes)
+    else:
+        surface.fill(COLOR_BACKGROUND)
+        for cube in cubes:
+            cube.draw(surface, quality)
     
-    if coily.is_active : coily.draw(screen) 
-    if 'red_ball' in globals() and red_ball.is_active : red_ball.draw(screen) 
-    if 'left_disc' in globals() : left_disc.draw(screen)
-    if 'right_disc' in globals() : right_disc.draw(screen)
-    if player.is_active : player.draw(screen) 
+    outlines = quality == QUALITY_FULL
+    coily.draw(surface, outlines, now) # Entities skip themselves unless active or mid-hop
+    red_ball.draw(surface, now)
+    left_disc.draw(surface, outlines)
+    right_disc.draw(surface, outlines)
+    player.draw(surface, outlines, now)
 
 
     score_text = game_font.render(f"Score: {score}", True, VGA_TEXT_YELLOW)
-    lives_text = game_font.render(f"Lives: {player.lives}", True, VGA_TEXT_YELLOW)
-    screen.blit(score_text, (10, 10))
-    screen.blit(lives_text, (SCREEN_WIDTH - lives_text.get_width() - 10, 10))
+    lives_text = game_font.render(f"Lives: {lives}", True, VGA_TEXT_YELLOW)
+    surface.blit(score_text, (px(10), px(10)))
+    surface.blit(lives_text, (SCREEN_WIDTH - lives_text.get_width() - px(10), px(10)))
 
-    if game_state == STATE_GAME_OVER:
+    if state == STATE_GAME_OVER:
         go_text = game_font.render("GAME OVER", True, VGA_RED)
-        go_rect = go_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
-        screen.blit(go_text, go_rect)
+        go_rect = go_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - px(20)))
+        surface.blit(go_text, go_rect)
         prompt_text = small_font.render("Press 'R' to Restart or 'ESC' to Exit", True, VGA_TEXT_YELLOW)
-        prompt_rect = prompt_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
-        screen.blit(prompt_text, prompt_rect)
-
-    elif game_state == STATE_SPLASH_SCREEN:
-        screen.fill(VGA_DARK_BLUE) # Splash screen background
+        prompt_rect = prompt_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + px(20)))
+        surface.blit(prompt_text, prompt_rect)
+        # top_scores is cached by the leaderboard's writer thread, never queried here
+        for rank, (best_score, best_level, _, day, _) in enumerate(top_scores, 1):
+            row_text = small_font.render(f"{rank}. {best_score:6}  level {best_level}  {day}", True, VGA_TEXT_YELLOW)
+            surface.blit(row_text, row_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + px(40 + 22 * rank))))
+
+    elif state == STATE_SPLASH_SCREEN:
+        surface.fill(VGA_DARK_BLUE) # Splash screen background
         
         # Display "LEVEL X COMPLETE!" - current_level was already incremented
-        level_complete_text_str = f"LEVEL {current_level -1} COMPLETE!"
+        level_complete_text_str = f"LEVEL {level -1} COMPLETE!"
         lc_text_splash = game_font.render(level_complete_text_str, True, VGA_YELLOW)
-        lc_rect_splash = lc_text_splash.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 40))
-        screen.blit(lc_text_splash, lc_rect_splash)
+        lc_rect_splash = lc_text_splash.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - px(40)))
+        surface.blit(lc_text_splash, lc_rect_splash)
 
         drink_text_str = "Q*BERT ENJOYS A REFRESHING DRINK!"
         drink_text_splash = small_font.render(drink_text_str, True, VGA_ORANGE)
-        drink_rect_splash = drink_text_splash.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 10))
-        screen.blit(drink_text_splash, drink_rect_splash)
-        
-        # Timer logic to transition to next level
-        if current_time_ticks - splash_screen_start_time > 5000: # 5 seconds
-            start_next_level() # This will set game_state = STATE_PLAYING
+        drink_rect_splash = drink_text_splash.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + px(10)))
+        surface.blit(drink_text_splash, drink_rect_splash)
 
-    elif game_state == STATE_LEVEL_COMPLETE: # Fallback if somehow still reached
+    elif state == STATE_LEVEL_COMPLETE: # Fallback if somehow still reached
         # This state is now largely bypassed by STATE_SPLASH_SCREEN
         # If it's reached, it will just show "LEVEL COMPLETE" and wait for 'N'
         # which is fine as a fallback but not the primary path.
         lc_text = game_font.render("LEVEL COMPLETE!", True, VGA_YELLOW)
-        lc_rect = lc_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 20))
-        screen.blit(lc_text, lc_rect)
+        lc_rect = lc_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - px(20)))
+        surface.blit(lc_text, lc_rect)
         
-        next_level_prompt_text = small_font.render(f"Press 'N' for Next Level ({current_level})", True, VGA_ORANGE)
-        next_level_prompt_rect = next_level_prompt_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
-        screen.blit(next_level_prompt_text, next_level_prompt_rect)
+        next_level_prompt_text = small_font.render(f"Press 'N' for Next Level ({level})", True, VGA_ORANGE)
+        next_level_prompt_rect = next_level_prompt_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + px(20)))
+        surface.blit(next_level_prompt_text, next_level_prompt_rect)
+
+
+def set_drawables(snapshot, rules, cubes, player, coily, red_ball, left_disc, right_disc):
+    """Moves and recolors the given objects to match a snapshot of a level with `rules` (levels.LevelRules)."""
+    for cube, step in zip(cubes, snapshot.cubes):
+        cube.step = step
+        cube.current_colors = rules.colors[step]
+        cube.is_target_color = rules.is_target[step]
+
+    player.grid_row, player.grid_col = snapshot.player_row, snapshot.player_col
+    player.is_active = bool(snapshot.player_flags & ENTITY_ACTIVE)
+    player.is_visible = bool(snapshot.player_flags & PLAYER_VISIBLE)
+    player.update_screen_pos()
+    coily.grid_row, coily.grid_col = snapshot.coily_row, snapshot.coily_col
+    coily.is_active = bool(snapshot.coily_flags & ENTITY_ACTIVE)
+    coily.update_screen_pos()
+    red_ball.grid_row, red_ball.grid_col = snapshot.ball_row, snapshot.ball_col
+    red_ball.is_active = bool(snapshot.ball_flags & ENTITY_ACTIVE)
+    red_ball.update_screen_pos()
+    left_disc.is_active = bool(snapshot.discs & 1)
+    right_disc.is_active = bool(snapshot.discs & 2)
+
+class RenderScene:
+    """Private copies of the drawable objects, changed only through snapshots.
+
+    The render thread draws these, so it never reads objects the simulation
+    thread is changing. Create it before the simulation thread starts.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.cubes = [Cube(r, c) for r, c in CUBE_CELLS] # Enough for any level's pyramid
+        self.rules = None # levels.LevelRules the cubes are colored for
+        self.objects = [copy.copy(obj) for obj in (session.player, session.coily, session.red_ball,
+                                                   session.left_disc, session.right_disc)]
+
+    def draw(self, surface, snapshot, quality=QUALITY_FULL):
+        rules = self.session.levels.rules(snapshot.level)
+        if rules is not self.rules:
+            self.rules = rules
+            for cube in self.cubes:
+                cube.use_level(rules)
+            self.objects[0].pyramid_rows = rules.pyramid_rows # The player
+        cubes = self.cubes[:len(pyramid_tables(rules.pyramid_rows).cells)]
+        set_drawables(snapshot, rules, cubes, *self.objects)
+        top_scores = self.session.high_scores.top_scores if self.session.high_scores is not None else ()
+        draw_scene(surface, cubes, *self.objects, snapshot.score, snapshot.lives, snapshot.level,
+                   snapshot.game_state, top_scores, quality)
+
 
+# --- Game Setup ---
+FRAME_RATE = 30      # Frames per second of the single-threaded loop
+SIMULATION_RATE = 30 # Game logic steps per second
+RENDER_RATE = 60     # Upper bound on presented frames per second with QBERT_SIM_THREAD=1
+LOADING_BAR_WIDTH = px(400)
+LOADING_BAR_HEIGHT = px(20)
+
+def run_loading_screen(loader):
+    """Starts the asset loader and shows a progress bar until the critical assets are in.
+
+    Returns False if the player closed the window while loading.
+    """
+    # Render with pygame's built-in font before the workers start, so nothing touches fonts concurrently
+    loading_text = pygame.font.Font(None, FONT_SIZE).render("LOADING...", True, VGA_TEXT_YELLOW)
+    loading_rect = loading_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - px(30)))
+    bar_rect = pygame.Rect(0, 0, LOADING_BAR_WIDTH, LOADING_BAR_HEIGHT)
+    bar_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + px(10))
+
+    started = time.perf_counter()
+    loader.start()
+    while not loader.critical_ready():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return False
+            display.handle_event(event)
+
+        ready, total = loader.progress()
+        screen.fill(COLOR_BACKGROUND)
+        screen.blit(loading_text, loading_rect)
+        pygame.draw.rect(screen, VGA_YELLOW, (bar_rect.x, bar_rect.y, bar_rect.width * ready // total, bar_rect.height))
+        pygame.draw.rect(screen, VGA_LIGHT_BLUE, bar_rect, 1)
+        display.present()
+        clock.tick(30)
+
+    game_logger.info("Critical assets ready in %.1f ms", (time.perf_counter() - started) * 1000)
+    return True
+
+def log_quality_change(session, controller):
+    mean = controller.change_mean
+    game_logger.info("Render quality %s (%d) at %.1f ms frame work for a %.1f ms budget",
+                     QUALITY_NAMES[controller.level], controller.level, mean * 1000, controller.budget * 1000)
+    session.log_event(telemetry.EVENT_QUALITY_CHANGE, detail=controller.level, value=int(mean * 1e6))
+
+def draw_quality_overlay(surface, level, controller=None):
+    """Debug text in the bottom left corner: the quality level and, when adaptive, frame work vs budget."""
+    text = f"Quality {level}: {QUALITY_NAMES[level]}"
+    if controller is not None:
+        text += f"  {controller.mean() * 1000:.1f} / {controller.budget * 1000:.1f} ms"
+    else:
+        text += " (fixed)"
+    rendered = small_font.render(text, True, VGA_TEXT_YELLOW)
+    surface.blit(rendered, (px(10), SCREEN_HEIGHT - rendered.get_height() - px(10)))
+
+class MainLoop:
+    """Runs one frame at a time: input, game update, publish, draw, flip and capture.
+
+    main() paces it with clock.tick(); asyncloop.run() awaits frame deadlines instead.
+    With input_polls > 1 the wait between frames reads input that many times
+    per frame, so key presses are timestamped within a fraction of a frame of
+    arriving. Every presented move adds its key-to-screen time to a histogram.
+    With a QualityController the render quality follows each frame's work time.
+    """
+    def __init__(self, session, loader, publish, frame_capture, idle_wait=True, input_polls=1,
+                 quality=QUALITY_FULL):
+        self.session = session
+        self.loader = loader
+        self.publish = publish # publish(snapshot, ticks), or None when nothing consumes snapshots
+        self.frame_capture = frame_capture
+        self.idle_wait = idle_wait
+        self.running = True
+        self.drawn_state = None # game_state of the last presented frame
+        self.state_cpu = {}     # game_state -> [main thread CPU s, process CPU s (audio and helper threads too), wall s]
+        self._frame_start = None # (game_state, thread CPU, process CPU, wall) when the current frame started
+        self.profiler = None # memprofile.MemoryProfiler with QBERT_MEMPROFILE=1
+        self.input_polls = input_polls
+        self.polled_events = [] # (event, perf_counter() when read) from polls between frames
+        self.next_frame_at = 0.0 # perf_counter() deadline of the next frame when polling
+        self.move_latency = LatencyHistogram("key to present, direct moves")
+        self.buffered_move_latency = LatencyHistogram("key to present, moves buffered during a hop")
+        self.show_hints = False # F2: mark cubes an enemy may be on when a hop started now lands
+        # A fixed QUALITY_* level, or a renderquality.QualityController that adapts it
+        self.quality = quality if isinstance(quality, QualityController) else None
+        self.quality_level = quality.level if self.quality is not None else quality
+        self.show_quality = False # F3: overlay the quality level and frame work time
+
+    def is_idle(self):
+        """True if the presented screen is static until input or the next scheduled transition."""
+        return self.idle_wait and self.session.game_state in IDLE_STATES and self.drawn_state == self.session.game_state
+
+    def frame(self, events):
+        """Handles this frame's events, steps the game and presents the result."""
+        self._account()
+        work_started = time.perf_counter()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_frame()
+        current_time_ticks = pygame.time.get_ticks()
+
+        self.loader = poll_loader(self.loader)
+
+        read_at = time.perf_counter()
+        timed_events = self.polled_events + [(event, read_at) for event in events]
+        self.polled_events = []
+        keys = []
+        read_times = []
+        for event, read_at in timed_events:
+            if event.type == pygame.QUIT:
+                self.running = False
+            display.handle_event(event)
+            pos = display.pointer_position(event)
+            if pos is not None:
+                key = pointer_key(pos, self.session.game_state, self.session.player)
+                if key is not None:
+                    keys.append(key)
+                    read_times.append(read_at)
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    self.running = False
+                if event.key == pygame.K_F9 and self.frame_capture is not None:
+                    self.frame_capture.save_replay()
+                if event.key == pygame.K_F2:
+                    self.show_hints = not self.show_hints
+                    self.session.enable_forecast()
+                if event.key == pygame.K_F3:
+                    self.show_quality = not self.show_quality
+                keys.append(event.key)
+                read_times.append(read_at)
+
+        if profiler is not None: profiler.phase("update")
+        self.session.update(current_time_ticks, keys, read_times)
+        if self.publish is not None:
+            if profiler is not None: profiler.phase("publish")
+            self.publish(self.session.snapshot(), current_time_ticks)
+        if profiler is not None: profiler.phase("draw")
+        self.session.draw(screen, self.quality_level, current_time_ticks)
+        if self.show_hints and self.session.game_state == STATE_PLAYING:
+            self.session.forecast.draw_hints(screen, current_time_ticks + self.session.hop_duration, CUBE_SCREEN_POS,
+                                               px(HINT_RADIUS))
+        if self.show_quality:
+            draw_quality_overlay(screen, self.quality_level, self.quality)
+
+        if profiler is not None: profiler.phase("flip")
+        display.present()
+        presented_at = time.perf_counter()
+        for read_at, buffered in self.session.moves_to_present:
+            (self.buffered_move_latency if buffered else self.move_latency).add(presented_at - read_at)
+        self.session.moves_to_present.clear()
+        if self.frame_capture is not None:
+            self.frame_capture.capture(screen, current_time_ticks)
+        self.drawn_state = self.session.game_state
+        if self.quality is not None:
+            self.adapt_quality(time.perf_counter() - work_started)
+        if profiler is not None:
+            profiler.end_frame()
+
+    def adapt_quality(self, work_seconds):
+        """Feeds one frame's work time to the quality controller and applies any new level."""
+        level = self.quality.add(work_seconds)
+        if level is not None:
+            self.quality_level = level
+            log_quality_change(self.session, self.quality)
+
+    def poll(self):
+        """Reads pending input now and keeps it, timestamped, for the next frame."""
+        read_at = time.perf_counter()
+        for event in pygame.event.get():
+            self.polled_events.append((event, read_at))
+
+    def wait_for_next_frame(self, rate):
+        """Sleeps until the next frame is due, reading input input_polls times along the way."""
+        if self.input_polls <= 1:
+            clock.tick(rate)
+            return
+        interval = 1 / rate
+        now = time.perf_counter()
+        self.next_frame_at = max(self.next_frame_at + interval, now) # Late frames don't start a catch-up burst
+        while True:
+            remaining = self.next_frame_at - time.perf_counter()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, interval / self.input_polls))
+            self.poll()
+
+    def _account(self):
+        """Charges the time since the last frame started (waits included) to that frame's state."""
+        now = (self.session.game_state, time.thread_time(), time.process_time(), time.perf_counter())
+        if self._frame_start is not None:
+            state, thread_cpu, cpu, wall = self._frame_start
+            totals = self.state_cpu.setdefault(state, [0.0, 0.0, 0.0])
+            totals[0] += now[1] - thread_cpu
+            totals[1] += now[2] - cpu
+            totals[2] += now[3] - wall
+        self._frame_start = now
+
+    def log_input(self):
+        for histogram in (self.move_latency, self.buffered_move_latency):
+            if histogram.count:
+                game_logger.info("%s", histogram.report())
+        if self.session.dropped_moves:
+            game_logger.info("%d moves dropped with the input buffer full", self.session.dropped_moves)
+
+    def log_cpu(self):
+        self._account()
+        for state, (thread_cpu, cpu, wall) in sorted(self.state_cpu.items()):
+            game_logger.info("%s: game loop %.1f%% CPU, whole process %.1f%%, over %.1f s", STATE_NAMES[state],
+                             100 * thread_cpu / wall, 100 * cpu / wall, wall)
+
+def int_setting(name, default):
+    """An environment variable as a whole number; `default` when unset or empty."""
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number, not {value!r}") from None
+
+def main():
+    global display, screen, clock, game_font, small_font
+
+    gamelog.setup_logging()
+
+    # Every setting is read and checked before anything starts, so a typo stops the game
+    # without leaving shared memory, threads or a capture worker process behind
+    sim_thread = os.environ.get("QBERT_SIM_THREAD") == "1"
+    # Render quality: QBERT_QUALITY=auto adapts it to the frame time, a number fixes it, see renderquality.py
+    quality = quality_setting(os.environ.get("QBERT_QUALITY", "auto"), 1 / (RENDER_RATE if sim_thread else FRAME_RATE))
+    # Input timing, for both loops: QBERT_HOP_MS between moves, QBERT_INPUT_BUFFER moves kept during a hop,
+    # QBERT_INPUT_POLLS input reads per frame
+    hop_duration = int_setting("QBERT_HOP_MS", HOP_DURATION)
+    input_buffer_size = int_setting("QBERT_INPUT_BUFFER", INPUT_BUFFER_MOVES)
+    input_polls = int_setting("QBERT_INPUT_POLLS", 1)
+    spectator_port = int_setting("QBERT_SPECTATOR_PORT", None)
+    memprofile_every = int_setting("QBERT_MEMPROFILE_EVERY", 30)
+    admin_port = int_setting("QBERT_ADMIN_PORT", None) # QBERT_ASYNC=1 only, see asyncloop.py
+    capture_format = os.environ.get("QBERT_CAPTURE_FORMAT", "replay")
+    if os.environ.get("QBERT_CAPTURE"):
+        from capture import FORMATS as CAPTURE_FORMATS
+        if capture_format not in CAPTURE_FORMATS:
+            raise ValueError(f"QBERT_CAPTURE_FORMAT must be one of {', '.join(CAPTURE_FORMATS)}, not {capture_format!r}")
+    # The game draws into a SCREEN_WIDTH x SCREEN_HEIGHT framebuffer (QBERT_RESOLUTION) whatever the window size;
+    # QBERT_DISPLAY=window|scaled|integer, QBERT_FULLSCREEN=1, QBERT_WINDOW=WxH, see presentation.py.
+    # A reduced resolution is scaled up by default, rather than shown in a small window
+    display_mode = os.environ.get("QBERT_DISPLAY", "window" if LOGICAL_SCALE == 1 else "scaled")
+    display = Display((SCREEN_WIDTH, SCREEN_HEIGHT), display_mode,
+                      fullscreen=os.environ.get("QBERT_FULLSCREEN") == "1",
+                      window_size=parse_size(os.environ["QBERT_WINDOW"]) if os.environ.get("QBERT_WINDOW") else None)
+
+    pygame.init()
+    pygame.mixer.init() 
+    pygame.font.init()
+    screen = display.open()
+    pygame.display.set_caption("Q*bert VGA Style")
+    clock = pygame.time.Clock()
+
+    # Fonts and sounds load on worker threads behind a loading screen; music may arrive later
+    loader = build_asset_loader()
+    if not run_loading_screen(loader):
+        loader.shutdown()
+        pygame.quit()
+        sys.exit()
+    game_font = loader.get("game_font")
+    small_font = loader.get("small_font")
+    install_loaded_sounds(loader)
+
+    # Level definitions from another directory, e.g. while designing levels
+    levels = load_levels(os.environ["QBERT_LEVELS"], LEVEL_DEFAULTS) if os.environ.get("QBERT_LEVELS") else None
+    session = GameSession(levels=levels)
+
+    # Optional live spectators, see spectator.py
+    spectator_server = None
+    if spectator_port is not None:
+        from spectator import SpectatorServer
+        spectator_server = SpectatorServer(os.environ.get("QBERT_SPECTATOR_HOST", "127.0.0.1"), spectator_port).start()
+
+    # Optional shared-memory state block for external tools, see sharedstate.py
+    state_writer = None
+    shared_state = os.environ.get("QBERT_SHARED_STATE")
+    if shared_state:
+        from sharedstate import SharedStateWriter
+        if os.path.isabs(shared_state): # An absolute path means an mmap'd file
+            state_writer = SharedStateWriter(path=shared_state, cube_count=len(CUBE_CELLS))
+        else:
+            state_writer = SharedStateWriter(shared_state, cube_count=len(CUBE_CELLS))
 
-    pygame.display.flip()
-    clock.tick(30)
+    # Optional gameplay telemetry, see telemetry.py
+    if os.environ.get("QBERT_TELEMETRY_DIR"):
+        session.event_log = telemetry.TelemetryLog(os.environ["QBERT_TELEMETRY_DIR"])
 
-pygame.quit()
-sys.exit()
+    # Finished games go to the local leaderboard, see leaderboard.py
+    leaderboard_path = os.environ.get("QBERT_LEADERBOARD", os.path.join(SCRIPT_DIR, "leaderboard.db"))
+    if leaderboard_path:
+        from leaderboard import Leaderboard
+        session.high_scores = Leaderboard(leaderboard_path)
+
+    # Optional video capture of every presented frame, F9 saves an instant replay, see capture.py
+    frame_capture = None
+    if os.environ.get("QBERT_CAPTURE"):
+        from capture import FrameCapture
+        frame_capture = FrameCapture(screen, os.environ["QBERT_CAPTURE"], capture_format)
+
+    def publish(snapshot, current_time_ticks):
+        if spectator_server is not None:
+            spectator_server.publish(snapshot)
+        if state_writer is not None:
+            state_writer.publish(snapshot, current_time_ticks)
+
+    session.reset_game() # Initial landing on the first cube, starts the clock for the leaderboard
+
+    session.hop_duration = hop_duration
+    session.input_buffer_size = input_buffer_size
+
+    # Whatever happens in the loop, the shared state block, logs and capture worker are closed
+    try:
+        if sim_thread:
+            run_split_threads(session, loader, publish, frame_capture, quality)
+        else:
+            run_main_loop(session, loader, publish if spectator_server is not None or state_writer is not None else None,
+                          frame_capture, quality, input_polls, memprofile_every, admin_port)
+    finally:
+        shutdown_services(session, state_writer, frame_capture)
+    sys.exit()
+
+def run_main_loop(session, loader, publish, frame_capture, quality, input_polls, memprofile_every, admin_port):
+    """Runs the game on this thread, paced by clock.tick() or, with QBERT_ASYNC=1, by asyncloop.py."""
+    # QBERT_IDLE_WAIT=0 keeps the full frame rate on static screens (for comparison)
+    main_loop = MainLoop(session, loader, publish, frame_capture, idle_wait=os.environ.get("QBERT_IDLE_WAIT", "1") != "0",
+                         input_polls=input_polls, quality=quality)
+
+    # Optional memory profiling of every frame, see memprofile.py
+    if os.environ.get("QBERT_MEMPROFILE") == "1":
+        from memprofile import MemoryProfiler
+        main_loop.profiler = MemoryProfiler(memprofile_every).start()
+        # One Sound per file: several names share a file, and play_sound() must not load duplicates
+        main_loop.profiler.watch("distinct Sound objects in loaded_sounds",
+                                 lambda: len({id(sound) for sound in loaded_sounds.values() if sound is not None}),
+                                 limit=len(set(sound_files.values())))
+
+    if os.environ.get("QBERT_ASYNC") == "1": # Frames as coroutine steps next to other asyncio tasks, see asyncloop.py
+        import asyncloop
+        asyncloop.run(main_loop, FRAME_RATE, admin_port=admin_port,
+                      admin_host=os.environ.get("QBERT_ADMIN_HOST", "127.0.0.1"))
+    else:
+        # --- Main Game Loop ---
+        while main_loop.running:
+            # A static screen that is already presented only changes on input or a scheduled
+            # transition, so sleep until one of those instead of redrawing it 30 times a second
+            if main_loop.is_idle():
+                events = wait_for_events(session.idle_timeout(pygame.time.get_ticks()))
+            else:
+                events = pygame.event.get()
+            main_loop.frame(events)
+            main_loop.wait_for_next_frame(FRAME_RATE)
+
+    main_loop.log_cpu()
+    main_loop.log_input()
+    if main_loop.profiler is not None:
+        game_logger.info("%s", main_loop.profiler.report())
+        main_loop.profiler.stop()
+
+def shutdown_services(session, state_writer, frame_capture):
+    """Closes everything main() opened."""
+    if state_writer is not None:
+        state_writer.close()
+    if session.event_log is not None:
+        session.event_log.close()
+    if session.high_scores is not None:
+        session.high_scores.close()
+    if frame_capture is not None:
+        frame_capture.close()
+    pygame.quit()
+
+def poll_loader(loader):
+    """Follows up on non-critical assets that finished; returns None once everything is in."""
+    if loader is None:
+        return None
+    if "music" in loader.take_completed():
+        start_background_music(loader.get("music"))
+    if loader.all_ready():
+        game_logger.info("All assets loaded:\n%s", "\n".join(loader.report()))
+        loader.shutdown()
+        return None
+    return loader
+
+def run_split_threads(session, loader, publish, frame_capture, quality=QUALITY_FULL):
+    """Steps the game on a SimulationThread while this (main) thread handles input and draws.
+
+    The simulation publishes one immutable snapshot per step; this thread draws
+    the latest one from its own RenderScene and never reads live game objects.
+    """
+    scene = RenderScene(session)
+    buffer = SnapshotBuffer()
+
+    def step(keys):
+        current_time_ticks = pygame.time.get_ticks()
+        session.update(current_time_ticks, keys)
+        snapshot = session.snapshot()
+        publish(snapshot, current_time_ticks)
+        return snapshot
+
+    simulation = SimulationThread(step, buffer, SIMULATION_RATE)
+    simulation.start()
+    controller = quality if isinstance(quality, QualityController) else None
+    quality_level = controller.level if controller is not None else quality
+    show_quality = False
+    loop_interval = Stats("render loop interval")
+    snapshot_age = Stats("snapshot age at present") # Publish to flip done
+    drawn = None
+    drawn_at = last_loop = 0.0
+    presented_frames = 0
+
+    running = True
+    while running and simulation.is_alive():
+        loop_start = time.perf_counter()
+        if last_loop:
+            loop_interval.add(loop_start - last_loop)
+        last_loop = loop_start
+        loader = poll_loader(loader)
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            display.handle_event(event)
+            pos = display.pointer_position(event)
+            if pos is not None and drawn is not None:
+                key = pointer_key(pos, drawn.game_state, scene.objects[0]) # As last drawn; live objects are the simulation's
+                if key is not None:
+                    simulation.post_key(key)
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                if event.key == pygame.K_F9 and frame_capture is not None:
+                    frame_capture.save_replay()
+                if event.key == pygame.K_F3:
+                    show_quality = not show_quality
+                simulation.post_key(event.key)
+
+        snapshot, _, published_at = buffer.take()
+        now = time.perf_counter()
+        # A snapshot equal to the one on screen (static screens) is only redrawn now and then
+        if snapshot is not None and (snapshot != drawn or now - drawn_at > IDLE_WAKE_INTERVAL / 1000):
+            scene.draw(screen, snapshot, quality_level)
+            if show_quality:
+                draw_quality_overlay(screen, quality_level, controller)
+            display.present()
+            if frame_capture is not None:
+                frame_capture.capture(screen, pygame.time.get_ticks())
+            if controller is not None and controller.add(time.perf_counter() - now) is not None:
+                quality_level = controller.level
+                log_quality_change(session, controller) # TelemetryLog.emit() only appends to a deque
+            snapshot_age.add(time.perf_counter() - published_at)
+            drawn, drawn_at = snapshot, now
+            presented_frames += 1
+        clock.tick(RENDER_RATE)
+
+    simulation.stop()
+    if simulation.error is not None:
+        raise simulation.error
+    game_logger.info("Presented %d frames for %d simulation steps", presented_frames, simulation.step_time.count)
+    for stats in (simulation.tick_interval, simulation.tick_lateness, simulation.step_time,
+                  loop_interval, snapshot_age, buffer.publish_wait, buffer.take_wait):
+        game_logger.info("%s", stats.summary())
+
+
+if __name__ == "__main__":
+    main()
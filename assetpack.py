@@ -0,0 +1,163 @@
+"""Packed asset archive: build step and memory-mapped reader.
+
+The build step decodes every sound effect to PCM in the mixer's sample
+format, stores each distinct payload once (by SHA-256 of the content) and
+writes one file with an index header:
+
+    python assetpack.py                 # writes assets.pak next to the game
+    python assetpack.py --list          # shows the index of an existing pack
+
+At runtime AssetPack memory-maps the archive, so each Sound is created
+straight from a slice of the mapping (pygame copies the samples into the
+Sound), with no per-file open or MP3 decode.
+Background music stays compressed (the mixer streams it) and is stored
+as-is.
+
+Layout (little-endian):
+    header  "QBPK", version u16, frequency u32, size i16, channels u16, entry count u32
+    index   per entry: kind u8, offset u64, length u64, name length u16, name (utf-8)
+    data    payloads, each starting on a DATA_ALIGNMENT boundary
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+import pygame
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PACK_FILE = "assets.pak"
+PACK_MAGIC = b"QBPK"
+PACK_VERSION = 1
+HEADER = struct.Struct("<4sHIhHI")
+INDEX_ENTRY = struct.Struct("<BQQH")
+DATA_ALIGNMENT = 16
+
+KIND_PCM = 0 # Raw samples in the pack's mixer format
+KIND_RAW = 1 # File bytes stored as-is
+
+# Files packed by default, by how they are stored
+PCM_FILES = ["change_color.mp3", "enemy_hop.mp3", "fall.mp3", "game_over.mp3",
+             "jump.mp3", "land.mp3", "level_complete.mp3", "player_die.mp3"]
+RAW_FILES = ["background_music.mp3"]
+
+
+class AssetPack:
+    """Read-only view of a packed archive, memory-mapped for its whole lifetime."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, version, frequency, size, channels, count = HEADER.unpack_from(self._map, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {PACK_VERSION} asset pack")
+        self.mixer_format = (frequency, size, channels)
+
+        self.entries = {} # name -> (kind, offset, length)
+        pos = HEADER.size
+        for _ in range(count):
+            kind, offset, length, name_length = INDEX_ENTRY.unpack_from(self._map, pos)
+            pos += INDEX_ENTRY.size
+            name = bytes(self._view[pos:pos + name_length]).decode("utf-8")
+            pos += name_length
+            if offset + length > len(self._map):
+                self.close()
+                raise ValueError(f"{path}: entry {name!r} runs past the end of the file")
+            self.entries[name] = (kind, offset, length)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def data(self, name):
+        """Returns a zero-copy memoryview of an entry's payload."""
+        kind, offset, length = self.entries[name]
+        return self._view[offset:offset + length]
+
+    def sound(self, name):
+        """Creates a Sound from a pre-decoded entry; the mixer must use the pack's format."""
+        kind, offset, length = self.entries[name]
+        if kind != KIND_PCM:
+            raise ValueError(f"{name!r} is not stored as PCM")
+        if pygame.mixer.get_init() != self.mixer_format:
+            raise ValueError(f"Mixer format {pygame.mixer.get_init()} does not match pack format {self.mixer_format}")
+        return pygame.mixer.Sound(buffer=self._view[offset:offset + length])
+
+    def close(self):
+        # Views handed out by data() must be released before the mapping can close
+        self._view.release()
+        self._map.close()
+
+
+def build_pack(out_path, source_dir=SCRIPT_DIR, pcm_files=PCM_FILES, raw_files=RAW_FILES):
+    """Decodes and deduplicates the game's assets into one archive; returns (entries, payloads, bytes)."""
+    pygame.mixer.init()
+    mixer_format = pygame.mixer.get_init()
+
+    payloads = [] # Distinct payload bytes, in file order
+    by_hash = {}  # sha256 -> payload index
+    entries = []  # (name, kind, payload index)
+    for kind, names in ((KIND_PCM, pcm_files), (KIND_RAW, raw_files)):
+        for name in names:
+            path = os.path.join(source_dir, name)
+            if kind == KIND_PCM:
+                payload = pygame.mixer.Sound(path).get_raw()
+            else:
+                with open(path, "rb") as f:
+                    payload = f.read()
+            digest = hashlib.sha256(bytes([kind]) + payload).digest()
+            if digest not in by_hash:
+                by_hash[digest] = len(payloads)
+                payloads.append(payload)
+            entries.append((name, kind, by_hash[digest]))
+
+    encoded_names = [name.encode("utf-8") for name, _, _ in entries]
+    index_size = sum(INDEX_ENTRY.size + len(name) for name in encoded_names)
+    offsets = []
+    pos = HEADER.size + index_size
+    for payload in payloads:
+        pos += -pos % DATA_ALIGNMENT
+        offsets.append(pos)
+        pos += len(payload)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, *mixer_format, len(entries)))
+        for (name, kind, payload_index), encoded in zip(entries, encoded_names):
+            payload = payloads[payload_index]
+            f.write(INDEX_ENTRY.pack(kind, offsets[payload_index], len(payload), len(encoded)))
+            f.write(encoded)
+        for offset, payload in zip(offsets, payloads):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(payload)
+        size = f.tell()
+    os.replace(tmp_path, out_path) # Never leave a half-written pack where the game would find it
+    return len(entries), len(payloads), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the packed asset archive.")
+    parser.add_argument("--out", default=os.path.join(SCRIPT_DIR, PACK_FILE), help="archive path")
+    parser.add_argument("--list", action="store_true", help="list the entries of an existing archive")
+    args = parser.parse_args()
+
+    if args.list:
+        pack = AssetPack(args.out)
+        print(f"{args.out}: mixer format {pack.mixer_format}")
+        for name, (kind, offset, length) in pack.entries.items():
+            print(f"  {name:24} {'pcm' if kind == KIND_PCM else 'raw'} offset {offset:>9} length {length:>9}")
+        pack.close()
+        return 0
+
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy") # Decoding needs a mixer, not a sound card
+    entries, payloads, size = build_pack(args.out)
+    print(f"Wrote {args.out}: {entries} entries, {payloads} distinct payloads, {size:,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
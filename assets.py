@@ -0,0 +1,124 @@
+"""Background asset loading on a thread pool.
+
+The game declares its fonts, sound effects and music as Asset entries with
+the assets each one needs first (a sound needs the asset pack it's read
+from), and AssetLoader runs every load() on a ThreadPoolExecutor as soon
+as its dependencies are in. A load that raises falls back to the asset's
+fallback(), so a missing file never stops the game.
+
+Critical assets (the fonts, the sound effects) gate the first frame: the
+loading screen waits on critical_ready() and draws progress(). The rest,
+the music, are deferred and keep loading once play has started.
+
+The main thread never blocks on the loader after that. It polls once per
+frame (poll_loader() in QBert.py): take_completed() returns the names that
+finished since the last call, for follow-up such as starting the music,
+and once all_ready() is true it logs report() and calls shutdown(). Values
+are read with get() only after status says the asset is ready.
+"""
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("qbert.assets")
+
+
+class Asset:
+    """A named asset: how to load it, what it needs first, and what to use if loading fails."""
+    def __init__(self, name, load, deps=(), critical=True, fallback=None):
+        self.name = name
+        self.load = load          # load(dep_values) -> value, runs on a worker thread
+        self.deps = tuple(deps)   # Names of assets whose values load() receives
+        self.critical = critical  # The game waits for critical assets before the first frame
+        self.fallback = fallback  # fallback(dep_values) -> value used when load() raises
+
+
+class AssetLoader:
+    """Loads a graph of assets on worker threads, starting each one as soon as its dependencies are in."""
+    def __init__(self, assets, max_workers=4):
+        self.assets = {asset.name: asset for asset in assets}
+        self.values = {}
+        self.status = {name: "pending" for name in self.assets} # pending/loading/loaded/fallback
+        self.load_times = {} # Seconds spent in load() (and fallback) per asset
+        self.errors = {}
+        self._dependents = collections.defaultdict(list)
+        for asset in self.assets.values():
+            for dep in asset.deps:
+                if dep not in self.assets:
+                    raise ValueError(f"Asset {asset.name!r} depends on unknown asset {dep!r}")
+                self._dependents[dep].append(asset)
+        self._lock = threading.Lock()
+        self._completed = collections.deque() # Names finished since the last take_completed()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="qbert-assets")
+
+    def start(self):
+        """Submits every asset without dependencies; the rest follow as their dependencies finish."""
+        with self._lock:
+            for asset in self.assets.values():
+                if not asset.deps:
+                    self._submit(asset)
+
+    def _submit(self, asset):
+        self.status[asset.name] = "loading"
+        self._executor.submit(self._load, asset)
+
+    def _load(self, asset):
+        started = time.perf_counter()
+        dep_values = {dep: self.values[dep] for dep in asset.deps}
+        try:
+            value = asset.load(dep_values)
+            status = "loaded"
+        except Exception as e:
+            logger.warning("Asset %s failed to load (%s); using fallback", asset.name, e)
+            self.errors[asset.name] = e
+            status = "fallback"
+            try:
+                value = asset.fallback(dep_values) if asset.fallback else None
+            except Exception as fallback_error:
+                logger.error("Fallback for asset %s failed too: %s", asset.name, fallback_error)
+                value = None
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.values[asset.name] = value
+            self.load_times[asset.name] = elapsed
+            self.status[asset.name] = status
+            self._completed.append(asset.name)
+            for dependent in self._dependents[asset.name]:
+                if self.status[dependent.name] == "pending" and all(self.is_ready(dep) for dep in dependent.deps):
+                    self._submit(dependent)
+        logger.info("Asset %s %s in %.1f ms", asset.name, status, elapsed * 1000)
+
+    def is_ready(self, name):
+        return self.status[name] in ("loaded", "fallback")
+
+    def critical_ready(self):
+        return all(self.is_ready(asset.name) for asset in self.assets.values() if asset.critical)
+
+    def all_ready(self):
+        return all(self.is_ready(name) for name in self.assets)
+
+    def progress(self, critical_only=True):
+        """Returns (ready, total) over the critical assets, or over all of them."""
+        names = [asset.name for asset in self.assets.values() if asset.critical or not critical_only]
+        return sum(self.is_ready(name) for name in names), len(names)
+
+    def take_completed(self):
+        """Returns the names of assets that finished since the last call (for main-thread follow-up)."""
+        completed = []
+        while self._completed:
+            completed.append(self._completed.popleft())
+        return completed
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def report(self):
+        """One line per finished asset, slowest first."""
+        return [f"{name:24} {self.status[name]:8} {seconds * 1000:8.1f} ms"
+                for name, seconds in sorted(self.load_times.items(), key=lambda item: -item[1])]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,165 @@
+"""Asyncio runner for the game's main loop.
+
+With QBERT_ASYNC=1 each frame is one step of a coroutine that awaits the
+next frame deadline instead of sleeping in clock.tick(). Other asyncio tasks
+on the same thread (talking to a scoreboard service, polling coin inputs,
+the admin socket below) run in the slack between frames. They may read and
+change the game directly, since nothing else runs while they do, but must
+not block: anything that would goes in an executor.
+
+    QBERT_ASYNC=1 QBERT_ADMIN_PORT=7010 python QBert.py
+    printf 'status\\n' | nc 127.0.0.1 7010     # also: stats, reset, quit
+
+A frame that starts more than MISS_TOLERANCE after its deadline counts as a
+missed deadline (the previous frame or a side task overran); the runner then
+starts counting from the late frame rather than rushing to catch up.
+"""
+import asyncio
+import logging
+import os
+
+import pygame
+
+from simthread import Stats
+
+logger = logging.getLogger("qbert.asyncloop")
+
+MISS_TOLERANCE = 0.002 # Seconds; selector timeouts round up to the millisecond
+IDLE_POLL_INTERVAL = 0.02 # Seconds between event queue checks on static screens
+
+
+class FrameRunner:
+    """Calls main_loop.frame() once per frame deadline from a coroutine."""
+    def __init__(self, main_loop, rate=30):
+        self.main_loop = main_loop
+        self.interval = 1 / rate
+        self.frames = 0
+        self.missed = 0
+        self.lateness = Stats("frame start lateness")
+        self.frame_time = Stats("frame work")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        main_loop = self.main_loop
+        deadline = loop.time()
+        while main_loop.running:
+            if main_loop.is_idle():
+                # Static screen: yield to the other tasks until input or the next scheduled change
+                events = await self.wait_for_events(main_loop.session.idle_timeout(pygame.time.get_ticks()) / 1000)
+                deadline = loop.time() # An idle wait is not a missed frame
+            else:
+                events = pygame.event.get()
+
+            started = loop.time()
+            late = started - deadline
+            self.lateness.add(max(0.0, late))
+            if late > MISS_TOLERANCE:
+                self.missed += 1
+                deadline = started # Don't run the next frames back to back to catch up
+            main_loop.frame(events)
+            self.frames += 1
+            self.frame_time.add(loop.time() - started)
+
+            deadline += self.interval
+            await self.sleep_until(deadline) # Always yields, even when late
+
+    async def sleep_until(self, deadline):
+        """Waits for the frame deadline, reading input main_loop.input_polls times along the way."""
+        loop = asyncio.get_running_loop()
+        polls = self.main_loop.input_polls
+        while True:
+            remaining = deadline - loop.time()
+            if polls <= 1 or remaining <= self.interval / polls:
+                await asyncio.sleep(max(0.0, remaining))
+                return
+            await asyncio.sleep(self.interval / polls)
+            self.main_loop.poll()
+
+    async def wait_for_events(self, timeout):
+        """Polls the pygame event queue until it has events or `timeout` seconds pass."""
+        loop = asyncio.get_running_loop()
+        until = loop.time() + timeout
+        while True:
+            events = pygame.event.get()
+            remaining = until - loop.time()
+            if events or remaining <= 0:
+                return events
+            await asyncio.sleep(min(remaining, IDLE_POLL_INTERVAL))
+
+    def summary(self):
+        share = 100 * self.missed / self.frames if self.frames else 0.0
+        return f"{self.frames} frames, {self.missed} missed deadlines ({share:.1f}%)"
+
+
+class AdminServer:
+    """Line-based admin commands on a local TCP socket, served between frames."""
+    def __init__(self, runner, host="127.0.0.1", port=0):
+        self.runner = runner
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Admin commands on %s:%d", self.host, self.port)
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write((self.command(line.decode("utf-8", "replace").strip()) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def command(self, text):
+        session = self.runner.main_loop.session
+        if text == "status":
+            return (f"state={session.game_state} score={session.score} level={session.current_level} "
+                    f"lives={session.player.lives}")
+        if text == "stats":
+            return "; ".join([self.runner.summary(), self.runner.lateness.summary(), self.runner.frame_time.summary()])
+        if text == "reset":
+            session.reset_game()
+            return "ok"
+        if text == "quit":
+            self.runner.main_loop.running = False
+            return "ok"
+        return f"unknown command {text!r}; try status, stats, reset or quit"
+
+
+async def run_async(main_loop, rate, side_tasks=(), admin_port=None, admin_host="127.0.0.1"):
+    """Runs the frame loop and any side tasks (coroutine functions taking the runner) until the game quits.
+
+    The admin socket listens on `admin_port` (QBERT_ADMIN_PORT, parsed by the caller) when given.
+    """
+    runner = FrameRunner(main_loop, rate)
+    admin = None
+    if admin_port is not None:
+        admin = await AdminServer(runner, admin_host, admin_port).start()
+    tasks = [asyncio.ensure_future(task(runner)) for task in side_tasks]
+    try:
+        await runner.run()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if admin is not None:
+            admin.close()
+    logger.info("%s", runner.summary())
+    for stats in (runner.lateness, runner.frame_time):
+        logger.info("%s", stats.summary())
+    return runner
+
+
+def run(main_loop, rate=30, side_tasks=(), admin_port=None, admin_host="127.0.0.1"):
+    return asyncio.run(run_async(main_loop, rate, side_tasks, admin_port, admin_host))
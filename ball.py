@@ -1,11 +1,16 @@
+import logging
 import pygame
 import random
 
+from hopanim import Hop, build_hop_tables, FALL_DURATION, ENEMY_HOP_DURATION
+
+logger = logging.getLogger("qbert.ball")
+
 class Ball:
     """Represents a bouncing ball enemy."""
     def __init__(self, start_row, start_col, color, radius, move_interval, 
                  get_cube_screen_center_pos_func, play_sound_func, 
-                 pyramid_rows_config, cubes_per_row_config):
+                 pyramid_rows_config, cubes_per_row_config, hop_tables=None):
         self.initial_start_row = start_row # Store initial for reset
         self.initial_start_col = start_col # Store initial for reset
         self.grid_row = start_row
@@ -19,11 +24,13 @@ class Ball:
         self.play_sound = play_sound_func
         self.PYRAMID_ROWS = pyramid_rows_config
         self.CUBES_PER_ROW = cubes_per_row_config
+        self.hop_tables = hop_tables or build_hop_tables() # hopanim.HopTables for the game's layout scale
 
         self.last_move_time = pygame.time.get_ticks()
         self.is_active = False # Start inactive
         self.screen_x = -100 # Off-screen initially
         self.screen_y = -100 # Off-screen initially
+        self.hop = None # hopanim.Hop being drawn, if any
         # self.update_screen_pos() # Don't call if starting inactive off-screen
 
     def update_screen_pos(self):
@@ -50,7 +57,7 @@ class Ball:
         if not (0 <= self.grid_row < self.PYRAMID_ROWS and \
                 0 <= self.grid_col < self.CUBES_PER_ROW[self.grid_row]):
             # Fallback to a default safe position if provided start_row/col is invalid
-            print(f"Warning: Invalid reset position ({self.grid_row}, {self.grid_col}) for ball. Defaulting.")
+            logger.warning("Invalid reset position (%d, %d) for ball. Defaulting.", self.grid_row, self.grid_col)
             self.grid_row = 1 # Example: second row
             if self.PYRAMID_ROWS > 1 and self.CUBES_PER_ROW[1] > 0:
                  self.grid_col = random.randint(0, self.CUBES_PER_ROW[1] -1)
@@ -59,9 +66,10 @@ class Ball:
                 self.grid_col = 0
 
         self.is_active = True
+        self.hop = None
         self.update_screen_pos()
         self.last_move_time = pygame.time.get_ticks()
-        print(f"Ball reset to ({self.grid_row}, {self.grid_col})")
+        logger.debug("Ball reset to (%d, %d)", self.grid_row, self.grid_col)
 
 
     def move(self):
@@ -72,13 +80,15 @@ class Ball:
         current_time = pygame.time.get_ticks()
         if current_time - self.last_move_time > self.move_interval:
             self.last_move_time = current_time
+            start_pos = (self.screen_x, self.screen_y) # Where the hop is drawn from
             
             next_row = self.grid_row + 1
             if next_row >= self.PYRAMID_ROWS: # Fallen off the bottom
+                self.hop = Hop(self.hop_tables.fall, current_time, FALL_DURATION, start_pos, start_pos) # Bounces in place and drops
                 self.is_active = False
                 self.update_screen_pos() # Move to off-screen coordinates
                 # self.play_sound("fall") # Optional: sound for ball falling off
-                print(f"Ball fell off bottom from ({self.grid_row}, {self.grid_col})")
+                logger.debug("Ball fell off bottom from (%d, %d)", self.grid_row, self.grid_col)
                 return
 
             possible_next_cols = []
@@ -94,24 +104,35 @@ class Ball:
                 self.is_active = False
                 self.update_screen_pos()
                 # self.play_sound("fall") # Optional
-                print(f"Ball has no valid moves from ({self.grid_row}, {self.grid_col})")
+                logger.debug("Ball has no valid moves from (%d, %d)", self.grid_row, self.grid_col)
                 return
 
             # Choose one of the valid next columns randomly
             next_col = random.choice(possible_next_cols)
+            hop_table = self.hop_tables.diagonal[(1, next_col - self.grid_col)] # Down-left or down-right
             
             self.grid_row = next_row
             self.grid_col = next_col
             
             if self.update_screen_pos(): # True if new position is valid
+                self.hop = Hop(hop_table, current_time, min(ENEMY_HOP_DURATION, self.move_interval),
+                               start_pos, (self.screen_x, self.screen_y))
                 self.play_sound("ball_bounce") # Changed from "enemy_hop" to specific sound
             else: # Should be caught by is_active False in update_screen_pos if it falls off
                 # This else might be redundant if update_screen_pos handles deactivation
-                print(f"Ball moved to invalid position ({self.grid_row}, {self.grid_col})")
+                logger.warning("Ball moved to invalid position (%d, %d)", self.grid_row, self.grid_col)
 
-    def draw(self, surface):
-        """Draws the ball on the screen."""
-        if self.is_active and self.screen_x > 0: # screen_x > 0 as a quick check for on-screen
+    def draw(self, surface, now=None):
+        """Draws the ball on the screen; with `now` (ticks), along any hop in progress."""
+        pose = self.hop.at(now) if self.hop is not None and now is not None else None
+        if pose is not None:
+            # Squashed into an ellipse resting where the circle's bottom would be
+            x, y, squash_x, squash_y = pose
+            width, height = round(2 * self.radius * squash_x), round(2 * self.radius * squash_y)
+            rect = pygame.Rect(0, 0, width, height)
+            rect.midbottom = (x, y + self.radius)
+            pygame.draw.ellipse(surface, self.color, rect)
+        elif self.is_active and self.screen_x > 0: # screen_x > 0 as a quick check for on-screen
             pygame.draw.circle(surface, self.color, (self.screen_x, self.screen_y), self.radius)
             # Optional: draw an outline for the ball
             # pygame.draw.circle(surface, (0,0,0), (self.screen_x, self.screen_y), self.radius, 1)
@@ -0,0 +1,272 @@
+"""Background gameplay video capture.
+
+With QBERT_CAPTURE set to a directory, every presented frame is copied
+straight from the display surface into a free slot of a preallocated pool
+in shared memory, right after pygame.display.flip(). That one memcpy is
+all the game thread does. A worker process compresses the frame, keeps the
+last few seconds in memory for instant replays (F9 saves one) and can also
+write everything it receives:
+
+    QBERT_CAPTURE=clips python QBert.py                              # replays on F9 only
+    QBERT_CAPTURE=clips QBERT_CAPTURE_FORMAT=qbv python QBert.py     # plus one continuous .qbv file
+    QBERT_CAPTURE_FORMAT=png / raw                                   # plus one file per frame
+    python capture.py export clips/replay-....qbv frames/           # .qbv -> PNG sequence
+
+The pool is the bounded queue. When every slot is still waiting for the
+worker, the new frame is dropped (and counted) rather than waiting, so a
+slow disk costs frames, never frame time.
+
+.qbv layout (little-endian): header "QBVC", version u16, width u16, height
+u16, pixel format (4 ASCII bytes of channel order, like "BGRX"), then per
+frame: frame number u32, game time in ms u32, length u32, zlib-compressed
+pixels.
+"""
+import argparse
+import collections
+import logging
+import multiprocessing
+import os
+import struct
+import sys
+import time
+import zlib
+from multiprocessing import shared_memory
+
+logger = logging.getLogger("qbert.capture")
+
+CONTAINER_MAGIC = b"QBVC"
+CONTAINER_VERSION = 1
+CONTAINER_HEADER = struct.Struct("<4sHHH4s")
+FRAME_HEADER = struct.Struct("<III")
+
+POOL_SLOTS = 8        # Frames that can wait for the worker before new ones are dropped
+REPLAY_SECONDS = 10.0 # Length of the instant-replay ring
+COMPRESS_LEVEL = 1    # zlib level; frames are mostly flat colour, so 1 already shrinks them ~50x
+FORMATS = ("replay", "qbv", "png", "raw") # "replay": keep only the ring, written on save_replay()
+
+SLOT_FREE = 0
+SLOT_QUEUED = 1
+
+
+def pixel_format(surface):
+    """Channel order of a 32-bit surface's pixels in memory, e.g. "BGRX" (X: unused byte)."""
+    if surface.get_bytesize() != 4:
+        raise ValueError("Capture needs a 32-bit display surface")
+    order = {surface.get_shifts()[i]: "RGB"[i] for i in range(3)}
+    names = [order.get(shift, "X") for shift in (0, 8, 16, 24)] # Shift 0 is the first byte on little-endian
+    return "".join(names) if sys.byteorder == "little" else "".join(reversed(names))
+
+
+def frame_surface(pixels, size, pixel_format):
+    """Rebuilds an opaque Surface from captured pixels."""
+    import pygame
+    shifts = [8 * (pixel_format.index(channel) if sys.byteorder == "little" else 3 - pixel_format.index(channel))
+              for channel in "RGB"]
+    image = pygame.Surface(size, 0, 32, [0xFF << shift for shift in shifts] + [0])
+    image.get_buffer().write(pixels)
+    return image
+
+
+class FrameCapture:
+    """Game-side half: copies presented frames into the shared pool and queues them for the worker."""
+    def __init__(self, surface, directory, output_format="replay", replay_seconds=REPLAY_SECONDS,
+                 slots=POOL_SLOTS, every=1):
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown capture format {output_format!r}; expected one of {FORMATS}")
+        self.size = surface.get_size()
+        self.format = pixel_format(surface)
+        self.pitch = surface.get_pitch()
+        self.frame_bytes = self.pitch * self.size[1]
+        self.every = every # Capture every Nth presented frame
+        os.makedirs(directory, exist_ok=True)
+
+        # Slot states first, then the frame slots, each on a 64-byte boundary
+        self.slots = slots
+        self._data_offset = -(-slots // 64) * 64
+        self._slot_stride = -(-self.frame_bytes // 64) * 64
+        self._memory = shared_memory.SharedMemory(create=True, size=self._data_offset + slots * self._slot_stride)
+        self._states = self._memory.buf[:slots]
+        self._states[:] = bytes(slots)
+        self._next_slot = 0
+
+        context = multiprocessing.get_context("spawn") # Never fork a process that owns a window
+        self._requests = context.Queue()
+        self._worker = context.Process(
+            target=worker_main, name="qbert-capture", daemon=True,
+            args=(self._memory.name, self._requests, directory, output_format, self.size, self.format,
+                  self.pitch, self._data_offset, self._slot_stride, slots, replay_seconds))
+        self._worker.start()
+
+        self.presented = 0       # Frames offered to capture()
+        self.captured = 0        # Frames copied into the pool
+        self.dropped = 0         # Frames skipped because every slot was busy
+        self.capture_seconds = 0.0 # Game-thread time spent in capture(), including drops
+
+    def _free_slot(self):
+        """Index of a free slot, searching round-robin from the last one used, or None."""
+        for i in range(self.slots):
+            slot = (self._next_slot + i) % self.slots
+            if self._states[slot] == SLOT_FREE:
+                self._next_slot = (slot + 1) % self.slots
+                return slot
+        return None
+
+    def capture(self, surface, time_ms):
+        """Copies one presented frame into the pool; call right after display.flip()."""
+        started = time.perf_counter()
+        self.presented += 1
+        frame_number = self.presented
+        if self.presented % self.every == 0:
+            slot = self._free_slot()
+            if slot is None:
+                self.dropped += 1
+            else:
+                offset = self._data_offset + slot * self._slot_stride
+                pixels = surface.get_buffer()
+                self._memory.buf[offset:offset + self.frame_bytes] = pixels
+                del pixels # Unlocks the surface
+                self._states[slot] = SLOT_QUEUED
+                self._requests.put(("frame", slot, frame_number, time_ms))
+                self.captured += 1
+        self.capture_seconds += time.perf_counter() - started
+
+    def save_replay(self, name=None):
+        """Asks the worker to write its replay ring to a .qbv file (name defaults to a timestamp)."""
+        self._requests.put(("save", name or time.strftime("replay-%Y%m%d-%H%M%S.qbv")))
+
+    def stats(self):
+        per_frame = self.capture_seconds / self.presented * 1e6 if self.presented else 0.0
+        return (f"{self.captured} frames captured, {self.dropped} dropped of {self.presented} presented; "
+                f"{per_frame:.0f} us game-thread cost per frame")
+
+    def close(self):
+        """Lets the worker finish everything queued, then frees the pool."""
+        self._requests.put(("stop",))
+        self._worker.join()
+        self._requests.close()
+        logger.info("Capture: %s", self.stats())
+        self._states.release()
+        self._memory.close()
+        self._memory.unlink()
+
+
+def write_container_header(f, size, pixel_format):
+    f.write(CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION, size[0], size[1], pixel_format.encode("ascii")))
+
+
+def worker_main(memory_name, requests, directory, output_format, size, pixel_format, pitch,
+                data_offset, slot_stride, slots, replay_seconds):
+    """Worker process: compresses queued frames, keeps the replay ring and writes the chosen output."""
+    logging.basicConfig(level=logging.INFO, format="%(processName)s %(levelname)-7s %(name)s: %(message)s")
+    memory = shared_memory.SharedMemory(memory_name)
+    states = memory.buf[:slots]
+    width, height = size
+    row_bytes = width * 4
+    replay = collections.deque() # (frame number, time ms, compressed pixels), oldest first
+    stream = None
+    if output_format == "qbv":
+        stream = open(os.path.join(directory, time.strftime("capture-%Y%m%d-%H%M%S.qbv")), "wb")
+        write_container_header(stream, size, pixel_format)
+    if output_format == "png":
+        os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+        import pygame
+
+    while True:
+        request = requests.get()
+        if request[0] == "stop":
+            break
+        if request[0] == "save":
+            path = os.path.join(directory, request[1])
+            with open(path, "wb") as f:
+                write_container_header(f, size, pixel_format)
+                for frame_number, time_ms, packed in replay:
+                    f.write(FRAME_HEADER.pack(frame_number, time_ms, len(packed)))
+                    f.write(packed)
+            logger.info("Saved %d replay frames to %s", len(replay), path)
+            continue
+
+        _, slot, frame_number, time_ms = request
+        offset = data_offset + slot * slot_stride
+        if pitch == row_bytes:
+            pixels = bytes(memory.buf[offset:offset + row_bytes * height])
+        else: # Drop the row padding
+            pixels = b"".join(memory.buf[offset + row * pitch:offset + row * pitch + row_bytes] for row in range(height))
+        states[slot] = SLOT_FREE # The game may reuse the slot now
+        packed = zlib.compress(pixels, COMPRESS_LEVEL)
+
+        replay.append((frame_number, time_ms, packed))
+        while replay and time_ms - replay[0][1] > replay_seconds * 1000:
+            replay.popleft()
+        if stream is not None:
+            stream.write(FRAME_HEADER.pack(frame_number, time_ms, len(packed)))
+            stream.write(packed)
+        elif output_format == "raw":
+            with open(os.path.join(directory, f"frame-{frame_number:07d}.raw"), "wb") as f:
+                f.write(pixels)
+        elif output_format == "png":
+            pygame.image.save(frame_surface(pixels, size, pixel_format), os.path.join(directory, f"frame-{frame_number:07d}.png"))
+
+    if stream is not None:
+        stream.close()
+    states.release()
+    memory.close()
+
+
+def read_container(path):
+    """Yields (frame number, time ms, pixels) from a .qbv file; the first item is (size, pixel format)."""
+    with open(path, "rb") as f:
+        magic, version, width, height, pixel_format = CONTAINER_HEADER.unpack(f.read(CONTAINER_HEADER.size))
+        if magic != CONTAINER_MAGIC or version != CONTAINER_VERSION:
+            raise ValueError(f"{path} is not a version {CONTAINER_VERSION} capture file")
+        yield (width, height), pixel_format.decode("ascii")
+        while True:
+            header = f.read(FRAME_HEADER.size)
+            if len(header) < FRAME_HEADER.size:
+                return
+            frame_number, time_ms, length = FRAME_HEADER.unpack(header)
+            packed = f.read(length)
+            if len(packed) < length: # Cut short by a crash
+                return
+            yield frame_number, time_ms, zlib.decompress(packed)
+
+
+def export(path, out_dir):
+    import pygame
+    os.makedirs(out_dir, exist_ok=True)
+    frames = read_container(path)
+    size, pixel_format = next(frames)
+    count = 0
+    for frame_number, time_ms, pixels in frames:
+        image = frame_surface(pixels, size, pixel_format)
+        pygame.image.save(image, os.path.join(out_dir, f"frame-{frame_number:07d}-{time_ms:08d}ms.png"))
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work with captured gameplay video.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="write the frames of a .qbv file as PNGs")
+    export_parser.add_argument("path")
+    export_parser.add_argument("out_dir")
+    info_parser = sub.add_parser("info", help="frame count, duration and size of a .qbv file")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"Wrote {export(args.path, args.out_dir)} frames to {args.out_dir}")
+        return 0
+    frames = read_container(args.path)
+    size, pixel_format = next(frames)
+    count, first, last, packed_bytes = 0, None, None, os.path.getsize(args.path)
+    for frame_number, time_ms, _ in frames:
+        count += 1
+        first = time_ms if first is None else first
+        last = time_ms
+    duration = (last - first) / 1000 if count else 0.0
+    print(f"{args.path}: {size[0]}x{size[1]} {pixel_format}, {count} frames over {duration:.1f} s, {packed_bytes:,} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
+import logging
 import pygame
 
+logger = logging.getLogger("qbert.disc")
+
 class Disc:
     """Represents a floating disc that Q*bert can use to return to the top."""
     def __init__(self, screen_x, screen_y, radius, color, cooldown_duration):
@@ -13,25 +16,26 @@ class Disc:
         self.COOLDOWN_DURATION = cooldown_duration
         self.cooldown_timer_start = 0 # Timestamp when cooldown begins
 
-    def draw(self, surface):
+    def draw(self, surface, outline=True):
         """Draws the disc on the screen."""
         current_color = self.active_color if self.is_active else self.cooldown_color
         pygame.draw.circle(surface, current_color, (self.screen_x, self.screen_y), self.radius)
         # Optional: Draw an outline
-        pygame.draw.circle(surface, (0,0,0), (self.screen_x, self.screen_y), self.radius, 1)
+        if outline:
+            pygame.draw.circle(surface, (0,0,0), (self.screen_x, self.screen_y), self.radius, 1)
 
 
     def activate(self):
         """Activates the disc, making it usable."""
         self.is_active = True
         self.cooldown_timer_start = 0
-        print(f"Disc at ({self.screen_x}, {self.screen_y}) activated.")
+        logger.debug("Disc at (%s, %s) activated.", self.screen_x, self.screen_y)
 
     def deactivate(self):
         """Deactivates the disc and starts its cooldown."""
         self.is_active = False
         self.cooldown_timer_start = pygame.time.get_ticks()
-        print(f"Disc at ({self.screen_x}, {self.screen_y}) deactivated. Cooldown started.")
+        logger.debug("Disc at (%s, %s) deactivated. Cooldown started.", self.screen_x, self.screen_y)
 
     def update_cooldown(self):
         """Checks if the cooldown period has passed and reactivates the disc."""
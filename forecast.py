@@ -0,0 +1,239 @@
+"""Danger forecast: where the enemies can be over their next few hops.
+
+The red ball hops down-left or down-right at random every BALL_MOVE_INTERVAL
+(and a new one spawns on row 1 when it falls off the bottom), and Coily hops
+towards a fixed target (Q*bert, or the cube Q*bert left from on a disc) with
+only tie-breaks left to chance. So from an enemy's cube
+(and Coily's target) the chance of it being on each cube after 1..K hops
+depends on nothing else, and is computed once per starting point in
+ForecastTables, shared by every session in the process.
+
+A session's DangerForecast holds one track per enemy: the table entry for
+where it stands now, plus its last hop time and hop interval. update_forecast()
+only replaces a track when its enemy hopped, spawned, died or changed target,
+and danger()/is_safe() answer for any cube and game time with one lookup
+per enemy. Coily's forecast assumes Q*bert stays where he is. In the game,
+F2 marks the cubes an enemy may be on when a hop started now would land.
+
+    python forecast.py check      # compare forecasts with simulated games
+"""
+import argparse
+import random
+import sys
+
+DEFAULT_HOPS = 4  # K: hops forecast ahead per enemy
+HOP_MARGIN = 34   # Milliseconds a hop can come after its interval: up to a frame at 30 Hz
+HINT_RADIUS = 6
+HORIZON_CHECK_MS = 2800 # How far ahead check() asks; four ball hops
+
+
+class ForecastTables:
+    """Per-hop occupancy probabilities from every starting point, built on first use and shared."""
+    def __init__(self, cells, coily_moves, hops=DEFAULT_HOPS):
+        self.cells = set(cells)
+        self.coily_moves = coily_moves
+        self.hops = hops
+        self._ball = {}
+        self._coily = {}
+        # A ball spawns on a random cube of row 1 (see GameSession.update_ball_spawn)
+        spawn_cells = [cell for cell in cells if cell[0] == 1] or [(0, 0)]
+        self.spawn = {cell: 1 / len(spawn_cells) for cell in spawn_cells}
+        self.ball_spawn = self._layers(self.spawn, self._ball_step)
+
+    def ball(self, cell):
+        layers = self._ball.get(cell)
+        if layers is None:
+            layers = self._ball[cell] = self._layers({cell: 1.0}, self._ball_step)
+        return layers
+
+    def coily(self, cell, target):
+        layers = self._coily.get((cell, target))
+        if layers is None:
+            layers = self._coily[(cell, target)] = self._layers({cell: 1.0}, lambda c: self._coily_step(c, target))
+        return layers
+
+    def fall(self, cell):
+        """On `cell` now and off the pyramid after the next hop."""
+        return ({cell: 1.0},) + ({},) * self.hops
+
+    def _layers(self, start, step):
+        """(start, after 1 hop, ..., after K hops) as {cell: probability} dicts."""
+        layers = [start]
+        for _ in range(self.hops):
+            following = {}
+            for cell, probability in layers[-1].items():
+                for next_cell, chance in step(cell):
+                    following[next_cell] = following.get(next_cell, 0.0) + probability * chance
+            layers.append(following)
+        return tuple(layers)
+
+    def _ball_step(self, cell):
+        # Ball.move(): random.choice between the two cubes below
+        row, col = cell
+        below = [c for c in ((row + 1, col), (row + 1, col + 1)) if c in self.cells]
+        if not below:
+            return self.spawn.items() # Fell off the bottom; a new ball spawns the next frame
+        return [(c, 1 / len(below)) for c in below]
+
+    def _coily_step(self, cell, target):
+        # Enemy.move(): the closest hop to the target wins; each later tie replaces the pick on a coin flip
+        moves = self.coily_moves.get(cell, ())
+        if not moves:
+            return [(cell, 1.0)] # Stuck: Coily stays put
+        best = {}
+        best_distance = None
+        for dr, dc in moves:
+            next_cell = (cell[0] + dr, cell[1] + dc)
+            distance = (next_cell[0] - target[0]) ** 2 + (next_cell[1] - target[1]) ** 2
+            if best_distance is None or distance < best_distance:
+                best, best_distance = {next_cell: 1.0}, distance
+            elif distance == best_distance:
+                best = {c: p / 2 for c, p in best.items()}
+                best[next_cell] = best.get(next_cell, 0.0) + 0.5
+        return list(best.items())
+
+
+class Track:
+    """One enemy's forecast: layers[n] is where it is after n more hops, timed from `base`."""
+    __slots__ = ("layers", "base", "interval")
+
+    def __init__(self, layers, base, interval):
+        self.layers = layers
+        self.base = base         # Ticks of the last hop (or when a spawn becomes possible)
+        self.interval = interval # Milliseconds between hops
+
+    def hops_by(self, t, late=0):
+        """Hops made by game time t if each comes `late` ms after its interval; -1 before the enemy appears."""
+        if t < self.base:
+            return -1
+        return max(0, (t - self.base - 1) // (self.interval + late)) # Enemies hop on the first frame past each interval
+
+    def probability(self, cell, t):
+        """Chance of the enemy being on `cell` at t, or None beyond the forecast horizon."""
+        most = self.hops_by(t)
+        if most >= len(self.layers):
+            return None
+        # Each hop can come up to a frame late, so the enemy may be a few layers behind
+        fewest = self.hops_by(t, HOP_MARGIN)
+        if fewest == most:
+            return self.layers[most].get(cell, 0.0) if most >= 0 else 0.0
+        return max(self.layers[hop].get(cell, 0.0) for hop in range(max(fewest, 0), most + 1))
+
+
+class DangerForecast:
+    """Per-cube chance of meeting an enemy at a given game time, kept up to date by GameSession.update_forecast()."""
+    def __init__(self, tables):
+        self.tables = tables
+        self.tracks = {} # "coily" / "ball" -> Track
+        self._keys = {}  # What each track was built from, to skip unchanged enemies
+        self.rebuilds = 0
+
+    @property
+    def horizon(self):
+        return self.tables.hops
+
+    def stale(self, name, key):
+        """True (and remembers `key`) if the named track was built from something else."""
+        if self._keys.get(name) == key:
+            return False
+        self._keys[name] = key
+        self.rebuilds += 1
+        return True
+
+    def set_track(self, name, track):
+        if track is None:
+            self.tracks.pop(name, None)
+        else:
+            self.tracks[name] = track
+
+    def danger(self, row, col, t):
+        """Chance that some enemy is on cube (row, col) at game time t; None if t is past the horizon."""
+        clear = 1.0
+        for track in self.tracks.values():
+            probability = track.probability((row, col), t)
+            if probability is None:
+                return None
+            clear *= 1.0 - probability
+        return 1.0 - clear
+
+    def is_safe(self, row, col, t, threshold=0.0):
+        """True if the cube's danger at t is known and at most `threshold`."""
+        danger = self.danger(row, col, t)
+        return danger is not None and danger <= threshold
+
+    def draw_hints(self, surface, t, cube_centers, radius=HINT_RADIUS):
+        """Marks each cube with some danger at time t, redder for likelier."""
+        import pygame
+        for cell, center in cube_centers.items():
+            danger = self.danger(cell[0], cell[1], t)
+            if danger:
+                pygame.draw.circle(surface, (255, int(255 * (1 - danger)), 0), center, radius)
+
+
+def check(games=300, steps=600, seed=1):
+    """Plays random games and compares forecast probabilities with where the enemies really were.
+
+    Each forecast is the ball's track as it stood when the forecast was made,
+    read for the first frame at or after a random time up to HORIZON_CHECK_MS
+    ahead. Forecasts across a death or level change are not judged.
+    """
+    import logging
+    import fuzzer
+    logging.disable(logging.CRITICAL)
+    game = fuzzer.load_game()
+    rng = random.Random(seed)
+    random.seed(seed)
+    buckets = [[0, 0.0, 0] for _ in range(10)] # [cells forecast, sum of probabilities, hits] by probability decile
+    judged = surprises = rebuilds = frames = 0
+    for _ in range(games):
+        fuzzer._clock.ticks = 0
+        session = fuzzer.new_session(game)
+        forecast = session.enable_forecast()
+        pending = [] # (due ticks, track, (lives, level) when made)
+        for key, _ in fuzzer.generate_trace(rng, steps): # Random keys, steady 30 Hz frames
+            fuzzer._clock.ticks += 33
+            now = fuzzer._clock.ticks
+            session.update(now, [fuzzer.KEY_CODES[key]] if key else [])
+            frames += 1
+            ball = session.red_ball
+            life = (session.player.lives, session.current_level)
+            for due, track, made_in in [p for p in pending if now >= p[0]]:
+                pending.remove((due, track, made_in))
+                if made_in == life and session.game_state == game.STATE_PLAYING and ball.is_active:
+                    judged += 1
+                    actual = (ball.grid_row, ball.grid_col)
+                    if not track.probability(actual, now):
+                        surprises += 1
+                    for cell in game.CUBE_CELLS:
+                        probability = track.probability(cell, now)
+                        if probability:
+                            bucket = buckets[min(int(probability * 10), 9)]
+                            bucket[0] += 1
+                            bucket[1] += probability
+                            bucket[2] += cell == actual
+            if session.game_state == game.STATE_PLAYING and "ball" in forecast.tracks:
+                track = forecast.tracks["ball"]
+                due = now + rng.randrange(0, HORIZON_CHECK_MS)
+                if track.probability((0, 0), due) is not None: # Within the horizon
+                    pending.append((due, track, life))
+        rebuilds += forecast.rebuilds
+    print(f"{games} games, {frames} frames, {rebuilds} track rebuilds ({rebuilds / frames:.2f} per frame)")
+    print(f"{judged} ball forecasts judged, {surprises} with the ball on a cube given no chance")
+    print("  forecast p   cells  mean p  observed")
+    for decile, (count, total, hits) in enumerate(buckets):
+        if count:
+            print(f"  {decile / 10:.1f}-{(decile + 1) / 10:.1f}  {count:8}  {total / count:6.3f}  {hits / count:8.3f}")
+    return surprises
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the enemy danger forecast.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check_parser = sub.add_parser("check", help="compare forecasts with simulated games")
+    check_parser.add_argument("--games", type=int, default=300)
+    args = parser.parse_args()
+    return 1 if check(args.games) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+"""Randomized fuzzer for the Q*bert game logic.
+
+Fires random key sequences and frame timings at QBert's update functions in
+parallel worker processes, checks game invariants after every frame and
+shrinks each failure it finds to a minimal trace that can be replayed.
+
+    python fuzzer.py --runs 200000 --steps 400
+    python fuzzer.py --replay fuzz_failures/failure_0.json
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # No window or audio device needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import logging
+import multiprocessing
+import random
+import sys
+import time
+import traceback
+
+import pygame
+
+import gamelog
+
+# Keys the fuzzer can press, by the name used in saved traces (None = no key this frame)
+KEY_CODES = {
+    "left": pygame.K_LEFT,
+    "up": pygame.K_UP,
+    "down": pygame.K_DOWN,
+    "right": pygame.K_RIGHT,
+    "r": pygame.K_r,
+    "n": pygame.K_n,
+}
+KEY_WEIGHTS = [(None, 60), ("left", 8), ("up", 8), ("down", 8), ("right", 8), ("r", 4), ("n", 4)]
+# Milliseconds between frames; mostly the 30 fps frame time, with stalls and bursts mixed in
+FRAME_DT_CHOICES = [33, 33, 33, 33, 0, 1, 16, 100, 500, 1600]
+MIN_SHRINK_DT = 1
+
+
+class VirtualClock:
+    """Stands in for pygame.time.get_ticks() so traces replay with exact timings."""
+    def __init__(self):
+        self.ticks = 0
+
+    def get_ticks(self):
+        return self.ticks
+
+
+_clock = VirtualClock()
+_game = None # QBert module, loaded once per process by load_game()
+
+
+def load_game():
+    """Imports the game logic in this process with the virtual clock installed."""
+    global _game
+    if _game is None:
+        pygame.time.get_ticks = _clock.get_ticks # Game code looks this up on every call
+        import QBert
+        _game = QBert
+    return _game
+
+
+def generate_trace(rng, steps):
+    """Builds a random list of [key_name, dt] frames."""
+    names = [name for name, _ in KEY_WEIGHTS]
+    weights = [weight for _, weight in KEY_WEIGHTS]
+    keys = rng.choices(names, weights, k=steps)
+    return [[key, rng.choice(FRAME_DT_CHOICES)] for key in keys]
+
+
+def new_session(game):
+    """A fresh GameSession, reset at the current virtual time."""
+    session = game.GameSession()
+    session.reset_game()
+    return session
+
+
+def on_board(session, row, col):
+    return (row, col) in session.pyramid.index # The current level's pyramid
+
+
+def check_invariants(game, session):
+    """Returns (kind, detail) for the first broken invariant, or None."""
+    for name, entity in (("player", session.player), ("coily", session.coily), ("red_ball", session.red_ball)):
+        if entity.is_active and not on_board(session, entity.grid_row, entity.grid_col):
+            return f"{name} active off the board", f"at ({entity.grid_row}, {entity.grid_col})"
+
+    if session.player.lives < 0:
+        return "negative lives", f"lives={session.player.lives}"
+
+    if session.game_state not in (game.STATE_PLAYING, game.STATE_GAME_OVER, game.STATE_LEVEL_COMPLETE,
+                                  game.STATE_PLAYER_DIED, game.STATE_SPLASH_SCREEN):
+        return "unknown game state", f"game_state={session.game_state}"
+    if session.game_state == game.STATE_GAME_OVER and session.player.lives > 0:
+        return "game over with lives left", f"lives={session.player.lives}"
+
+    completed = 0
+    for cube in session.pyramid_cubes:
+        if cube.is_target_color != (cube.current_colors == cube.target_colors):
+            return "cube flag out of sync with colors", f"cube ({cube.grid_row}, {cube.grid_col})"
+        completed += cube.is_target_color
+    if session.game_state == game.STATE_PLAYING and completed == len(session.pyramid_cubes):
+        return "completed pyramid not detected", f"{completed}/{len(session.pyramid_cubes)} cubes"
+
+    if session.score < 0 or session.score % 25:
+        return "score not a multiple of 25", f"score={session.score}"
+    return None
+
+
+def run_trace(seed, trace):
+    """Replays one trace; returns None or a failure dict with the step it failed on."""
+    game = load_game()
+    random.seed(seed) # Enemy and ball AI use the global random module
+    _clock.ticks = 0
+    session = new_session(game)
+
+    for step, (key, dt) in enumerate(trace):
+        _clock.ticks += dt
+        try:
+            session.update(_clock.ticks, [KEY_CODES[key]] if key else [])
+        except Exception as e:
+            frame = traceback.extract_tb(e.__traceback__)[-1]
+            return {
+                "kind": f"{type(e).__name__} in {frame.name}() line {frame.lineno}",
+                "detail": str(e),
+                "step": step,
+                "traceback": traceback.format_exc(),
+            }
+        problem = check_invariants(game, session)
+        if problem:
+            return {"kind": problem[0], "detail": problem[1], "step": step}
+    return None
+
+
+def fails_with(seed, trace, kind):
+    failure = run_trace(seed, trace)
+    return failure is not None and failure["kind"] == kind
+
+
+def shrink_trace(seed, trace, kind):
+    """Reduces a failing trace while it still fails the same way (delta debugging)."""
+    failure = run_trace(seed, trace)
+    trace = trace[:failure["step"] + 1] # Nothing after the failing frame matters
+
+    progress = True
+    while progress:
+        progress = False
+
+        # Drop chunks of frames, from large chunks down to single frames
+        chunk = len(trace) // 2
+        while chunk >= 1:
+            start = 0
+            while start < len(trace):
+                candidate = trace[:start] + trace[start + chunk:]
+                if candidate and fails_with(seed, candidate, kind):
+                    trace = candidate
+                    progress = True
+                else:
+                    start += chunk
+            chunk //= 2
+
+        # Replace key presses with idle frames
+        for i, (key, dt) in enumerate(trace):
+            if key is not None:
+                candidate = trace[:i] + [[None, dt]] + trace[i + 1:]
+                if fails_with(seed, candidate, kind):
+                    trace = candidate
+                    progress = True
+
+        # Shorten frame gaps
+        for i, (key, dt) in enumerate(trace):
+            while dt > MIN_SHRINK_DT:
+                candidate = trace[:i] + [[key, dt // 2]] + trace[i + 1:]
+                if not fails_with(seed, candidate, kind):
+                    break
+                trace = candidate
+                dt //= 2
+                progress = True
+
+    return trace
+
+
+def fuzz_batch(args):
+    """Worker task: runs a block of seeds, returning runs done and the first failure of each kind."""
+    first_seed, count, steps = args
+    failures = {}
+    for seed in range(first_seed, first_seed + count):
+        trace = generate_trace(random.Random(seed), steps)
+        failure = run_trace(seed, trace)
+        if failure and failure["kind"] not in failures:
+            failure.update(seed=seed, trace=trace)
+            failures[failure["kind"]] = failure
+    return count, failures
+
+
+def shrink_task(failure):
+    trace = shrink_trace(failure["seed"], failure["trace"], failure["kind"])
+    shrunk = run_trace(failure["seed"], trace)
+    shrunk.update(seed=failure["seed"], trace=trace, original_length=len(failure["trace"]))
+    return shrunk
+
+
+def worker_init():
+    logging.disable(logging.CRITICAL) # Keep game logging out of the fuzzing loop
+    load_game()
+
+
+def fuzz(runs, steps, workers, base_seed, batch_size, out_dir):
+    failures = {}
+    started = time.perf_counter()
+    tasks = [(base_seed + first, min(batch_size, runs - first), steps)
+             for first in range(0, runs, batch_size)]
+
+    with multiprocessing.Pool(workers, initializer=worker_init) as pool:
+        done = 0
+        for count, batch_failures in pool.imap_unordered(fuzz_batch, tasks):
+            done += count
+            for kind, failure in batch_failures.items():
+                if kind not in failures:
+                    failures[kind] = failure
+                    print(f"[{done}/{runs}] new failure: {kind} ({failure['detail']})")
+        elapsed = time.perf_counter() - started
+        print(f"Ran {runs} traces x {steps} frames in {elapsed:.1f}s "
+              f"({runs * steps / elapsed:,.0f} frames/s on {workers} workers)")
+
+        shrunk = pool.map(shrink_task, list(failures.values()))
+
+    if shrunk:
+        os.makedirs(out_dir, exist_ok=True)
+    for i, failure in enumerate(shrunk):
+        path = os.path.join(out_dir, f"failure_{i}.json")
+        with open(path, "w") as f:
+            json.dump(failure, f, indent=1)
+        print(f"{failure['kind']}: shrunk {failure['original_length']} -> {len(failure['trace'])} frames, saved to {path}")
+    return len(shrunk)
+
+
+def replay(path):
+    with open(path) as f:
+        saved = json.load(f)
+    gamelog.setup_logging(level="DEBUG") # Show what the game did on the way to the failure
+    failure = run_trace(saved["seed"], saved["trace"])
+    if failure is None:
+        print("Trace no longer fails.")
+        return 0
+    print(f"Failed at frame {failure['step']}: {failure['kind']} ({failure['detail']})")
+    if "traceback" in failure:
+        print(failure["traceback"])
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the Q*bert game logic with random input traces.")
+    parser.add_argument("--runs", type=int, default=100000, help="number of random traces")
+    parser.add_argument("--steps", type=int, default=300, help="frames per trace")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="first trace seed")
+    parser.add_argument("--batch", type=int, default=500, help="traces per worker task")
+    parser.add_argument("--out", default="fuzz_failures", help="directory for shrunk failure traces")
+    parser.add_argument("--replay", help="replay a saved failure trace instead of fuzzing")
+    args = parser.parse_args()
+
+    if args.replay:
+        return replay(args.replay)
+    return 1 if fuzz(args.runs, args.steps, args.workers, args.seed, args.batch, args.out) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Logging setup for the game.
+
+Each subsystem logs through its own stdlib logger ("qbert.ball", "qbert.coily",
+"qbert.disc", "qbert.player", "qbert.game", "qbert.sound") with %-style
+arguments, so a message below the configured level is dropped before any
+string formatting happens.
+
+Records that pass go into an in-memory ring buffer. A background thread
+formats and writes them in batches, so the game loop never blocks on I/O,
+and an uncaught exception dumps the most recent records to stderr.
+
+Levels come from the environment, e.g.:
+
+    QBERT_LOG_LEVEL=WARNING QBERT_LOG=ball=DEBUG,coily=INFO python QBert.py
+"""
+import atexit
+import collections
+import logging
+import os
+import sys
+import threading
+
+LOGGER_PREFIX = "qbert"
+DEFAULT_LEVEL = "INFO"
+RING_CAPACITY = 1000       # Records kept for crash dumps
+PENDING_CAPACITY = 10000   # Records waiting for the writer thread before we start dropping
+FLUSH_INTERVAL = 0.5       # Seconds between batched writes
+CRASH_DUMP_RECORDS = 200   # Records printed when the game crashes
+LOG_FORMAT = "%(relativeCreated)9.0f %(levelname)-7s %(name)s: %(message)s"
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last records in memory and writes them out in batches from a background thread."""
+    def __init__(self, stream=None, capacity=RING_CAPACITY, flush_interval=FLUSH_INTERVAL,
+                 pending_capacity=PENDING_CAPACITY):
+        super().__init__()
+        self.stream = stream if stream is not None else sys.stdout
+        self.records = collections.deque(maxlen=capacity) # Recent history, for crash dumps
+        self.pending = collections.deque() # Not yet written; deque appends/pops are thread-safe
+        self.pending_capacity = pending_capacity
+        self.dropped = 0 # Only emit() changes this (under the handler's lock); the writer reads it
+        self._dropped_reported = 0 # Only the writer changes this
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="qbert-log-writer", daemon=True)
+        self._writer.start()
+
+    def emit(self, record):
+        # Runs on the game thread: no formatting and no I/O here
+        self.records.append(record)
+        if len(self.pending) < self.pending_capacity:
+            self.pending.append(record)
+        else:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Writes every pending record in one batch."""
+        batch = []
+        while self.pending:
+            batch.append(self.format(self.pending.popleft()))
+        # A delta instead of a reset, so a drop counted on the game thread meanwhile shows up next time
+        dropped = self.dropped - self._dropped_reported
+        if dropped:
+            batch.append(f"[log] dropped {dropped} records, writer fell behind")
+            self._dropped_reported += dropped
+        if batch:
+            try:
+                self.stream.write("\n".join(batch) + "\n")
+                self.stream.flush()
+            except (OSError, ValueError): # Stream closed or gone; logging must never take the game down
+                pass
+
+    def dump(self, stream, count=CRASH_DUMP_RECORDS):
+        """Writes the last `count` records, whether or not they were already flushed."""
+        recent = list(self.records)[-count:]
+        stream.write(f"--- last {len(recent)} log records ---\n")
+        for record in recent:
+            stream.write(self.format(record) + "\n")
+        stream.flush()
+
+    def close(self):
+        self._stop.set()
+        if self._writer.is_alive() and self._writer is not threading.current_thread():
+            self._writer.join()
+        self.flush()
+        super().close()
+
+
+_handler = None
+
+
+def parse_levels(spec):
+    """Parses "ball=DEBUG,coily=INFO" into {"qbert.ball": DEBUG, ...}."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[f"{LOGGER_PREFIX}.{name.strip()}"] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(level=None, levels=None, stream=None, crash_dump=CRASH_DUMP_RECORDS):
+    """Routes the game's loggers into a RingBufferHandler and installs the crash dump hook."""
+    global _handler
+    if _handler is not None:
+        return _handler
+
+    level = level or os.environ.get("QBERT_LOG_LEVEL", DEFAULT_LEVEL)
+    if levels is None:
+        levels = parse_levels(os.environ.get("QBERT_LOG", ""))
+
+    _handler = RingBufferHandler(stream)
+    _handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    game_logger = logging.getLogger(LOGGER_PREFIX)
+    game_logger.setLevel(level.upper() if isinstance(level, str) else level)
+    game_logger.addHandler(_handler)
+    game_logger.propagate = False
+    for name, subsystem_level in levels.items():
+        logging.getLogger(name).setLevel(subsystem_level)
+
+    if crash_dump:
+        previous_hook = sys.excepthook
+
+        def dump_on_crash(exc_type, exc, tb):
+            _handler.dump(sys.stderr, crash_dump)
+            previous_hook(exc_type, exc, tb)
+
+        sys.excepthook = dump_on_crash
+
+    atexit.register(shutdown_logging)
+    return _handler
+
+
+def shutdown_logging():
+    """Stops the writer thread after a final flush."""
+    global _handler
+    if _handler is not None:
+        logging.getLogger(LOGGER_PREFIX).removeHandler(_handler)
+        _handler.close()
+        _handler = None
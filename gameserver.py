@@ -0,0 +1,532 @@
+"""Game server: many concurrent Q*bert sessions for thin clients over TCP.
+
+Each connection is one player with its own GameSession. Clients only send
+key presses and draw the state they are sent; all game logic (moves, discs,
+Coily and the ball, scoring) runs on the server.
+
+    python gameserver.py serve --port 7800 --workers 4
+    python gameserver.py play --port 7800                       # a thin client window
+    python gameserver.py loadtest --sessions 50 100 200 400     # tick latency vs session count
+
+The front end (this process) accepts connections and runs the tick loop on
+asyncio. Sessions live in a pool of worker processes, spread evenly. Every
+tick, the front end sends each worker one batch: the game time plus the keys
+and connection changes of its sessions since the last tick. The worker
+steps all its sessions and answers with one batch holding every session's
+encoded update, so a tick costs one message each way per worker however
+many sessions there are. The front end only copies those bytes to the sockets.
+
+Wire format: the spectator stream's (see spectator.py). Every message is a
+u16 length followed by the body. From the server:
+
+- keyframes and deltas of the player's own game;
+- MSG_ACK (kind u8, tick u32, input sequence u16), once a tick has applied
+  the client's inputs up to that sequence number;
+- MSG_STATS, the answer to a stats request.
+
+From the client: MSG_INPUT (kind u8, sequence u16, key u8: index into KEY_NAMES)
+and MSG_STATS_REQUEST (kind u8).
+
+A client whose socket backs up has its updates dropped until it drains and
+then gets a keyframe, as with slow spectators.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import struct
+import subprocess
+import sys
+import time
+
+import gamelog
+from simthread import Stats
+from spectator import encode, decode, LENGTH, MSG_KEYFRAME, MSG_DELTA
+
+logger = logging.getLogger("qbert.gameserver")
+
+DEFAULT_PORT = 7800
+TICK_RATE = 30                  # Game steps per second, as in the game's own loop
+CLIENT_BUFFER_LIMIT = 16384     # Bytes queued for a client before its updates are dropped
+MAX_KEYS_PER_TICK = 8           # Further presses from one client in one tick are dropped
+
+KEY_NAMES = ("left", "up", "down", "right", "r", "n") # Key indices on the wire; fuzzer.KEY_CODES maps them
+
+# Client <-> server messages, besides spectator.MSG_KEYFRAME and MSG_DELTA
+MSG_ACK = 3
+MSG_STATS = 4
+MSG_INPUT = 16
+MSG_STATS_REQUEST = 17
+ACK = struct.Struct("<BIH")
+STATS = struct.Struct("<BIIIIIIII") # kind, sessions, ticks, missed, tick p50/p90/p99/max us, worker busy mean us
+INPUT = struct.Struct("<BHB")
+KIND = struct.Struct("<B")
+
+# Front end <-> worker batches
+BATCH_HEADER = struct.Struct("<IIH")  # tick, game time ms, entries
+BATCH_ENTRY = struct.Struct("<IBBH")  # session id, flags, key count (keys follow, one byte each), last input sequence
+REPLY_HEADER = struct.Struct("<IIH")  # tick, busy us, entries
+REPLY_ENTRY = struct.Struct("<IH")    # session id, payload length (payload follows)
+FLAG_OPEN = 1
+FLAG_CLOSE = 2
+FLAG_KEYFRAME = 4
+
+
+def percentiles(samples, fractions):
+    ordered = sorted(samples)
+    return [ordered[min(len(ordered) - 1, int(len(ordered) * f))] for f in fractions] if ordered else [0.0] * len(fractions)
+
+
+# --- Worker processes ---
+
+class _HostedSession:
+    __slots__ = ("session", "last", "seq", "acked", "needs_keyframe")
+
+    def __init__(self, session):
+        self.session = session
+        self.last = None # Last snapshot sent
+        self.seq = 0     # Last input sequence applied
+        self.acked = 0   # Last input sequence acknowledged
+        self.needs_keyframe = True
+
+
+def worker_main(conn):
+    """Worker process: owns a shard of sessions and steps them one batch at a time."""
+    import fuzzer # Game logic on a virtual clock that follows the server's game time
+    logging.disable(logging.CRITICAL)
+    game = fuzzer.load_game()
+    key_codes = [fuzzer.KEY_CODES[name] for name in KEY_NAMES]
+    random.seed(os.getpid())
+    hosted = {}
+    conn.send_bytes(b"ready")
+    while True:
+        try:
+            request = conn.recv_bytes()
+        except (EOFError, OSError): # The front end went away
+            return
+        started = time.perf_counter()
+        tick, game_ms, entries = BATCH_HEADER.unpack_from(request, 0)
+        fuzzer._clock.ticks = game_ms
+        keys = {}
+        pos = BATCH_HEADER.size
+        for _ in range(entries):
+            session_id, flags, key_count, seq = BATCH_ENTRY.unpack_from(request, pos)
+            pos += BATCH_ENTRY.size
+            if flags & FLAG_OPEN:
+                hosted[session_id] = _HostedSession(fuzzer.new_session(game))
+            host = hosted.get(session_id)
+            if host is None:
+                pos += key_count
+                continue
+            if flags & FLAG_CLOSE:
+                del hosted[session_id]
+            else:
+                keys[session_id] = [key_codes[k] for k in request[pos:pos + key_count] if k < len(key_codes)]
+                host.seq = seq
+                host.needs_keyframe |= bool(flags & FLAG_KEYFRAME)
+            pos += key_count
+
+        parts = []
+        count = 0
+        for session_id, host in hosted.items():
+            host.session.update(game_ms, keys.get(session_id, ()))
+            snapshot = host.session.snapshot()
+            if host.needs_keyframe:
+                payload = encode(MSG_KEYFRAME, tick, snapshot)
+                host.needs_keyframe = False
+            else:
+                payload = encode(MSG_DELTA, tick, snapshot, host.last) or b""
+            host.last = snapshot
+            if host.seq != host.acked:
+                body = ACK.pack(MSG_ACK, tick, host.seq)
+                payload += LENGTH.pack(len(body)) + body
+                host.acked = host.seq
+            if payload:
+                parts.append(REPLY_ENTRY.pack(session_id, len(payload)) + payload)
+                count += 1
+        busy_us = int((time.perf_counter() - started) * 1e6)
+        conn.send_bytes(REPLY_HEADER.pack(tick, busy_us, count) + b"".join(parts))
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.sessions = 0
+        self.entries = [] # Batch entries for the next tick
+        self.reply = None # Future for the reply to the batch in flight
+
+
+class WorkerPool:
+    """Worker processes hosting the sessions; one batch per worker per tick."""
+    def __init__(self, workers):
+        context = multiprocessing.get_context("spawn") # Workers import the game afresh, not a forked asyncio loop
+        self.workers = [_Worker(context) for _ in range(workers)]
+        for worker in self.workers:
+            worker.conn.recv_bytes() # Loaded the game; the first tick mustn't wait for imports
+
+    def place(self):
+        """The worker with the fewest sessions, for a new one."""
+        worker = min(self.workers, key=lambda w: w.sessions)
+        worker.sessions += 1
+        return worker
+
+    async def step(self, tick, game_ms):
+        """Sends every worker its batch and waits for all the replies; returns them as bytes."""
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            worker.reply = loop.create_future()
+            loop.add_reader(worker.conn.fileno(), self._receive, worker)
+            body = b"".join(worker.entries)
+            worker.conn.send_bytes(BATCH_HEADER.pack(tick, game_ms, len(worker.entries)) + body)
+            worker.entries = []
+        return [await worker.reply for worker in self.workers]
+
+    def _receive(self, worker):
+        asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        try:
+            worker.reply.set_result(worker.conn.recv_bytes())
+        except (EOFError, OSError) as e:
+            worker.reply.set_exception(RuntimeError(f"Worker process {worker.process.pid} died: {e!r}"))
+
+    def close(self):
+        for worker in self.workers:
+            worker.conn.close() # The worker's recv sees EOF and returns
+        for worker in self.workers:
+            worker.process.join(2)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+
+# --- Front end ---
+
+class _Client:
+    __slots__ = ("session_id", "writer", "worker", "keys", "seq", "opened", "needs_keyframe")
+
+    def __init__(self, session_id, writer, worker):
+        self.session_id = session_id
+        self.writer = writer
+        self.worker = worker
+        self.keys = bytearray() # Key indices pressed since the last tick
+        self.seq = 0            # Sequence number of the last of them
+        self.opened = False     # FLAG_OPEN has gone out to the worker
+        self.needs_keyframe = False
+
+
+class GameServer:
+    """Accepts thin clients and runs the tick loop; sessions run in a WorkerPool."""
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, workers=2, rate=TICK_RATE):
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.interval = 1 / rate
+        self.clients = {} # session id -> _Client
+        self.next_session_id = 1
+        self.tick = 0
+        self.missed = 0
+        self.tick_latency = Stats("tick latency") # Tick deadline to the last update written
+        self.worker_busy = Stats("worker busy per tick")
+        self.updates_dropped = 0
+        self.pool = None
+        self._server = None
+        self._handlers = set() # Client connection tasks
+        self._stopping = None
+
+    async def serve(self, ready=None):
+        """Runs until stop() (or SIGINT/SIGTERM); `ready` (a callable) is told the port once it's bound."""
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+        self.pool = WorkerPool(self.worker_count)
+        self._server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Game server listening on %s:%d with %d workers", self.host, self.port, self.worker_count)
+        if ready is not None:
+            ready(self.port)
+        try:
+            await self._tick_loop()
+        finally:
+            self._server.close()
+            for client in list(self.clients.values()):
+                client.writer.close() # Their handlers see the connection end and finish
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            self.pool.close()
+            logger.info("%d ticks, %d missed, %d updates dropped for slow clients",
+                        self.tick, self.missed, self.updates_dropped)
+            for stats in (self.tick_latency, self.worker_busy):
+                logger.info("%s", stats.summary())
+
+    async def _tick_loop(self):
+        loop = asyncio.get_running_loop()
+        started = deadline = loop.time()
+        while not self._stopping.is_set():
+            deadline += self.interval
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            now = loop.time()
+            if now - deadline > self.interval:
+                self.missed += 1
+                deadline = now # Run late rather than in a catch-up burst
+            self.tick += 1
+
+            for client in self.clients.values():
+                flags = 0 if client.opened else FLAG_OPEN
+                if client.needs_keyframe and client.writer.transport.get_write_buffer_size() < CLIENT_BUFFER_LIMIT:
+                    flags |= FLAG_KEYFRAME
+                    client.needs_keyframe = False
+                if flags or client.keys:
+                    client.worker.entries.append(BATCH_ENTRY.pack(client.session_id, flags, len(client.keys), client.seq)
+                                                 + bytes(client.keys))
+                    client.keys.clear()
+                    client.opened = True
+
+            replies = await self.pool.step(self.tick, int((now - started) * 1000))
+            busiest = 0
+            for reply in replies:
+                _, busy_us, entries = REPLY_HEADER.unpack_from(reply, 0)
+                busiest = max(busiest, busy_us)
+                pos = REPLY_HEADER.size
+                for _ in range(entries):
+                    session_id, length = REPLY_ENTRY.unpack_from(reply, pos)
+                    pos += REPLY_ENTRY.size
+                    client = self.clients.get(session_id)
+                    if client is not None:
+                        self._send(client, reply[pos:pos + length])
+                    pos += length
+            self.worker_busy.add(busiest / 1e6)
+            self.tick_latency.add(loop.time() - deadline)
+
+    def stop(self):
+        self._stopping.set()
+
+    def _send(self, client, payload):
+        if client.needs_keyframe:
+            return
+        if client.writer.transport.get_write_buffer_size() >= CLIENT_BUFFER_LIMIT:
+            # Stop queueing deltas for a client that isn't reading; it gets a keyframe once it drains
+            self.updates_dropped += 1
+            client.needs_keyframe = True
+            return
+        client.writer.write(payload)
+
+    async def _serve_client(self, reader, writer):
+        self._handlers.add(asyncio.current_task())
+        session_id = self.next_session_id
+        self.next_session_id += 1
+        client = self.clients[session_id] = _Client(session_id, writer, self.pool.place())
+        try:
+            while True:
+                length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                body = await reader.readexactly(length)
+                kind, = KIND.unpack_from(body, 0)
+                if kind == MSG_INPUT:
+                    _, seq, key = INPUT.unpack(body)
+                    if len(client.keys) < MAX_KEYS_PER_TICK:
+                        client.keys.append(key)
+                    client.seq = seq
+                elif kind == MSG_STATS_REQUEST:
+                    writer.write(self.stats_message())
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error):
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            del self.clients[session_id]
+            client.worker.sessions -= 1
+            if client.opened:
+                client.worker.entries.append(BATCH_ENTRY.pack(session_id, FLAG_CLOSE, 0, 0))
+            writer.close()
+
+    def stats_message(self):
+        p50, p90, p99 = percentiles(self.tick_latency.samples, (0.5, 0.9, 0.99))
+        busy = self.worker_busy.total / self.worker_busy.count if self.worker_busy.count else 0.0
+        body = STATS.pack(MSG_STATS, len(self.clients), self.tick, self.missed,
+                          *(int(v * 1e6) for v in (p50, p90, p99, self.tick_latency.worst, busy)))
+        return LENGTH.pack(len(body)) + body
+
+
+# --- Clients ---
+
+async def read_message(reader):
+    length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def input_message(seq, key_index):
+    body = INPUT.pack(MSG_INPUT, seq & 0xFFFF, key_index)
+    return LENGTH.pack(len(body)) + body
+
+
+async def play(host, port):
+    """A thin client: sends key presses and draws the state the server sends back."""
+    import pygame
+    import QBert
+    pygame.init()
+    screen = pygame.display.set_mode((QBert.SCREEN_WIDTH, QBert.SCREEN_HEIGHT))
+    pygame.display.set_caption(f"Q*bert - {host}:{port}")
+    QBert.game_font = pygame.font.Font(None, QBert.DEFAULT_FONT_SIZE)
+    QBert.small_font = pygame.font.Font(None, QBert.SMALL_DEFAULT_FONT_SIZE)
+    session = QBert.GameSession() # Only used to hold and draw the received state
+    key_indices = {code: i for i, code in enumerate(pygame.key.key_code(name) for name in KEY_NAMES)}
+
+    reader, writer = await asyncio.open_connection(host, port)
+    state = {"snapshot": None}
+
+    async def receive():
+        while True:
+            body = await read_message(reader)
+            if body[0] in (MSG_KEYFRAME, MSG_DELTA):
+                _, _, state["snapshot"] = decode(body, state["snapshot"])
+
+    stream = asyncio.ensure_future(receive())
+    seq = 0
+    try:
+        while not stream.done():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    stream.cancel()
+                elif event.type == pygame.KEYDOWN and event.key in key_indices:
+                    seq += 1
+                    writer.write(input_message(seq, key_indices[event.key]))
+            if state["snapshot"] is not None:
+                session.apply_snapshot(state["snapshot"])
+                session.draw(screen)
+                pygame.display.flip()
+            await asyncio.sleep(1 / TICK_RATE)
+    finally:
+        writer.close()
+        pygame.quit()
+
+
+class LoadClient:
+    """A simulated player: random keys at a human rate, timing each until the server acknowledges it."""
+    def __init__(self, rng, input_latency):
+        self.rng = rng
+        self.input_latency = input_latency # Stats shared by all clients
+        self.sent = {} # seq -> send time
+        self.bytes_received = 0
+
+    async def run(self, host, port, until):
+        reader, writer = await asyncio.open_connection(host, port)
+        sender = asyncio.ensure_future(self._send_keys(writer, until))
+        try:
+            while True:
+                body = await read_message(reader)
+                self.bytes_received += LENGTH.size + len(body)
+                if body[0] == MSG_ACK:
+                    _, _, acked = ACK.unpack(body)
+                    now = time.perf_counter()
+                    for seq in [s for s in self.sent if s <= acked]:
+                        self.input_latency.add(now - self.sent.pop(seq))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    async def _send_keys(self, writer, until):
+        seq = 0
+        while time.perf_counter() < until:
+            await asyncio.sleep(self.rng.uniform(0.15, 0.6))
+            seq += 1
+            self.sent[seq] = time.perf_counter()
+            writer.write(input_message(seq, self.rng.randrange(len(KEY_NAMES))))
+        writer.close()
+
+
+async def query_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(LENGTH.pack(KIND.size) + KIND.pack(MSG_STATS_REQUEST))
+        while True:
+            body = await read_message(reader)
+            if body[0] == MSG_STATS:
+                return STATS.unpack(body)[1:]
+    finally:
+        writer.close()
+
+
+async def load_step(host, port, sessions, seconds, seed):
+    """Runs `sessions` simulated clients for `seconds`; returns the server's stats and the input latency."""
+    input_latency = Stats("input to ack")
+    until = time.perf_counter() + seconds
+    clients = [LoadClient(random.Random(seed + i), input_latency) for i in range(sessions)]
+    tasks = []
+    for client in clients:
+        tasks.append(asyncio.ensure_future(client.run(host, port, until)))
+        await asyncio.sleep(0.002) # Stagger the connections a little, like real terminals
+    await asyncio.sleep(max(0.0, until - time.perf_counter()))
+    stats = await query_stats(host, port) # While every client is still connected
+    for task in tasks:
+        task.cancel()
+    return stats, input_latency, sum(c.bytes_received for c in clients)
+
+
+def start_server_process(workers):
+    """Starts `gameserver.py serve` on a free port; returns (process, port)."""
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", "0",
+                                "--workers", str(workers), "--announce"], stdout=subprocess.PIPE, text=True,
+                               env=dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1"))
+    for line in process.stdout:
+        if line.startswith("port "):
+            return process, int(line.split()[1])
+    process.kill()
+    raise RuntimeError("Game server exited before listening")
+
+
+def load_test(session_counts, seconds, workers, seed=1):
+    """For each session count, starts a fresh server and plays that many simulated clients against it."""
+    print(f"{workers} workers, {seconds:g} s per step, {TICK_RATE} ticks/s")
+    print("sessions  missed  tick p50   p90    p99    max (ms)  worker busy  input p50  p99 (ms)  KiB/s out")
+    for sessions in session_counts:
+        process, port = start_server_process(workers)
+        try:
+            (_, ticks, missed, p50, p90, p99, worst, busy), input_latency, received = \
+                asyncio.run(load_step("127.0.0.1", port, sessions, seconds, seed))
+        finally:
+            process.send_signal(signal.SIGINT)
+            process.wait(10)
+        in50, in99 = percentiles(input_latency.samples, (0.5, 0.99))
+        print(f"{sessions:8} {missed:7}  {p50 / 1000:7.2f} {p90 / 1000:6.2f} {p99 / 1000:6.2f} {worst / 1000:6.2f}"
+              f"  {busy / 1000:8.2f} ms  {in50 * 1000:8.1f} {in99 * 1000:6.1f}     {received / seconds / 1024:8.1f}")
+        if missed > ticks // 100:
+            print(f"  over 1% of ticks missed at {sessions} sessions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Q*bert sessions for thin clients, or load-test a host.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="run the game server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    serve_parser.add_argument("--announce", action="store_true", help=argparse.SUPPRESS) # Print the port for load_test()
+    play_parser = sub.add_parser("play", help="open a thin client window")
+    play_parser.add_argument("--host", default="127.0.0.1")
+    play_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    load_parser = sub.add_parser("loadtest", help="measure tick latency against session count")
+    load_parser.add_argument("--sessions", type=int, nargs="+", default=[50, 100, 200, 400])
+    load_parser.add_argument("--seconds", type=float, default=10.0, help="length of each step")
+    load_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.command == "play":
+        asyncio.run(play(args.host, args.port))
+        return 0
+    if args.command == "loadtest":
+        load_test(args.sessions, args.seconds, args.workers)
+        return 0
+
+    gamelog.setup_logging()
+    server = GameServer(args.host, args.port, args.workers)
+    announce = (lambda port: print(f"port {port}", flush=True)) if args.announce else None
+    asyncio.run(server.serve(announce))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Hop animation from precomputed arc tables.
+
+The game logic moves Q*bert, Coily and the ball from cube to cube in a
+single step; drawing shows the hop in between. Each kind of hop (the four
+diagonals, a fall off the pyramid, the disc ride to the top) has one table
+of HOP_SAMPLES samples, built once by build_hop_tables() with all of its
+trigonometry:
+
+    (w_from, w_via, w_to, lift, squash_x, squash_y)
+
+The weights place the entity on the path from its start point, through an
+optional middle point, to its end point; lift raises it above that path in
+pixels; the squash factors stretch its body on take-off and squash it on
+landing. A Hop pairs a table with the screen points and start time of one
+hop, and Hop.at() blends the two samples around the elapsed time: a
+handful of multiplications per entity per frame, however many are hopping.
+"""
+import collections
+import math
+
+HOP_SAMPLES = 33 # Per table; 32 steps
+
+# Pixel lengths are for the game's 800x700 base layout; build_hop_tables() scales them
+UP_HOP_LIFT = 14         # Pixels above the straight path at the top of an up hop
+DOWN_HOP_LIFT = 26       # Down hops clear the edge of the cube they leave
+HOP_STRETCH = 0.12       # Body stretch at the top of the arc
+HOP_SQUASH = 0.25        # Body squash on take-off and landing
+SQUASH_SHARE = 0.15      # Share of a hop spent squashing at each end
+
+FALL_DURATION = 1000     # Milliseconds from jumping off the pyramid until off-screen
+FALL_HOP_SHARE = 0.25    # Share of a fall spent on the hop out to where the cube would be
+FALL_DROP = 800          # Pixels dropped after that, enough to leave the screen
+DISC_HOP_SHARE = 0.3     # Share of a disc ride spent hopping onto the disc
+DISC_RIDE_LIFT = 60      # Pixels the ride's path bows up on its way to the top
+ENEMY_HOP_DURATION = 180 # Milliseconds Coily and the ball spend in the air, at most their move interval
+
+
+def _bump(t, start, end):
+    """0 outside [start, end], rising to 1 halfway through."""
+    if not start <= t <= end:
+        return 0.0
+    return math.sin(math.pi * (t - start) / (end - start))
+
+
+def _squash(t):
+    stretch = HOP_STRETCH * math.sin(math.pi * t)
+    squash = HOP_SQUASH * (_bump(t, 0.0, SQUASH_SHARE) + _bump(t, 1.0 - SQUASH_SHARE, 1.0))
+    squash_y = 1.0 + stretch - squash
+    return 2.0 - squash_y, squash_y # Roughly keeps the body's area
+
+
+def _smooth(t):
+    return t * t * (3.0 - 2.0 * t)
+
+
+def _table(sample):
+    return tuple(sample(i / (HOP_SAMPLES - 1)) for i in range(HOP_SAMPLES))
+
+
+def hop_table(lift):
+    """A straight hop from start to end with an arc `lift` pixels high."""
+    return _table(lambda t: (1.0 - t, 0.0, t, lift * math.sin(math.pi * t)) + _squash(t))
+
+
+def fall_table(lift, drop):
+    """A hop out to the end point, then a fall `drop` pixels straight down."""
+    def sample(t):
+        if t < FALL_HOP_SHARE:
+            hop = t / FALL_HOP_SHARE
+            return (1.0 - hop, 0.0, hop, lift * math.sin(math.pi * hop)) + _squash(hop)
+        fall = (t - FALL_HOP_SHARE) / (1.0 - FALL_HOP_SHARE)
+        return (0.0, 0.0, 1.0, -drop * fall * fall, 0.8, 1.2) # Stretched as it drops
+    return _table(sample)
+
+
+def disc_table(lift, ride_lift):
+    """A hop onto the disc at the middle point, then a ride up to the end point."""
+    def sample(t):
+        if t < DISC_HOP_SHARE:
+            hop = t / DISC_HOP_SHARE
+            return (1.0 - hop, hop, 0.0, lift * math.sin(math.pi * hop)) + _squash(hop)
+        ride = _smooth((t - DISC_HOP_SHARE) / (1.0 - DISC_HOP_SHARE))
+        return (0.0, 1.0 - ride, ride, ride_lift * math.sin(math.pi * ride), 1.0, 1.0)
+    return _table(sample)
+
+
+HopTables = collections.namedtuple("HopTables", [
+    "diagonal", # (delta row, delta col) -> table
+    "fall",
+    "disc",
+])
+
+
+def build_hop_tables(scale=1):
+    """Every table, for a layout drawn at `scale` times the base size (see QBert.LOGICAL_SCALE)."""
+    up = hop_table(UP_HOP_LIFT * scale) # Up hops arc less, the end cube is already higher
+    down = hop_table(DOWN_HOP_LIFT * scale)
+    return HopTables(
+        diagonal={(-1, -1): up, (-1, 0): up, (1, 0): down, (1, 1): down}, # Up-left, up-right, down-left, down-right
+        fall=fall_table(DOWN_HOP_LIFT * scale, FALL_DROP * scale),
+        disc=disc_table(DOWN_HOP_LIFT * scale, DISC_RIDE_LIFT * scale),
+    )
+
+
+class Hop:
+    """One hop in progress: a table, when it started and the screen points it runs between."""
+    __slots__ = ("table", "start_ticks", "duration", "start_pos", "via_pos", "end_pos")
+
+    def __init__(self, table, start_ticks, duration, start_pos, end_pos, via_pos=None):
+        self.table = table
+        self.start_ticks = start_ticks
+        self.duration = duration
+        self.start_pos = start_pos
+        self.via_pos = via_pos or end_pos
+        self.end_pos = end_pos
+
+    def at(self, now):
+        """(x, y, squash_x, squash_y) at `now` in ticks, or None once the hop is over."""
+        elapsed = now - self.start_ticks
+        if not 0 <= elapsed < self.duration:
+            return None
+        position = elapsed * (HOP_SAMPLES - 1) / self.duration
+        i = int(position)
+        fraction = position - i
+        w_from, w_via, w_to, lift, squash_x, squash_y = (
+            a + (b - a) * fraction for a, b in zip(self.table[i], self.table[i + 1]))
+        x = w_from * self.start_pos[0] + w_via * self.via_pos[0] + w_to * self.end_pos[0]
+        y = w_from * self.start_pos[1] + w_via * self.via_pos[1] + w_to * self.end_pos[1] - lift
+        return round(x), round(y), squash_x, squash_y
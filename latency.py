@@ -0,0 +1,45 @@
+"""Fixed-bucket latency histograms with percentiles and a text chart."""
+
+BUCKET_MS = 2   # Histogram resolution
+BUCKETS = 100   # Up to 200 ms; slower samples land in the last bucket
+CHART_WIDTH = 40
+
+
+class LatencyHistogram:
+    """Counts latencies in BUCKET_MS buckets; memory does not grow with the sample count."""
+    def __init__(self, name, bucket_ms=BUCKET_MS, buckets=BUCKETS):
+        self.name = name
+        self.bucket_ms = bucket_ms
+        self.counts = [0] * buckets
+        self.count = 0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.worst = max(self.worst, seconds)
+        self.counts[min(int(seconds * 1000 / self.bucket_ms), len(self.counts) - 1)] += 1
+
+    def percentile(self, fraction):
+        """Upper edge, in ms, of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return None
+        rank = fraction * (self.count - 1)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen > rank:
+                return (bucket + 1) * self.bucket_ms
+        return len(self.counts) * self.bucket_ms
+
+    def report(self):
+        if not self.count:
+            return f"{self.name}: no samples"
+        lines = [f"{self.name}: {self.count} samples, p50 <{self.percentile(0.5)} ms, "
+                 f"p90 <{self.percentile(0.9)} ms, p99 <{self.percentile(0.99)} ms, max {self.worst * 1000:.1f} ms"]
+        tallest = max(self.counts)
+        for bucket, count in enumerate(self.counts):
+            if not count:
+                continue
+            bar = "#" * max(1, count * CHART_WIDTH // tallest)
+            lines.append(f"  {bucket * self.bucket_ms:4}-{(bucket + 1) * self.bucket_ms:<4} ms {count:6}  {bar}")
+        return "\n".join(lines)
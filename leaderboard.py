@@ -0,0 +1,266 @@
+"""Persistent high-score leaderboard in SQLite.
+
+Every finished game (score, level reached, duration, date, machine) is kept
+in one indexed table. The database runs in WAL mode, so the writer never
+blocks readers. The game hands results to a background writer thread and
+only ever reads a cached top list, so game over never waits on the disk.
+
+    QBERT_LEADERBOARD=scores.db python QBert.py     # default: leaderboard.db next to the game, "" disables
+    python leaderboard.py top                       # best games overall
+    python leaderboard.py day 2026-10-19            # best games of one day
+    python leaderboard.py machine kiosk-07          # best games on one machine
+    python leaderboard.py merge all.db a.db b.db    # combine leaderboards from several machines
+    python leaderboard.py bench --rows 2000000      # query timings on a synthetic table
+
+Each game gets a random game_id, so merging the same source twice (or
+merging merged files) never duplicates a row.
+"""
+import argparse
+import logging
+import os
+import queue
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("qbert.leaderboard")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FILE = "leaderboard.db"
+TOP_CACHE_SIZE = 5 # Rows kept in Leaderboard.top_scores for the game over screen
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id     TEXT NOT NULL UNIQUE,  -- Random hex id; makes merges idempotent
+    machine     TEXT NOT NULL,
+    finished_at INTEGER NOT NULL,      -- Unix time, seconds
+    day         TEXT NOT NULL,         -- Local YYYY-MM-DD on the machine that played
+    score       INTEGER NOT NULL,
+    level       INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL
+);
+-- Each query below walks one of these in order and stops after LIMIT rows. The indexes
+-- also hold every column the queries return, so no table row is read ("USING COVERING INDEX").
+DROP INDEX IF EXISTS games_by_score; -- Earlier, non-covering versions
+DROP INDEX IF EXISTS games_by_day;
+DROP INDEX IF EXISTS games_by_machine;
+CREATE INDEX IF NOT EXISTS top_by_score ON games (score DESC, finished_at, level, duration_ms, day, machine);
+CREATE INDEX IF NOT EXISTS top_by_day ON games (day, score DESC, finished_at, level, duration_ms, machine);
+CREATE INDEX IF NOT EXISTS top_by_machine ON games (machine, score DESC, finished_at, level, duration_ms, day);
+"""
+COLUMNS = "game_id, machine, finished_at, day, score, level, duration_ms"
+RESULT_COLUMNS = "score, level, duration_ms, day, machine"
+QUERY_INDEXES = ["top_by_score", "top_by_day", "top_by_machine"]
+MERGE_CACHE_KB = 256 * 1024 # Page cache for bulk merges; inserting random game_ids touches the whole index
+REBUILD_INDEX_RATIO = 0.25  # Merges bringing more rows than this share of the destination rebuild its indexes
+INSERT_SQL = f"INSERT OR IGNORE INTO games ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+def connect(path):
+    """Opens (and if needed creates) a leaderboard database in WAL mode."""
+    connection = sqlite3.connect(path, timeout=10)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent; a power cut may lose the last commit
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def game_row(score, level, duration_ms, machine, finished_at=None):
+    finished_at = time.time() if finished_at is None else finished_at
+    day = time.strftime("%Y-%m-%d", time.localtime(finished_at))
+    return (uuid.uuid4().hex, machine, int(finished_at), day, score, level, duration_ms)
+
+
+def top(connection, limit=10):
+    return connection.execute(
+        f"SELECT {RESULT_COLUMNS} FROM games ORDER BY score DESC, finished_at LIMIT ?", (limit,)).fetchall()
+
+
+def top_for_day(connection, day, limit=10):
+    return connection.execute(
+        f"SELECT {RESULT_COLUMNS} FROM games WHERE day = ? ORDER BY score DESC, finished_at LIMIT ?",
+        (day, limit)).fetchall()
+
+
+def top_for_machine(connection, machine, limit=10):
+    return connection.execute(
+        f"SELECT {RESULT_COLUMNS} FROM games WHERE machine = ? ORDER BY score DESC, finished_at LIMIT ?",
+        (machine, limit)).fetchall()
+
+
+def count_games(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT count(*) FROM games").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def merge(dest_path, source_paths):
+    """Copies every game from the source databases into dest, one transaction per source; returns rows added."""
+    connection = connect(dest_path)
+    connection.execute(f"PRAGMA cache_size=-{MERGE_CACHE_KB}")
+    # For a big import, building the query indexes once at the end is much cheaper than
+    # updating them row by row. The game_id index stays, since it is what skips duplicates.
+    # If the merge dies halfway, connect() rebuilds the dropped indexes on next open.
+    existing = connection.execute("SELECT count(*) FROM games").fetchone()[0]
+    rebuild_indexes = sum(count_games(path) for path in source_paths) > existing * REBUILD_INDEX_RATIO
+    added = 0
+    try:
+        if rebuild_indexes:
+            for index in QUERY_INDEXES:
+                connection.execute(f"DROP INDEX IF EXISTS {index}")
+        for path in source_paths:
+            connection.execute("ATTACH DATABASE ? AS source", (path,))
+            try:
+                before = connection.total_changes
+                with connection:
+                    connection.execute(f"INSERT OR IGNORE INTO games ({COLUMNS}) SELECT {COLUMNS} FROM source.games")
+                logger.info("Merged %s: %d new games", path, connection.total_changes - before)
+                added += connection.total_changes - before
+            finally:
+                connection.execute("DETACH DATABASE source")
+        if rebuild_indexes:
+            connection.executescript(SCHEMA)
+    finally:
+        connection.close()
+    return added
+
+
+class Leaderboard:
+    """Records finished games from a background thread; the game reads only `top_scores`."""
+    def __init__(self, path, machine=None):
+        self.path = path
+        self.machine = machine or os.environ.get("QBERT_MACHINE") or socket.gethostname()
+        self.top_scores = [] # (score, level, duration_ms, day, machine), best first
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run, name="qbert-leaderboard", daemon=True)
+        self._writer.start()
+
+    def record(self, score, level, duration_ms):
+        """Queues one finished game; returns immediately."""
+        self._queue.put(game_row(score, level, duration_ms, self.machine))
+
+    def _run(self):
+        try:
+            connection = connect(self.path) # sqlite3 connections belong to the thread that made them
+            self.top_scores = top(connection, TOP_CACHE_SIZE)
+        except sqlite3.Error as e:
+            logger.error("Leaderboard %s unavailable: %s", self.path, e)
+            return
+        while True:
+            rows = [self._queue.get()]
+            while not self._queue.empty(): # Games that finished meanwhile go in the same transaction
+                rows.append(self._queue.get())
+            stop = None in rows
+            rows = [row for row in rows if row is not None]
+            if rows:
+                try:
+                    with connection:
+                        connection.executemany(INSERT_SQL, rows)
+                    self.top_scores = top(connection, TOP_CACHE_SIZE)
+                    logger.info("Recorded %d game(s) in %s", len(rows), self.path)
+                except sqlite3.Error as e:
+                    logger.error("Could not record %d game(s): %s", len(rows), e)
+            if stop:
+                connection.close()
+                return
+
+    def close(self):
+        """Writes anything still queued, then stops the writer."""
+        self._queue.put(None)
+        self._writer.join()
+
+
+def format_rows(rows):
+    lines = [" #    score  level  time  day         machine"]
+    for rank, (score, level, duration_ms, day, machine) in enumerate(rows, 1):
+        minutes, seconds = divmod(duration_ms // 1000, 60)
+        lines.append(f"{rank:2} {score:8} {level:6} {minutes:3}:{seconds:02}  {day}  {machine}")
+    return "\n".join(lines)
+
+
+def bench(path, rows, machines=50, days=365, limit=10):
+    """Fills `path` with synthetic games (if it has fewer than `rows`) and times each query."""
+    connection = connect(path)
+    have = connection.execute("SELECT count(*) FROM games").fetchone()[0]
+    rng = random.Random(1)
+    now = time.time()
+    started = time.perf_counter()
+    batch = []
+    for _ in range(rows - have):
+        batch.append(game_row(int(rng.expovariate(1 / 800)) // 25 * 25, rng.randint(1, 9), rng.randint(5000, 900000),
+                              f"kiosk-{rng.randrange(machines):02}", now - rng.random() * days * 86400))
+        if len(batch) == 100000:
+            with connection:
+                connection.executemany(INSERT_SQL, batch)
+            batch.clear()
+    if batch:
+        with connection:
+            connection.executemany(INSERT_SQL, batch)
+    if rows > have:
+        print(f"Inserted {rows - have:,} games in {time.perf_counter() - started:.1f}s")
+
+    day = time.strftime("%Y-%m-%d", time.localtime(now - 86400))
+    queries = [("top", lambda: top(connection, limit)),
+               (f"day {day}", lambda: top_for_day(connection, day, limit)),
+               ("machine kiosk-07", lambda: top_for_machine(connection, "kiosk-07", limit))]
+    total = connection.execute("SELECT count(*) FROM games").fetchone()[0]
+    print(f"{total:,} games, best of 20 runs per query:")
+    for name, query in queries:
+        best = min(_timed(query) for _ in range(20))
+        print(f"  {name:24} {best * 1000:7.3f} ms")
+    connection.close()
+
+
+def _timed(query):
+    started = time.perf_counter()
+    query()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or merge Q*bert leaderboards.")
+    parser.add_argument("--db", default=os.environ.get("QBERT_LEADERBOARD") or os.path.join(SCRIPT_DIR, DEFAULT_FILE))
+    limit_parser = argparse.ArgumentParser(add_help=False)
+    limit_parser.add_argument("--limit", type=int, default=10, help="rows to show")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("top", help="best games overall", parents=[limit_parser])
+    day_parser = sub.add_parser("day", help="best games of one day", parents=[limit_parser])
+    day_parser.add_argument("day", nargs="?", default=time.strftime("%Y-%m-%d"), help="YYYY-MM-DD, default today")
+    machine_parser = sub.add_parser("machine", help="best games on one machine", parents=[limit_parser])
+    machine_parser.add_argument("machine", nargs="?", default=socket.gethostname())
+    merge_parser = sub.add_parser("merge", help="combine leaderboards into one database")
+    merge_parser.add_argument("dest")
+    merge_parser.add_argument("sources", nargs="+")
+    bench_parser = sub.add_parser("bench", help="time the queries on a synthetic table", parents=[limit_parser])
+    bench_parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        started = time.perf_counter()
+        added = merge(args.dest, args.sources)
+        print(f"Added {added:,} games from {len(args.sources)} file(s) in {time.perf_counter() - started:.1f}s")
+        return 0
+    if args.command == "bench":
+        bench(args.db, args.rows, limit=args.limit)
+        return 0
+
+    connection = connect(args.db)
+    if args.command == "top":
+        rows = top(connection, args.limit)
+    elif args.command == "day":
+        rows = top_for_day(connection, args.day, args.limit)
+    else:
+        rows = top_for_machine(connection, args.machine, args.limit)
+    connection.close()
+    print(format_rows(rows))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
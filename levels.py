@@ -0,0 +1,237 @@
+"""Level definitions: JSON files compiled into flat per-level lookup tables.
+
+Each file in the levels directory defines one level, in file name order;
+levels past the last file repeat it. A definition looks like (the comments
+are only for this description; JSON has none):
+
+    {
+        "name": "Three steps",
+        "pyramid_rows": 7,
+        "colors": [["#5555ff", "#ffa500", "#aa5500"],   # Step 0: (top, left, right)
+                   ["#ff55ff", "#aa00aa", "#550055"],
+                   ["#ffff55", "#000064", "#0000aa"]],
+        "target": 2,                 # Step every cube must show; default: the last
+        "landing": "advance",        # Or "toggle", "cycle", or a list of next steps
+        "enemies": ["coily", "red_ball"],
+        "coily_interval": 1000,      # Optional; by default Coily speeds up with the level
+        "ball_interval": 700,
+        "ball_spawn_delay": 2000
+    }
+
+"advance" moves a cube one step towards the target per landing and then
+leaves it; "toggle" does the same but a landing on a finished cube takes it
+back a step; "cycle" keeps stepping and wraps around after the last color.
+
+compile_levels() turns the definitions into a LevelRules per level: the
+landing rule becomes next_step/points tuples indexed by a cube's current
+step, so a hop costs the same table lookups whatever the rule. The compiled
+tables are cached as JSON under the levels directory's __pycache__, keyed
+by a hash of the files and the defaults, so a game start only reads and
+hashes the files. The cache is plain data, never pickle: the levels
+directory can be user-supplied (QBERT_LEVELS), and loading it must not run
+code.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger("qbert.levels")
+
+COMPILER_VERSION = 1 # Bump when LevelRules or the compiled meaning of a file changes
+CACHE_DIR = "__pycache__"
+ENEMIES = ("coily", "red_ball")
+LANDING_RULES = ("advance", "toggle", "cycle")
+FLIP_POINTS = 25 # For a landing that moves a cube towards its target step
+
+LevelRules = collections.namedtuple("LevelRules", [
+    "name",
+    "pyramid_rows",
+    "colors",           # Per step: (top, left, right) RGB tuples
+    "target",           # Step that counts as finished
+    "is_target",        # Per step: True for the target step
+    "next_step",        # Per step: the step a landing leaves the cube on
+    "points",           # Per step: score for landing on a cube on that step
+    "coily", "red_ball", # Enemy mix
+    "coily_interval", "ball_interval", "ball_spawn_delay", # Milliseconds
+])
+
+
+class LevelTable:
+    """Compiled rules for every level; levels past the end repeat the last entry."""
+    def __init__(self, levels, source_hash=""):
+        self.levels = tuple(levels)
+        self.source_hash = source_hash
+
+    def rules(self, level):
+        return self.levels[min(max(level, 1), len(self.levels)) - 1]
+
+    def __len__(self):
+        return len(self.levels)
+
+
+def parse_color(value, where):
+    if isinstance(value, str) and len(value) == 7 and value.startswith("#"):
+        try:
+            return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+        except ValueError:
+            pass
+    elif isinstance(value, list) and len(value) == 3 and all(isinstance(v, int) and 0 <= v <= 255 for v in value):
+        return tuple(value)
+    raise ValueError(f"{where}: colors must be '#rrggbb' or [r, g, b], not {value!r}")
+
+
+def positive_int(definition, key, default, where):
+    value = definition.get(key, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+        raise ValueError(f"{where}: {key} must be a positive whole number of milliseconds, not {value!r}")
+    return value
+
+
+def compile_level(definition, level, defaults, where):
+    """One LevelRules from a parsed definition; `level` picks the default Coily speed."""
+    if not isinstance(definition, dict):
+        raise ValueError(f"{where}: a level definition is a JSON object")
+    unknown = set(definition) - {"name", "pyramid_rows", "colors", "target", "landing", "enemies",
+                                 "coily_interval", "ball_interval", "ball_spawn_delay"}
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {sorted(unknown)}")
+
+    rows = definition.get("pyramid_rows", defaults["max_rows"])
+    if not isinstance(rows, int) or not 2 <= rows <= defaults["max_rows"]:
+        raise ValueError(f"{where}: pyramid_rows must be 2 to {defaults['max_rows']}, not {rows!r}")
+
+    colors = definition.get("colors")
+    if not isinstance(colors, list) or len(colors) < 2:
+        raise ValueError(f"{where}: colors needs at least two steps")
+    steps = []
+    for i, step in enumerate(colors):
+        if not isinstance(step, list) or len(step) != 3:
+            raise ValueError(f"{where}: color step {i} must list top, left and right colors")
+        steps.append(tuple(parse_color(value, where) for value in step))
+    count = len(steps)
+
+    target = definition.get("target", count - 1)
+    if not isinstance(target, int) or not 0 < target < count:
+        raise ValueError(f"{where}: target must be a step from 1 to {count - 1}, not {target!r}")
+
+    landing = definition.get("landing", "advance")
+    if landing == "advance":
+        next_step = [min(step + 1, target) if step < target else step for step in range(count)]
+    elif landing == "toggle":
+        next_step = [step + 1 if step < target else target - 1 for step in range(count)]
+    elif landing == "cycle":
+        next_step = [(step + 1) % count for step in range(count)]
+    elif isinstance(landing, list) and len(landing) == count and \
+            all(isinstance(step, int) and 0 <= step < count for step in landing):
+        next_step = landing
+    else:
+        raise ValueError(f"{where}: landing must be one of {', '.join(LANDING_RULES)} "
+                         f"or a list of {count} next steps, not {landing!r}")
+    # Only progress towards the target scores; reverting and wrapping around don't
+    points = [FLIP_POINTS if step < target and next_step[step] > step else 0 for step in range(count)]
+
+    enemies = definition.get("enemies", list(ENEMIES))
+    if not isinstance(enemies, list) or not set(enemies) <= set(ENEMIES):
+        raise ValueError(f"{where}: enemies must be a list drawn from {', '.join(ENEMIES)}")
+
+    coily_intervals = defaults["coily_intervals"]
+    return LevelRules(
+        name=str(definition.get("name", f"Level {level}")),
+        pyramid_rows=rows,
+        colors=tuple(steps),
+        target=target,
+        is_target=tuple(step == target for step in range(count)),
+        next_step=tuple(next_step),
+        points=tuple(points),
+        coily="coily" in enemies,
+        red_ball="red_ball" in enemies,
+        coily_interval=positive_int(definition, "coily_interval", coily_intervals[min(level, len(coily_intervals) - 1)], where),
+        ball_interval=positive_int(definition, "ball_interval", defaults["ball_interval"], where),
+        ball_spawn_delay=positive_int(definition, "ball_spawn_delay", defaults["ball_spawn_delay"], where),
+    )
+
+
+def compile_levels(sources, defaults):
+    """LevelRules for each (file name, parsed definition), continued with the last
+    definition until the default Coily speed stops changing."""
+    levels = [compile_level(definition, i, defaults, name) for i, (name, definition) in enumerate(sources, 1)]
+    last_name, last_definition = sources[-1]
+    while len(levels) < len(defaults["coily_intervals"]) - 1: # Coily's default speed-up needs its own entries
+        levels.append(compile_level(last_definition, len(levels) + 1, defaults, last_name))
+    return levels
+
+
+def rules_to_json(rules):
+    return rules._asdict()
+
+
+def rules_from_json(fields):
+    """A LevelRules from rules_to_json() output read back, with JSON's lists turned back into tuples."""
+    fields = dict(fields)
+    fields["colors"] = tuple(tuple(tuple(color) for color in step) for step in fields["colors"])
+    for key in ("is_target", "next_step", "points"):
+        fields[key] = tuple(fields[key])
+    return LevelRules(**fields)
+
+
+def source_hash(files, defaults):
+    digest = hashlib.sha256(repr((COMPILER_VERSION, sorted(defaults.items()))).encode())
+    for name, data in files:
+        digest.update(name.encode() + b"\0" + len(data).to_bytes(8, "little") + data)
+    return digest.hexdigest()
+
+
+def load_levels(directory, defaults, fallback=None):
+    """The LevelTable for the *.json files in `directory`, from the compile cache when it's current.
+
+    `defaults` holds max_rows, coily_intervals (indexed by level), ball_interval
+    and ball_spawn_delay. Without any level files, `fallback` (a definition
+    dict) is used for every level.
+    """
+    files = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(directory, name), "rb") as f:
+                    files.append((name, f.read()))
+    if not files:
+        if fallback is None:
+            raise FileNotFoundError(f"No level definitions (*.json) in {directory}")
+        logger.warning("No level definitions in %s, using the built-in level", directory)
+        return LevelTable(compile_levels([("built-in level", fallback)], defaults))
+
+    key = source_hash(files, defaults)
+    cache_path = os.path.join(directory, CACHE_DIR, f"levels-{key[:16]}.json")
+    try:
+        with open(cache_path, "rb") as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return LevelTable([rules_from_json(fields) for fields in cached["levels"]], key)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, TypeError, KeyError) as e:
+        logger.warning("Ignoring unreadable level cache %s: %s", cache_path, e)
+
+    sources = []
+    for name, data in files:
+        try:
+            sources.append((name, json.loads(data)))
+        except ValueError as e:
+            raise ValueError(f"{name}: not valid JSON ({e})") from None
+    levels = compile_levels(sources, defaults)
+    logger.info("Compiled %d level files from %s", len(files), directory)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": key, "levels": [rules_to_json(rules) for rules in levels]}, f, separators=(",", ":"))
+        os.replace(tmp_path, cache_path) # Never leave a half-written cache where the next start would read it
+        for name in os.listdir(os.path.dirname(cache_path)):
+            if name.startswith("levels-") and name != os.path.basename(cache_path) and not name.endswith(".tmp"):
+                os.remove(os.path.join(os.path.dirname(cache_path), name)) # Compiled from older files, or pickled by older versions
+    except OSError as e:
+        logger.warning("Could not write level cache %s: %s", cache_path, e)
+    return LevelTable(levels, key)
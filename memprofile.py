@@ -0,0 +1,290 @@
+"""Memory profiling mode: per-frame allocations, GC pauses and long-lived growth.
+
+With QBERT_MEMPROFILE=1 the main loop runs under tracemalloc, with a gc
+callback timing every collection, and the report is logged at exit:
+
+    QBERT_MEMPROFILE=1 python QBert.py
+    QBERT_MEMPROFILE=1 QBERT_MEMPROFILE_EVERY=10 python QBert.py   # line breakdown every 10th frame
+
+Per frame phase (events, update, publish, draw, flip) it records net bytes
+kept, the transient high-water mark above the phase's starting point (the
+short-lived tuples, lists and Rects a phase builds and drops), the change
+in allocated blocks, and GC collections and pause time.
+
+On every Nth frame a line tracer also charges each executed source line
+with the memory high-water mark reached while it ran, which catches the
+garbage a line creates and drops as well as what it keeps. Every few
+seconds a tracemalloc snapshot is compared with the previous one to find
+lines whose live memory keeps growing, and watched containers (e.g.
+loaded_sounds) are flagged when they keep growing or pass their expected
+size. The profiler's own bookkeeping is measured at start and subtracted.
+
+Profiling slows the game down several times; don't read frame rates from it.
+"""
+import gc
+import linecache
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # Not on Windows
+    resource = None
+
+from simthread import Stats
+
+logger = logging.getLogger("qbert.memprofile")
+
+TRACE_DEPTH = 1             # Frames kept per allocation; one is enough for per-line totals
+LINE_SAMPLE_EVERY = 30      # Frames between line-traced frames
+CALIBRATION_ROUNDS = 200    # Empty phases and traced lines used to measure the profiler's own overhead
+GROWTH_CHECK_INTERVAL = 5.0 # Seconds between long-lived growth checks
+GROWTH_CHECKS = 3           # Consecutive growing checks before a line or container is flagged
+GROWTH_MIN_BYTES = 16 * 1024 # Lines that grew less than this in total are not flagged
+REPORT_LINES = 15
+
+
+class PhaseStats:
+    def __init__(self):
+        self.frames = 0
+        self.net_bytes = 0
+        self.peak_bytes = 0      # Sum over frames of the phase's transient high-water mark
+        self.worst_peak = 0
+        self.blocks = 0          # Net change in allocated blocks
+        self.collections = [0, 0, 0]
+        self.gc_seconds = 0.0
+
+
+class MemoryProfiler:
+    """Attach to MainLoop.profiler; the loop calls begin_frame(), phase(name) and end_frame()."""
+    def __init__(self, sample_every=LINE_SAMPLE_EVERY, growth_interval=GROWTH_CHECK_INTERVAL):
+        self.sample_every = sample_every
+        self.growth_interval = growth_interval
+        self.frames = 0
+        self.phases = {} # name -> PhaseStats, in first-seen order
+        self.gc_pause = Stats("GC pause")
+        self.gc_pause_by_generation = [Stats(f"gen {generation} GC pause") for generation in range(3)]
+        self.line_bytes = {} # (file, line) -> summed allocation high-water marks over traced frames
+        self.line_runs = {}  # (file, line) -> executions over traced frames
+        self.sampled_frames = 0
+        self.watches = [] # [name, measure, limit, last value, growing checks, flagged]
+        self.growth_flags = [] # Messages, in the order found
+        self._growing_lines = {} # (file, line) -> [consecutive growing checks, first size]
+        self._phase = None
+        self._phase_start = None # (traced bytes, allocated blocks) when the current phase started
+        self._gc_started = 0.0
+        self._traced_frame = None # Caller frame of begin_frame() while a frame is line-traced
+        self._line = None         # (file, line) running now in a traced frame
+        self._line_start = 0      # Traced bytes when it started
+        self._phase_bias = (0.0, 0.0, 0.0) # Net bytes, transient bytes, blocks the bookkeeping adds per phase
+        self._line_bias = 0.0     # Transient bytes the tracer adds per line
+        self._growth_snapshot = None
+        self._next_growth_check = 0.0
+        self._filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+                         tracemalloc.Filter(False, "<frozen importlib._bootstrap*")]
+
+    def start(self):
+        tracemalloc.start(TRACE_DEPTH)
+        self._snapshot() # Compiles the filter patterns now rather than during a measured frame
+        self._calibrate()
+        gc.callbacks.append(self._on_gc)
+        self._next_growth_check = time.perf_counter() + self.growth_interval
+        return self
+
+    def _calibrate(self):
+        """Measures what phase() and the line tracer allocate themselves, to subtract it later."""
+        for _ in range(CALIBRATION_ROUNDS):
+            self.phase("calibration")
+        self.phase(None)
+        stats = self.phases.pop("calibration")
+        self._phase_bias = (stats.net_bytes / stats.frames, stats.peak_bytes / stats.frames, stats.blocks / stats.frames)
+
+        sys.settrace(self._trace)
+        _calibration_lines()
+        sys.settrace(None)
+        self._line = None
+        runs = sum(self.line_runs.values())
+        self._line_bias = sum(self.line_bytes.values()) / runs if runs else 0.0
+        self.line_bytes.clear()
+        self.line_runs.clear()
+
+    def stop(self):
+        self.end_frame()
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        tracemalloc.stop()
+
+    def watch(self, name, measure, limit=None):
+        """Flags `measure()` (a count or size) if it grows for several checks in a row or exceeds `limit`."""
+        self.watches.append([name, measure, limit, measure(), 0, False])
+
+    # --- Per-frame hooks ---
+    def begin_frame(self):
+        self.end_frame()
+        self.frames += 1
+        if self.frames % self.sample_every == 0:
+            # Trace the rest of the caller's frame too, not just the functions it calls
+            self._traced_frame = sys._getframe(1)
+            self._traced_frame.f_trace = self._trace
+            sys.settrace(self._trace)
+        self.phase("events")
+
+    def phase(self, name):
+        """Ends the current phase and starts `name`."""
+        current, _ = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        if self._phase is not None:
+            stats = self.phases.get(self._phase)
+            if stats is None:
+                stats = self.phases[self._phase] = PhaseStats()
+            start_bytes, start_blocks = self._phase_start
+            _, peak = tracemalloc.get_traced_memory()
+            net_bias, peak_bias, blocks_bias = self._phase_bias
+            stats.frames += 1
+            stats.net_bytes += current - start_bytes - net_bias
+            stats.peak_bytes += peak - start_bytes - peak_bias
+            stats.worst_peak = max(stats.worst_peak, peak - start_bytes - peak_bias)
+            stats.blocks += blocks - start_blocks - blocks_bias
+        self._phase = name
+        if name is not None:
+            tracemalloc.reset_peak()
+            self._phase_start = (tracemalloc.get_traced_memory()[0], sys.getallocatedblocks())
+
+    def end_frame(self):
+        if self._phase is None:
+            return
+        if self._traced_frame is not None:
+            sys.settrace(None)
+            self._traced_frame.f_trace = None
+            self._traced_frame = None
+            self._end_line()
+            self.sampled_frames += 1
+        self.phase(None)
+        if time.perf_counter() >= self._next_growth_check:
+            self._check_growth()
+            self._next_growth_check = time.perf_counter() + self.growth_interval
+
+    def _trace(self, frame, event, arg):
+        if event == "line":
+            self._end_line()
+            self._line = (frame.f_code.co_filename, frame.f_lineno)
+            tracemalloc.reset_peak()
+            self._line_start = tracemalloc.get_traced_memory()[0]
+        elif event == "call":
+            self._end_line() # The caller's line resumes on return; charge the callee's lines separately
+        return self._trace
+
+    def _end_line(self):
+        if self._line is None:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        line = self._line
+        self.line_bytes[line] = self.line_bytes.get(line, 0) + max(0, peak - self._line_start - self._line_bias)
+        self.line_runs[line] = self.line_runs.get(line, 0) + 1
+        self._line = None
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(self._filters)
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_started = time.perf_counter()
+            return
+        pause = time.perf_counter() - self._gc_started
+        generation = info["generation"]
+        self.gc_pause.add(pause)
+        self.gc_pause_by_generation[generation].add(pause)
+        if self._phase is not None:
+            stats = self.phases.get(self._phase)
+            if stats is None:
+                stats = self.phases[self._phase] = PhaseStats()
+            stats.collections[generation] += 1
+            stats.gc_seconds += pause
+
+    # --- Long-lived growth ---
+    def _check_growth(self):
+        snapshot = self._snapshot()
+        if self._growth_snapshot is not None:
+            growing = {}
+            for stat in snapshot.compare_to(self._growth_snapshot, "lineno"):
+                if stat.size_diff > 0:
+                    key = (stat.traceback[0].filename, stat.traceback[0].lineno)
+                    checks, first_size = self._growing_lines.get(key, (0, stat.size - stat.size_diff))
+                    growing[key] = (checks + 1, first_size)
+                    if checks + 1 == GROWTH_CHECKS and stat.size - first_size >= GROWTH_MIN_BYTES:
+                        self._flag(f"{_where(key)} grew {GROWTH_CHECKS} checks in a row, "
+                                   f"now {stat.size / 1024:.1f} KiB in {stat.count} blocks "
+                                   f"(+{(stat.size - first_size) / 1024:.1f} KiB)")
+            self._growing_lines = growing
+        self._growth_snapshot = snapshot
+
+        for watch in self.watches:
+            name, measure, limit, last, checks, flagged = watch
+            value = measure()
+            checks = checks + 1 if value > last else 0
+            if not flagged and limit is not None and value > limit:
+                self._flag(f"{name} is {value}, expected at most {limit}")
+                flagged = True
+            elif not flagged and checks >= GROWTH_CHECKS:
+                self._flag(f"{name} grew {checks} checks in a row, now {value}")
+                flagged = True
+            watch[3:] = [value, checks, flagged]
+
+    def _flag(self, message):
+        self.growth_flags.append(message)
+        logger.warning("Long-lived growth: %s", message)
+
+    # --- Report ---
+    def report(self):
+        self._check_growth()
+        lines = [f"Memory profile over {self.frames} frames"]
+        current, _ = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        peak_rss = peak_rss_bytes()
+        lines.append(f"  traced now {current / 1024:.0f} KiB, peak RSS "
+                     + (f"{peak_rss / 1024 / 1024:.1f} MiB" if peak_rss is not None else "unavailable"))
+        lines.append("  phase        net B/frame  transient B/frame (worst)  blocks/frame  GC gen0/1/2  GC ms")
+        for name, stats in self.phases.items():
+            frames = max(stats.frames, 1)
+            lines.append(f"  {name:10} {stats.net_bytes / frames:12.0f} {stats.peak_bytes / frames:12.0f} "
+                         f"({stats.worst_peak:>8.0f}) {stats.blocks / frames:14.1f}  "
+                         f"{stats.collections[0]:>4}/{stats.collections[1]}/{stats.collections[2]} "
+                         f"{stats.gc_seconds * 1000:8.2f}")
+        lines.append("  " + self.gc_pause.summary())
+        for stats in self.gc_pause_by_generation:
+            if stats.count:
+                lines.append("    " + stats.summary())
+
+        if self.sampled_frames:
+            lines.append(f"  Allocated per frame by line ({self.sampled_frames} traced frames):")
+            lines.append("       bytes   runs  line")
+            ranked = sorted(self.line_bytes.items(), key=lambda item: -item[1])[:REPORT_LINES]
+            for key, size in ranked:
+                lines.append(f"    {size / self.sampled_frames:8.0f} {self.line_runs[key] / self.sampled_frames:6.0f}  "
+                             f"{_where(key)}  {linecache.getline(key[0], key[1]).strip()[:60]}")
+
+        lines.append("  Long-lived growth: " + ("none found" if not self.growth_flags else ""))
+        for message in self.growth_flags:
+            lines.append("    " + message)
+        return "\n".join(lines)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where the platform can't tell."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux reports KiB, macOS bytes
+
+
+def _calibration_lines():
+    # Lines that allocate nothing, for MemoryProfiler._calibrate()
+    for _ in range(CALIBRATION_ROUNDS):
+        pass
+
+
+def _where(key):
+    filename, lineno = key
+    return f"{os.path.basename(filename)}:{lineno}"
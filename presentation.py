@@ -0,0 +1,123 @@
+"""Presenting the game's fixed-size framebuffer on any window or screen size.
+
+The game always draws into one SCREEN_WIDTH x SCREEN_HEIGHT surface, so a
+frame costs the same to draw on a 1080p or 4K cabinet screen as in the
+default window. QBERT_RESOLUTION sets that size: 800x700 by default, or a
+smaller one with the same aspect such as 400x350, which QBert.py lays out
+at that scale and which costs about a quarter as much to fill and draw.
+QBERT_DISPLAY picks how the framebuffer reaches the screen:
+
+    window    the framebuffer is the window (default at 800x700)
+    scaled    pygame.SCALED: SDL's renderer scales it, keeping the aspect
+              ratio with black bars; per-frame CPU cost stays flat whatever
+              the output size (default at reduced resolutions)
+    integer   the largest whole-number scale that fits, one nearest-neighbour
+              scale blit per frame into the middle of the window; crisp
+              pixels, but the blit's cost grows with the output size, so
+              it suits windows a few times the framebuffer, not 4K screens
+
+    QBERT_RESOLUTION=400x350 QBERT_FULLSCREEN=1 python QBert.py
+    QBERT_DISPLAY=integer QBERT_WINDOW=1920x1080 python QBert.py   # resizable window
+
+Mouse and touch positions are mapped back to framebuffer coordinates by
+pointer_position(); a click or tap on the black bars maps to None.
+"""
+import logging
+
+import pygame
+
+logger = logging.getLogger("qbert.presentation")
+
+MODES = ("window", "scaled", "integer")
+BAR_COLOR = (0, 0, 0)
+
+
+def parse_size(text):
+    """(width, height) from "WIDTHxHEIGHT"."""
+    try:
+        width, height = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise ValueError(f"Window size must look like 1920x1080, not {text!r}") from None
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Window size must be positive, not {text!r}")
+    return width, height
+
+
+class Display:
+    """The framebuffer the game draws into, and the window it's presented in."""
+    def __init__(self, size, mode="window", fullscreen=False, window_size=None):
+        if mode not in MODES:
+            raise ValueError(f"Display mode must be one of {', '.join(MODES)}, not {mode!r}")
+        self.size = size               # Framebuffer (logical) size
+        self.mode = mode
+        self.fullscreen = fullscreen
+        self.window_size = window_size # Integer mode's starting window size; default: the framebuffer's
+        self.window = None             # pygame's display surface
+        self.surface = None            # What the game draws into
+        self.scale = 1
+        self.viewport = pygame.Rect((0, 0), size) # Where the framebuffer lands in the window
+        self._target = None            # Window subsurface the framebuffer is scaled into (scale > 1)
+
+    def open(self):
+        """Creates the window; returns the framebuffer surface."""
+        if self.mode == "integer":
+            flags = pygame.FULLSCREEN if self.fullscreen else pygame.RESIZABLE
+            self.window = pygame.display.set_mode((0, 0) if self.fullscreen else (self.window_size or self.size), flags)
+            self.surface = pygame.Surface(self.size).convert(self.window)
+            self._layout()
+        else:
+            flags = pygame.SCALED if self.mode == "scaled" else 0
+            if self.fullscreen:
+                flags |= pygame.FULLSCREEN
+            self.window = self.surface = pygame.display.set_mode(self.size, flags)
+        logger.info("Display %s: %dx%d framebuffer in a %dx%d window%s", self.mode, *self.size,
+                    *pygame.display.get_window_size(), f", scale {self.scale}" if self.mode == "integer" else "")
+        return self.surface
+
+    def _layout(self):
+        """Picks the integer scale and viewport for the current window size and clears the bars."""
+        window_width, window_height = self.window.get_size()
+        width, height = self.size
+        self.scale = max(1, min(window_width // width, window_height // height))
+        self.viewport = pygame.Rect(0, 0, width * self.scale, height * self.scale)
+        self.viewport.center = (window_width // 2, window_height // 2) # Cropped if the window is smaller than the framebuffer
+        self._target = self.window.subsurface(self.viewport) if self.scale > 1 else None
+        self.window.fill(BAR_COLOR) # The bars are only drawn here, not every frame
+
+    def present(self):
+        """Shows the framebuffer: one scale blit in integer mode, then the flip."""
+        if self.mode == "integer":
+            if self._target is None:
+                self.window.blit(self.surface, self.viewport)
+            else:
+                pygame.transform.scale(self.surface, self._target.get_size(), self._target)
+        pygame.display.flip()
+
+    def handle_event(self, event):
+        """Follows window size changes; returns True if the event was one."""
+        if event.type != pygame.VIDEORESIZE:
+            return False
+        if self.mode == "integer":
+            self.window = pygame.display.get_surface()
+            self._layout()
+            self.present() # Static screens aren't redrawn, so show the last frame again at the new size
+        return True
+
+    def to_logical(self, window_pos):
+        """Framebuffer coordinates of a window position, or None on the bars."""
+        if self.mode != "integer":
+            return window_pos # SDL already maps positions in SCALED mode
+        if not self.viewport.collidepoint(window_pos):
+            return None
+        x, y = window_pos
+        return ((x - self.viewport.x) // self.scale, (y - self.viewport.y) // self.scale)
+
+    def pointer_position(self, event):
+        """Framebuffer coordinates of a click or tap event; None for other events and for the bars."""
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not getattr(event, "touch", False):
+            return self.to_logical(event.pos)
+        if event.type == pygame.FINGERDOWN:
+            # Touch positions are 0..1 across the window; SCALED mode already made them across the framebuffer
+            width, height = self.size if self.mode != "integer" else self.window.get_size()
+            return self.to_logical((int(event.x * width), int(event.y * height)))
+        return None
@@ -0,0 +1,222 @@
+"""Golden-image check of the game's drawing code.
+
+Draws a catalogue of fixed scenes (fresh and partly flipped pyramids,
+enemies on edge cubes, discs on cooldown, each render quality level, the
+game over and level complete screens) headless under the dummy video
+driver and compares each with its stored PNG in goldens/. Each scene is a
+GameSnapshot, and must also come back unchanged from apply_snapshot() and
+snapshot(), cube color steps included. A pixel differs
+when any channel is more than --tolerance away. Failing scenes leave
+<scene>-actual.png and <scene>-diff.png (the golden, dimmed, with differing
+pixels in red) in --diff-dir. The whole catalogue takes well under a second,
+so run it before and after any change to how things are drawn.
+
+    python rendercheck.py check                 # exit status 1 on any difference
+    python rendercheck.py check coily_edges --tolerance 4
+    python rendercheck.py update                # after an intended change: rewrite the goldens
+    python rendercheck.py list
+
+The comparison uses NumPy through pygame.surfarray when it's installed, and
+otherwise PixelArray.compare(), which does the same pass in C but measures
+colour distance rather than the largest channel difference. Scenes use
+pygame's built-in font so the goldens don't depend on the fonts installed.
+"""
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") # No window or audio device needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.pop("QBERT_RESOLUTION", None) # The goldens are drawn at the base 800x700 layout
+
+import argparse
+import logging
+import sys
+import time
+
+import pygame
+
+try:
+    import numpy
+    import pygame.surfarray
+except ImportError: # surfarray needs NumPy
+    numpy = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(SCRIPT_DIR, "goldens")
+DEFAULT_TOLERANCE = 0
+DIFF_COLOR = (255, 0, 0)
+
+# Scenes: name -> (snapshot fields changed from the base scene, render quality, leaderboard rows).
+# Cube steps follow CUBE_CELLS order (row by row from the top); the first digit is the top cube.
+def steps(digits):
+    """Snapshot cube steps from one digit per cube; cubes past the given digits are on step 0."""
+    return bytes(int(digit) for digit in digits.ljust(28, "0"))
+
+
+PLAYING = 1
+GAME_OVER = 2
+LEVEL_COMPLETE = 3
+SPLASH = 5
+SCENES = {
+    "fresh_pyramid": ({}, 0, ()),
+    "partly_flipped": ({"cubes": steps("1110100110010110101"), "score": 275, "player_row": 3, "player_col": 1}, 0, ()),
+    "all_flipped": ({"cubes": steps("1" * 28), "score": 700, "player_row": 6, "player_col": 6}, 0, ()),
+    "coily_edges": ({"coily_row": 6, "coily_col": 0, "coily_flags": 1, "ball_row": 6, "ball_col": 6, "ball_flags": 1}, 0, ()),
+    "coily_left_side": ({"coily_row": 4, "coily_col": 0, "coily_flags": 1, "ball_row": 2, "ball_col": 2, "ball_flags": 1}, 0, ()),
+    "ball_top_row": ({"ball_row": 1, "ball_col": 0, "ball_flags": 1, "player_row": 1, "player_col": 1}, 0, ()),
+    "discs_cooldown": ({"discs": 0}, 0, ()),
+    "left_disc_cooldown": ({"discs": 2, "player_flags": 0}, 0, ()), # Riding the disc: inactive and hidden
+    "player_off_board": ({"player_row": 7, "player_col": 3, "lives": 2}, 0, ()),
+    "level_2_midway": ({"level": 2, "cubes": steps("2112101200110021"), "score": 400}, 0, ()), # Intermediate step
+    "level_3_colors": ({"level": 3, "cubes": steps("111000111")}, 0, ()),
+    "no_outlines": ({"coily_row": 5, "coily_col": 2, "coily_flags": 1, "cubes": steps("1100011")}, 1, ()),
+    "flat_tiles": ({"coily_row": 5, "coily_col": 2, "coily_flags": 1, "cubes": steps("1100011")}, 2, ()),
+    "low_resolution": ({"coily_row": 5, "coily_col": 2, "coily_flags": 1, "cubes": steps("1100011")}, 3, ()),
+    "game_over": ({"game_state": GAME_OVER, "lives": 0, "score": 1250, "player_flags": 0}, 0, ()),
+    "game_over_scores": ({"game_state": GAME_OVER, "lives": 0, "score": 1250, "player_flags": 0}, 0,
+                         ((4100, 3, 0, "2024-05-01", 0), (2675, 2, 0, "2024-04-28", 0), (1250, 1, 0, "2024-05-02", 0))),
+    "level_complete": ({"game_state": LEVEL_COMPLETE, "cubes": steps("1" * 28), "score": 700}, 0, ()),
+    "splash_screen": ({"game_state": SPLASH, "level": 2, "score": 700}, 0, ()),
+}
+BASE_SCENE = {
+    "cubes": steps(""), "player_row": 0, "player_col": 0, "player_flags": 3, # ENTITY_ACTIVE | PLAYER_VISIBLE
+    "coily_row": 0, "coily_col": 0, "coily_flags": 0, "ball_row": 0, "ball_col": 0, "ball_flags": 0,
+    "discs": 3, "score": 0, "lives": 3, "level": 1, "game_state": PLAYING,
+}
+
+
+class _TopScores:
+    def __init__(self, rows):
+        self.top_scores = rows
+
+
+class SceneRenderer:
+    """Draws catalogue scenes with the game's own drawing code onto one display surface."""
+    def __init__(self):
+        logging.disable(logging.CRITICAL)
+        pygame.display.init()
+        pygame.font.init()
+        import QBert
+        self.game = QBert
+        self.screen = pygame.display.set_mode((QBert.SCREEN_WIDTH, QBert.SCREEN_HEIGHT))
+        QBert.game_font = pygame.font.Font(None, QBert.FONT_SIZE)
+        QBert.small_font = pygame.font.Font(None, QBert.SMALL_FONT_SIZE)
+
+    def snapshot(self, name):
+        return self.game.GameSnapshot(**dict(BASE_SCENE, **SCENES[name][0]))
+
+    def draw(self, name):
+        _, quality, top_scores = SCENES[name]
+        session = self.game.GameSession()
+        session.apply_snapshot(self.snapshot(name))
+        session.high_scores = _TopScores(top_scores) if top_scores else None
+        session.draw(self.screen, quality)
+        return self.screen
+
+    def round_trip(self, name):
+        """Snapshot fields that change when the scene goes through apply_snapshot() and snapshot() again."""
+        snapshot = self.snapshot(name)
+        session = self.game.GameSession()
+        session.apply_snapshot(snapshot)
+        again = session.snapshot()
+        return [field for field in snapshot._fields if getattr(again, field) != getattr(snapshot, field)]
+
+
+def golden_path(name):
+    return os.path.join(GOLDEN_DIR, f"{name}.png")
+
+
+def compare(actual, golden, tolerance):
+    """(differing pixel count, Mask of the differing pixels) between two same-size surfaces."""
+    if numpy is not None:
+        a = pygame.surfarray.array3d(actual).astype(numpy.int16)
+        b = pygame.surfarray.array3d(golden).astype(numpy.int16)
+        differs = numpy.abs(a - b).max(axis=2) > tolerance # Indexed [x, y], like the surfaces
+        result = pygame.surfarray.make_surface(numpy.repeat(differs[:, :, None], 3, axis=2).astype(numpy.uint8) * 255)
+        mask = pygame.mask.from_threshold(result, (255, 255, 255, 255), (1, 1, 1, 255))
+    else:
+        # Differing pixels come back black, matching ones white
+        result = pygame.PixelArray(actual).compare(pygame.PixelArray(golden), tolerance / 255).make_surface()
+        mask = pygame.mask.from_threshold(result, (0, 0, 0, 255), (1, 1, 1, 255))
+    return mask.count(), mask
+
+
+def diff_image(golden, mask):
+    """The golden dimmed to a third, with the differing pixels in DIFF_COLOR."""
+    image = golden.copy()
+    image.fill((85, 85, 85), special_flags=pygame.BLEND_RGB_MULT)
+    image.blit(mask.to_surface(setcolor=DIFF_COLOR + (255,), unsetcolor=(0, 0, 0, 0)), (0, 0))
+    return image
+
+
+def check(names, tolerance, diff_dir):
+    renderer = SceneRenderer()
+    failures = 0
+    started = time.perf_counter()
+    for name in names:
+        changed = renderer.round_trip(name)
+        if changed:
+            print(f"{name}: {', '.join(changed)} changed going through apply_snapshot() and snapshot()")
+            failures += 1
+            continue
+        actual = renderer.draw(name)
+        path = golden_path(name)
+        if not os.path.exists(path):
+            print(f"{name}: no golden image, run 'python rendercheck.py update {name}'")
+            failures += 1
+            continue
+        golden = pygame.image.load(path).convert(actual)
+        if golden.get_size() != actual.get_size():
+            print(f"{name}: size {actual.get_size()} != golden {golden.get_size()}")
+            failures += 1
+            continue
+        count, mask = compare(actual, golden, tolerance)
+        if count:
+            failures += 1
+            os.makedirs(diff_dir, exist_ok=True)
+            pygame.image.save(actual, os.path.join(diff_dir, f"{name}-actual.png"))
+            pygame.image.save(diff_image(golden, mask), os.path.join(diff_dir, f"{name}-diff.png"))
+            rects = mask.get_bounding_rects()
+            box = rects[0].unionall(rects[1:])
+            print(f"{name}: {count} pixels differ, within {tuple(box)}; see {diff_dir}/{name}-diff.png")
+    elapsed = time.perf_counter() - started
+    method = "surfarray" if numpy is not None else "PixelArray.compare"
+    print(f"{len(names) - failures}/{len(names)} scenes match (tolerance {tolerance}, {method}) in {elapsed * 1000:.0f} ms")
+    return failures
+
+
+def update(names):
+    renderer = SceneRenderer()
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name in names:
+        pygame.image.save(renderer.draw(name), golden_path(name))
+    print(f"Wrote {len(names)} golden images to {GOLDEN_DIR}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the game's drawing with stored golden images.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check_parser = sub.add_parser("check", help="draw the scenes and compare them with the goldens")
+    check_parser.add_argument("scenes", nargs="*", help="scene names (default: all)")
+    check_parser.add_argument("--tolerance", type=int, default=DEFAULT_TOLERANCE,
+                              help="largest per-channel difference (0-255) that still counts as equal")
+    check_parser.add_argument("--diff-dir", default="render_diffs", help="where failing scenes' images go")
+    update_parser = sub.add_parser("update", help="rewrite the golden images from the current code")
+    update_parser.add_argument("scenes", nargs="*", help="scene names (default: all)")
+    sub.add_parser("list", help="list the scenes")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name, (fields, quality, _) in SCENES.items():
+            print(f"{name:20} quality {quality}  {fields}")
+        return 0
+    unknown = [name for name in args.scenes if name not in SCENES]
+    if unknown:
+        parser.error(f"unknown scenes: {', '.join(unknown)}")
+    names = args.scenes or list(SCENES)
+    if args.command == "update":
+        update(names)
+        return 0
+    return 1 if check(names, args.tolerance, args.diff_dir) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Frame-time-adaptive render quality.
+
+When frames run over budget the renderer sheds work one level at a time:
+
+    0 full              every cube face, character and disc outlined
+    1 no outlines       the same shapes without their outline polygons
+    2 flat tiles        each cube is one blit of a pre-drawn tile
+    3 low resolution    the pyramid is drawn at half size and scaled up
+
+QualityController watches the work time of recent frames (not the wait for
+the next frame). It steps down once the median of the last DOWN_WINDOW
+frames is over DOWN_AT of the budget, and back up only after UP_FRAMES
+frames in a row under UP_AT. A level that steps down again soon after
+stepping up must wait twice as long before the next try, so a game that
+sits on the edge does not flicker between two levels.
+
+    QBERT_QUALITY=auto python QBert.py    # default; F3 shows the level and frame times
+    QBERT_QUALITY=2 python QBert.py       # fixed level
+"""
+import collections
+
+QUALITY_FULL = 0
+QUALITY_NO_OUTLINES = 1
+QUALITY_FLAT_TILES = 2
+QUALITY_LOW_RES = 3
+QUALITY_NAMES = {QUALITY_FULL: "full", QUALITY_NO_OUTLINES: "no outlines", QUALITY_FLAT_TILES: "flat tiles",
+                 QUALITY_LOW_RES: "low resolution"}
+
+DOWN_WINDOW = 10   # Frames whose median decides a step down
+DOWN_AT = 0.9      # Of the budget
+UP_AT = 0.5        # Of the budget
+UP_FRAMES = 90     # Frames in a row under UP_AT before a step up
+MAX_UP_BACKOFF = 8 # Longest wait for a step up, in multiples of UP_FRAMES
+
+
+class QualityController:
+    """Picks a render quality level from the work time of recent frames."""
+    def __init__(self, budget, level=QUALITY_FULL, max_level=QUALITY_LOW_RES):
+        self.budget = budget # Seconds of work per frame
+        self.level = level
+        self.max_level = max_level
+        self.recent = collections.deque(maxlen=DOWN_WINDOW)
+        self.headroom_frames = 0 # Frames in a row under UP_AT
+        self.up_frames = UP_FRAMES
+        self.frames_since_up = None # Since the last step up, to spot one that didn't hold
+        self.changes = 0
+        self.change_mean = 0.0 # Mean work time of the frames that led to the last change
+
+    def add(self, seconds):
+        """Records one frame's work time; returns the new level if it changed, else None."""
+        recent = self.recent
+        recent.append(seconds)
+        self.headroom_frames = self.headroom_frames + 1 if seconds < self.budget * UP_AT else 0
+        if self.frames_since_up is not None:
+            self.frames_since_up += 1
+
+        if self.level < self.max_level and len(recent) == recent.maxlen and \
+                sorted(recent)[len(recent) // 2] > self.budget * DOWN_AT:
+            if self.frames_since_up is not None and self.frames_since_up < 2 * self.up_frames:
+                self.up_frames = min(self.up_frames * 2, UP_FRAMES * MAX_UP_BACKOFF) # The step up didn't hold
+            self.frames_since_up = None
+            return self._change(self.level + 1)
+        if self.level > QUALITY_FULL and self.headroom_frames >= self.up_frames:
+            self.frames_since_up = 0
+            return self._change(self.level - 1)
+        return None
+
+    def _change(self, level):
+        self.level = level
+        self.change_mean = self.mean()
+        self.recent.clear() # Judge the new level on its own frames
+        self.headroom_frames = 0
+        self.changes += 1
+        return level
+
+    def mean(self):
+        """Mean work time of the frames since the last change (up to DOWN_WINDOW of them)."""
+        return sum(self.recent) / len(self.recent) if self.recent else 0.0
+
+
+def quality_setting(value, budget):
+    """A QBERT_QUALITY value as a fixed level, or a QualityController for "auto"."""
+    if value == "auto":
+        return QualityController(budget)
+    if value.isdigit() and int(value) in QUALITY_NAMES:
+        return int(value)
+    raise ValueError(f"QBERT_QUALITY must be auto or a level from 0 to {QUALITY_LOW_RES}, not {value!r}")
@@ -0,0 +1,70 @@
+"""How many game sessions one CPU core can run.
+
+Creates N GameSessions in this process, all sharing the pyramid tables, and
+steps each of them at the 30 Hz simulation rate on fuzzer.py's virtual clock
+with random input. Reports the cost of one session step, how many sessions
+one core could keep at 30 steps per second, and the memory each session adds.
+--forecast includes the cost of keeping each session's DangerForecast.
+
+    python sessionbench.py --sessions 500 --seconds 60
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+import tracemalloc
+
+import fuzzer
+
+FRAME_MS = 33 # One step at the 30 Hz simulation rate
+
+
+def run(session_count, seconds, seed, forecast=False):
+    game = fuzzer.load_game()
+    logging.disable(logging.CRITICAL) # Keep game logging out of the timings
+    random.seed(seed) # Enemy and ball AI use the global random module
+    rng = random.Random(seed)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = [fuzzer.new_session(game) for _ in range(session_count)]
+    if forecast:
+        for session in sessions:
+            session.enable_forecast()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    session_bytes = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / session_count
+
+    steps = int(seconds * 1000 / FRAME_MS)
+    keys = [[[fuzzer.KEY_CODES[key]] if key else [] for key, _ in fuzzer.generate_trace(rng, steps)]
+            for _ in range(session_count)]
+    started = time.process_time()
+    for step in range(steps):
+        fuzzer._clock.ticks += FRAME_MS
+        for session, session_keys in zip(sessions, keys):
+            session.update(fuzzer._clock.ticks, session_keys[step])
+    cpu = time.process_time() - started
+
+    step_us = cpu / (steps * session_count) * 1e6
+    playing = sum(session.game_state == game.STATE_PLAYING for session in sessions)
+    print(f"{session_count} sessions x {steps} steps ({seconds:g} s of game time) in {cpu:.2f} s CPU")
+    print(f"  {step_us:.1f} us per session step")
+    print(f"  {1e6 / (step_us * 1000 / FRAME_MS):,.0f} sessions per core at {1000 // FRAME_MS} steps/s")
+    print(f"  {session_bytes / 1024:.1f} KiB per session; pyramid tables shared ({len(game.CUBE_CELLS)} cubes)")
+    print(f"  {playing} still playing at the end")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure game sessions per CPU core.")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=30.0, help="game time each session plays")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--forecast", action="store_true", help="keep each session's danger forecast up to date")
+    args = parser.parse_args()
+    run(args.sessions, args.seconds, args.seed, args.forecast)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
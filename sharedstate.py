@@ -0,0 +1,283 @@
+"""Live game state in shared memory, for overlays, analytics and bots.
+
+The game writes one fixed-layout StateBlock per tick into a named
+multiprocessing.shared_memory segment (or an mmap'd file) when started with
+
+    QBERT_SHARED_STATE=qbert_state python QBert.py
+
+Updates are guarded by a sequence counter (seqlock). The writer makes `seq`
+odd, writes the fields, then makes it even again. SharedStateReader.read()
+retries until it has copied the fields between two equal, even reads of
+`seq`, so readers never see a torn update and never block the game.
+
+A name (or file) already holding the block of a running game is refused
+with FileExistsError rather than taken over, so its readers don't go stale;
+give the second game another QBERT_SHARED_STATE. A block left behind by a
+game that has exited (its writer_pid is gone) is replaced.
+
+Readers that want zero copies can use `reader.block` (a ctypes view of the
+live fields) or `reader.as_numpy()` (a NumPy structured array over the same
+memory) and check `seq` themselves.
+
+    python sharedstate.py qbert_state       # print the live state
+    python sharedstate.py --selftest        # hammer writer vs reader and check for torn reads
+"""
+import argparse
+import ctypes
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+from snapshot import GameSnapshot
+
+STATE_MAGIC = 0x53534251 # "QBSS"
+STATE_VERSION = 3
+MAX_CUBES = 32
+DEFAULT_NAME = "qbert_state"
+
+
+class StateBlock(ctypes.Structure):
+    """Fixed layout of the shared block; fields are naturally aligned for ctypes and NumPy alike."""
+    _fields_ = [
+        ("magic", ctypes.c_uint32),
+        ("version", ctypes.c_uint16),
+        ("cube_count", ctypes.c_uint16),
+        ("seq", ctypes.c_uint64),          # Odd while the writer is mid-update
+        ("frame", ctypes.c_uint64),        # Ticks published so far
+        ("time_ms", ctypes.c_uint64),      # pygame.time.get_ticks() of the frame
+        ("score", ctypes.c_uint32),
+        ("level", ctypes.c_uint16),
+        ("lives", ctypes.c_int16),
+        ("game_state", ctypes.c_uint8),
+        ("discs", ctypes.c_uint8),         # Bit 0: left disc active, bit 1: right disc active
+        ("player_row", ctypes.c_int8),
+        ("player_col", ctypes.c_int8),
+        ("player_flags", ctypes.c_uint8),  # snapshot.ENTITY_ACTIVE | snapshot.PLAYER_VISIBLE
+        ("coily_row", ctypes.c_int8),
+        ("coily_col", ctypes.c_int8),
+        ("coily_flags", ctypes.c_uint8),
+        ("ball_row", ctypes.c_int8),
+        ("ball_col", ctypes.c_int8),
+        ("ball_flags", ctypes.c_uint8),
+        ("_pad", ctypes.c_uint8 * 3),
+        ("cubes", ctypes.c_uint8 * MAX_CUBES), # Color step of each cube, an index into the level's colors
+        ("writer_pid", ctypes.c_uint32),   # Process id of the game writing the block
+    ]
+
+# Scalar fields copied out by read(); cubes is copied separately
+SCALAR_FIELDS = [name for name, _ in StateBlock._fields_
+                 if name not in ("magic", "version", "seq", "_pad", "cubes", "writer_pid")]
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        return True # Windows frees a segment with its last handle, so an existing one is always in use
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True # Someone else's process, but running
+    return True
+
+
+def _check_replaceable(buffer, where):
+    """Raises FileExistsError unless the existing block at `where` was left by a game that has exited."""
+    if len(buffer) >= ctypes.sizeof(StateBlock):
+        block = StateBlock.from_buffer(buffer)
+        magic, version, pid = block.magic, block.version, block.writer_pid
+        del block # Release the view before the buffer is closed
+        if magic == STATE_MAGIC and version == STATE_VERSION and pid and _pid_alive(pid):
+            raise FileExistsError(f"{where} is in use by a running game (pid {pid}); set another QBERT_SHARED_STATE")
+        if magic == STATE_MAGIC:
+            return # Ours, from a crashed run or an older version
+    elif len(buffer) >= 4 and int.from_bytes(buffer[:4], sys.byteorder) == STATE_MAGIC:
+        return # An older, smaller layout
+    raise FileExistsError(f"{where} exists and is not a Q*bert state block; not replacing it")
+
+
+def _open_segment(name, path, create):
+    """Returns (buffer, closer, unlinker) for a shared memory segment or an mmap'd file."""
+    size = ctypes.sizeof(StateBlock)
+    if path:
+        if create:
+            if os.path.exists(path) and os.path.getsize(path):
+                with open(path, "rb") as f:
+                    _check_replaceable(bytearray(f.read(size)), path)
+            with open(path, "wb") as f:
+                f.truncate(size)
+        with open(path, "r+b") as f:
+            mapping = mmap.mmap(f.fileno(), size)
+        return mapping, mapping.close, (lambda: os.remove(path))
+
+    if create:
+        try:
+            segment = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError: # Another game's, or left over from a crashed run
+            stale = shared_memory.SharedMemory(name)
+            try:
+                _check_replaceable(stale.buf, f"Shared memory {name!r}")
+            except FileExistsError:
+                stale.close()
+                raise
+            stale.unlink()
+            stale.close()
+            segment = shared_memory.SharedMemory(name, create=True, size=size)
+    else:
+        try:
+            segment = shared_memory.SharedMemory(name, track=False) # Python 3.13+
+        except TypeError:
+            segment = shared_memory.SharedMemory(name)
+            # Older versions register readers with the resource tracker, which would
+            # unlink the game's segment when the reader exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, "shared_memory")
+    return segment.buf, segment.close, segment.unlink
+
+
+class SharedStateWriter:
+    """Owns the shared block and publishes one GameSnapshot into it per tick."""
+    def __init__(self, name=DEFAULT_NAME, path=None, cube_count=28):
+        if cube_count > MAX_CUBES:
+            raise ValueError(f"StateBlock holds at most {MAX_CUBES} cubes")
+        self.name = name
+        self._buffer, self._close, self._unlink = _open_segment(name, path, create=True)
+        self.block = StateBlock.from_buffer(self._buffer)
+        self.block.magic = STATE_MAGIC
+        self.block.version = STATE_VERSION
+        self.block.cube_count = cube_count
+        self.block.writer_pid = os.getpid()
+
+    def publish(self, snapshot, time_ms=0):
+        block = self.block
+        block.seq += 1 # Odd: update in progress
+        block.frame += 1
+        block.time_ms = time_ms
+        block.score = snapshot.score
+        block.level = snapshot.level
+        block.lives = snapshot.lives
+        block.game_state = snapshot.game_state
+        block.discs = snapshot.discs
+        block.player_row, block.player_col, block.player_flags = snapshot.player_row, snapshot.player_col, snapshot.player_flags
+        block.coily_row, block.coily_col, block.coily_flags = snapshot.coily_row, snapshot.coily_col, snapshot.coily_flags
+        block.ball_row, block.ball_col, block.ball_flags = snapshot.ball_row, snapshot.ball_col, snapshot.ball_flags
+        cube_count = block.cube_count
+        block.cubes[:cube_count] = snapshot.cubes[:cube_count].ljust(cube_count, b"\0") # Zeros past a smaller pyramid
+        block.seq += 1 # Even: consistent again
+
+    def close(self, unlink=True):
+        del self.block # The ctypes view must go before the buffer can be released
+        self._close()
+        if unlink:
+            self._unlink()
+
+
+class SharedStateReader:
+    """Maps an existing block; read() returns a consistent copy, `block`/as_numpy() are live views."""
+    def __init__(self, name=DEFAULT_NAME, path=None):
+        self._buffer, self._close, _ = _open_segment(name, path, create=False)
+        self.block = StateBlock.from_buffer(self._buffer)
+        if self.block.magic != STATE_MAGIC or self.block.version != STATE_VERSION:
+            self.close()
+            raise ValueError(f"{path or name} is not a version {STATE_VERSION} Q*bert state block")
+        self.retries = 0 # Reads that raced a write and had to start over
+
+    def read(self):
+        """Returns a dict of every data field from one complete update."""
+        block = self.block
+        while True:
+            seq = block.seq
+            if seq & 1:
+                self.retries += 1
+                time.sleep(0) # Writer is mid-update; let it finish rather than spin
+                continue
+            values = {name: getattr(block, name) for name in SCALAR_FIELDS}
+            cubes = bytes(block.cubes) # Array fields are live views; copy inside the seqlock window
+            if block.seq == seq:
+                values["cubes"] = list(cubes[:values["cube_count"]])
+                values["seq"] = seq
+                return values
+            self.retries += 1
+
+    def read_snapshot(self):
+        """Like read(), but as a GameSnapshot for code that already speaks snapshots."""
+        values = self.read()
+        values["cubes"] = bytes(values["cubes"])
+        return GameSnapshot(*(values[name] for name in GameSnapshot._fields))
+
+    def as_numpy(self):
+        """Zero-copy NumPy structured array (shape (1,)) over the live block; needs numpy."""
+        import numpy as np
+        return np.frombuffer(self._buffer, dtype=np.dtype(StateBlock), count=1)
+
+    def close(self):
+        del self.block
+        self._close()
+
+
+def _selftest_writer(name, updates, ready):
+    """Writes blocks where every field is derived from one counter, so a torn read is detectable."""
+    writer = SharedStateWriter(name)
+    ready.set()
+    for n in range(1, updates + 1):
+        writer.publish(GameSnapshot(
+            cubes=bytes([n % 3] * (n % 29)), player_row=n % 7, player_col=n % 5, player_flags=n % 4,
+            coily_row=n % 7, coily_col=n % 5, coily_flags=n % 2, ball_row=n % 7, ball_col=n % 5,
+            ball_flags=n % 2, discs=n % 4, score=n, lives=n % 100, level=n % 65536, game_state=n % 6,
+        ), time_ms=n)
+    time.sleep(0.5) # Give the reader time to finish before the segment goes away
+    writer.close()
+
+
+def selftest(updates=200000):
+    name = f"qbert_selftest_{os.getpid()}"
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_selftest_writer, args=(name, updates, ready))
+    process.start()
+    ready.wait()
+    reader = SharedStateReader(name)
+    reads = torn = 0
+    started = time.perf_counter()
+    while True:
+        state = reader.read()
+        n = state["frame"]
+        reads += 1
+        consistent = (state["score"] == n and state["time_ms"] == n and state["player_row"] == n % 7
+                      and state["coily_col"] == n % 5 and state["lives"] == n % 100
+                      and state["game_state"] == n % 6 and state["cubes"] == [n % 3] * (n % 29) + [0] * (28 - n % 29))
+        if n and not consistent:
+            torn += 1
+        if n == updates:
+            break
+    elapsed = time.perf_counter() - started
+    reader.close()
+    process.join()
+    print(f"{reads} reads of {updates} updates in {elapsed:.2f}s: {torn} torn, {reader.retries} retries")
+    return 1 if torn else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the game's shared-memory state block.")
+    parser.add_argument("name", nargs="?", default=os.environ.get("QBERT_SHARED_STATE", DEFAULT_NAME))
+    parser.add_argument("--path", help="read an mmap'd file instead of a shared memory segment")
+    parser.add_argument("--selftest", action="store_true", help="check the seqlock with a writer process")
+    args = parser.parse_args()
+
+    if args.selftest:
+        return selftest()
+    reader = SharedStateReader(args.name, args.path)
+    try:
+        while True:
+            print(reader.read())
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Simulation on its own thread, handing immutable snapshots to the renderer.
+
+With QBERT_SIM_THREAD=1 the game logic steps at a fixed rate on a
+SimulationThread, while the main thread (which SDL requires for events
+and the window) only pumps input and draws the latest snapshot. A slow
+flip or vsync wait then delays the next frame, not the next simulation step.
+
+Both threads share the GIL, so this helps most when the render side waits
+in SDL (flip, vsync, event waits), which releases it.
+"""
+import collections
+import threading
+import time
+
+STATS_SAMPLES = 4096 # Recent samples kept per statistic for percentiles
+
+
+class Stats:
+    """Count, mean and recent percentiles of one timing, in seconds."""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.samples = collections.deque(maxlen=STATS_SAMPLES)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.count:
+            return f"{self.name}: no samples"
+        ordered = sorted(self.samples)
+        p50 = ordered[len(ordered) // 2]
+        p99 = ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)]
+        return (f"{self.name}: {self.count} samples, mean {self.total / self.count * 1000:.3f} ms, "
+                f"p50 {p50 * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms, max {self.worst * 1000:.3f} ms")
+
+
+class SnapshotBuffer:
+    """Latest-value handoff of immutable snapshots between one writer and one reader.
+
+    Snapshots are never changed once published, so the three buffers of
+    triple buffering are three references: the snapshot the writer is
+    building, the latest published one held here, and the one the reader
+    is drawing. Swapping is a reference assignment under a lock, so neither
+    side ever waits for the other to finish a frame.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = None
+        self._sequence = 0
+        self._published_at = 0.0
+        self.publish_wait = Stats("publish lock wait")
+        self.take_wait = Stats("take lock wait")
+
+    def publish(self, snapshot):
+        started = time.perf_counter()
+        with self._lock:
+            acquired = time.perf_counter()
+            self._latest = snapshot
+            self._sequence += 1
+            self._published_at = acquired
+        self.publish_wait.add(acquired - started)
+
+    def take(self):
+        """Returns (snapshot, sequence number, perf_counter time it was published)."""
+        started = time.perf_counter()
+        with self._lock:
+            acquired = time.perf_counter()
+            latest = self._latest, self._sequence, self._published_at
+        self.take_wait.add(acquired - started)
+        return latest
+
+
+class SimulationThread(threading.Thread):
+    """Calls step(keys) -> snapshot at a fixed rate and publishes each result."""
+    def __init__(self, step, buffer, rate=30):
+        super().__init__(name="qbert-simulation", daemon=True)
+        self.step = step
+        self.buffer = buffer
+        self.interval = 1 / rate
+        self.error = None # Exception that stopped the thread, for the main thread to re-raise
+        self.tick_interval = Stats("simulation tick interval")
+        self.tick_lateness = Stats("simulation tick lateness")
+        self.step_time = Stats("simulation step")
+        self._keys = collections.deque() # Appended by the render thread, drained once per step
+        self._stopping = threading.Event()
+
+    def post_key(self, key):
+        self._keys.append(key)
+
+    def run(self):
+        deadline = time.perf_counter()
+        last_tick = None
+        try:
+            while not self._stopping.is_set():
+                now = time.perf_counter()
+                self.tick_lateness.add(now - deadline)
+                if last_tick is not None:
+                    self.tick_interval.add(now - last_tick)
+                last_tick = now
+
+                keys = []
+                while self._keys:
+                    keys.append(self._keys.popleft())
+                self.buffer.publish(self.step(keys))
+                self.step_time.add(time.perf_counter() - now)
+
+                deadline += self.interval
+                if deadline < now: # Fell more than a tick behind; don't try to catch up in a burst
+                    deadline = now
+                self._stopping.wait(max(0.0, deadline - time.perf_counter()))
+        except Exception as e:
+            self.error = e
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
@@ -0,0 +1,14 @@
+import collections
+
+# A flat, immutable copy of everything needed to draw a frame. GameSession.snapshot()
+# builds one per tick and GameSession.apply_snapshot() rebuilds the scene from one.
+GameSnapshot = collections.namedtuple("GameSnapshot", [
+    "cubes",          # bytes, byte i the color step of pyramid_cubes[i] (an index into LevelRules.colors)
+    "player_row", "player_col", "player_flags", # ENTITY_ACTIVE | PLAYER_VISIBLE
+    "coily_row", "coily_col", "coily_flags",
+    "ball_row", "ball_col", "ball_flags",
+    "discs",          # Bit 0: left disc active, bit 1: right disc active
+    "score", "lives", "level", "game_state",
+])
+ENTITY_ACTIVE = 1
+PLAYER_VISIBLE = 2
@@ -0,0 +1,364 @@
+"""Spectator service: streams live game state to any number of watchers.
+
+The game loop calls SpectatorServer.publish(session.snapshot()) once per
+tick. An asyncio loop on a background thread diffs consecutive snapshots into
+compact binary deltas, encodes each delta once and fans it out over TCP. A
+watcher that can't keep up has its queued deltas dropped and gets a single
+keyframe with the latest state instead, so a slow connection never stalls
+the game or the other watchers.
+
+    QBERT_SPECTATOR_PORT=7700 python QBert.py       # host a game (QBERT_SPECTATOR_HOST=0.0.0.0 for the LAN)
+    python spectator.py view --port 7700            # watch it
+    python spectator.py loopback                    # self-check over 127.0.0.1
+
+Wire format: every message is a u16 length followed by the body. A body is
+a header (kind u8, tick u32, group mask u8) plus, for each set bit in the
+mask, that group's fields. Keyframes carry every group. The cube group is a
+u8 count followed by one color step per cube; the others are fixed size.
+"""
+import argparse
+import asyncio
+import collections
+import logging
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+
+from snapshot import GameSnapshot
+
+logger = logging.getLogger("qbert.spectator")
+
+DEFAULT_PORT = 7700
+CLIENT_QUEUE_LIMIT = 64        # Deltas queued per watcher before falling back to a keyframe
+WRITE_BUFFER_HIGH_WATER = 4096   # Bytes buffered in the transport before drain() waits (~250 deltas)
+
+MSG_KEYFRAME = 1
+MSG_DELTA = 2
+LENGTH = struct.Struct("<H")
+HEADER = struct.Struct("<BIB")
+
+
+
+class _StepBytes:
+    """struct.Struct stand-in for one bytes field: a u8 length, then the bytes."""
+    def pack(self, value):
+        return bytes((len(value),)) + value
+
+    def unpack_from(self, body, pos):
+        return (bytes(body[pos + 1:pos + 1 + body[pos]]),)
+
+
+# Field groups in wire order: (snapshot fields, struct). A delta carries a group when any of its fields changed.
+FIELD_GROUPS = [
+    (("cubes",), _StepBytes()),
+    (("player_row", "player_col", "player_flags"), struct.Struct("<bbB")),
+    (("coily_row", "coily_col", "coily_flags"), struct.Struct("<bbB")),
+    (("ball_row", "ball_col", "ball_flags"), struct.Struct("<bbB")),
+    (("discs",), struct.Struct("<B")),
+    (("score",), struct.Struct("<I")),
+    (("lives", "level"), struct.Struct("<BH")),
+    (("game_state",), struct.Struct("<B")),
+]
+GROUP_INDICES = [tuple(GameSnapshot._fields.index(name) for name in names) for names, _ in FIELD_GROUPS]
+
+
+def encode(kind, tick, snapshot, previous=None):
+    """Encodes a framed message; with `previous`, only the groups that changed. Returns None if nothing did."""
+    mask = 0
+    parts = []
+    for bit, (indices, (_, group_struct)) in enumerate(zip(GROUP_INDICES, FIELD_GROUPS)):
+        values = tuple(snapshot[i] for i in indices)
+        if previous is None or values != tuple(previous[i] for i in indices):
+            mask |= 1 << bit
+            parts.append(group_struct.pack(*values))
+    if not mask:
+        return None
+    body = HEADER.pack(kind, tick & 0xFFFFFFFF, mask) + b"".join(parts)
+    return LENGTH.pack(len(body)) + body
+
+
+def decode(body, base):
+    """Applies a message body to `base` (a GameSnapshot, or None before the first keyframe)."""
+    kind, tick, mask = HEADER.unpack_from(body, 0)
+    if kind == MSG_DELTA and base is None:
+        raise ValueError("delta received before any keyframe")
+    values = list(base) if base is not None else [0] * len(GameSnapshot._fields)
+    pos = HEADER.size
+    for bit, (indices, (_, group_struct)) in enumerate(zip(GROUP_INDICES, FIELD_GROUPS)):
+        if mask >> bit & 1:
+            group_values = group_struct.unpack_from(body, pos)
+            for i, value in zip(indices, group_values):
+                values[i] = value
+            pos += group_struct.size if isinstance(group_struct, struct.Struct) else 1 + len(group_values[0])
+    return kind, tick, GameSnapshot(*values)
+
+
+class _Watcher:
+    """Per-connection send state, only touched on the server's event loop."""
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = collections.deque()
+        self.needs_keyframe = True # Every watcher starts from a keyframe
+        self.wake = asyncio.Event()
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+
+
+class SpectatorServer:
+    """Runs the spectator TCP server on its own thread with its own asyncio loop."""
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, queue_limit=CLIENT_QUEUE_LIMIT, send_buffer=None):
+        self.host = host
+        self.port = port
+        self.queue_limit = queue_limit
+        self.send_buffer = send_buffer # Optional SO_SNDBUF; smaller means slow watchers hit backpressure sooner
+        self.watchers = set()
+        self.tick = 0
+        self.latest = None # Last published snapshot
+        self.deltas_dropped = 0
+        self._loop = asyncio.new_event_loop()
+        self._server = None
+        self._ready = threading.Event()
+        self._error = None # Why binding failed, re-raised by start()
+        self._thread = threading.Thread(target=self._run, name="qbert-spectator", daemon=True)
+
+    def start(self):
+        """Starts listening; returns once the port is bound (port 0 picks a free one).
+
+        Raises the bind's OSError (port in use, unknown host) instead of hanging.
+        """
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            self._thread.join()
+            raise self._error
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._serve_watcher, self.host, self.port))
+        except OSError as e: # socket.gaierror is an OSError too
+            self._error = e
+            self._loop.close()
+            self._ready.set()
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Spectator server listening on %s:%d", self.host, self.port)
+        self._ready.set()
+        self._loop.run_forever()
+
+    def publish(self, snapshot):
+        """Called from the game thread once per tick; never blocks."""
+        self._loop.call_soon_threadsafe(self._broadcast, snapshot)
+
+    def _broadcast(self, snapshot):
+        self.tick += 1
+        previous, self.latest = self.latest, snapshot
+        # Encoded once for every watcher
+        delta = encode(MSG_DELTA, self.tick, snapshot, previous) if previous is not None else None
+        for watcher in self.watchers:
+            if watcher.needs_keyframe:
+                watcher.wake.set() # The keyframe it is waiting for will include this change
+            elif delta is not None:
+                if len(watcher.pending) >= self.queue_limit:
+                    self.deltas_dropped += len(watcher.pending)
+                    watcher.pending.clear()
+                    watcher.needs_keyframe = True
+                else:
+                    watcher.pending.append(delta)
+                watcher.wake.set()
+
+    async def _serve_watcher(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_HIGH_WATER)
+        if self.send_buffer:
+            writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+        watcher = _Watcher(writer)
+        self.watchers.add(watcher)
+        watcher.wake.set()
+        peer = writer.get_extra_info("peername")
+        logger.info("Spectator connected from %s", peer)
+        try:
+            while True:
+                await watcher.wake.wait()
+                watcher.wake.clear()
+                if watcher.needs_keyframe and self.latest is not None:
+                    watcher.needs_keyframe = False
+                    watcher.pending.clear()
+                    writer.write(encode(MSG_KEYFRAME, self.tick, self.latest))
+                    watcher.keyframes_sent += 1
+                while watcher.pending:
+                    writer.write(watcher.pending.popleft())
+                    watcher.deltas_sent += 1
+                # While this waits, new deltas pile up in `pending` and overflow into a keyframe
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.watchers.discard(watcher)
+            writer.close()
+            logger.info("Spectator %s disconnected (%d keyframes, %d deltas)",
+                        peer, watcher.keyframes_sent, watcher.deltas_sent)
+
+    def stop(self):
+        def shutdown():
+            self._server.close()
+            for watcher in list(self.watchers):
+                watcher.writer.close()
+            self._loop.stop()
+        self._loop.call_soon_threadsafe(shutdown)
+        self._thread.join()
+
+
+class SpectatorClient:
+    """Reads a spectator stream and keeps the rebuilt scene in `snapshot`."""
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, recv_buffer=None):
+        self.host = host
+        self.port = port
+        self.recv_buffer = recv_buffer # Optional SO_RCVBUF, set before connecting
+        self.snapshot = None
+        self.tick = 0
+        self.keyframes = 0
+        self.deltas = 0
+        self.bytes_received = 0
+
+    async def run(self, stall=0.0):
+        """Applies messages until the server closes the connection.
+
+        `stall` stops reading for that many seconds after the first message, to simulate a watcher that falls behind.
+        """
+        if self.recv_buffer:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer)
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (self.host, self.port))
+            reader, writer = await asyncio.open_connection(sock=sock, limit=self.recv_buffer)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while True:
+                try:
+                    length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                    body = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError): # Game closed or went away
+                    return
+                kind, self.tick, self.snapshot = decode(body, self.snapshot)
+                self.bytes_received += LENGTH.size + length
+                if kind == MSG_KEYFRAME:
+                    self.keyframes += 1
+                else:
+                    self.deltas += 1
+                if stall:
+                    await asyncio.sleep(stall)
+                    stall = 0.0
+        finally:
+            writer.close()
+
+
+async def view(host, port):
+    """Opens a window and draws the watched game with the game's own drawing code."""
+    import pygame
+    import QBert
+    pygame.init()
+    screen = pygame.display.set_mode((QBert.SCREEN_WIDTH, QBert.SCREEN_HEIGHT))
+    pygame.display.set_caption(f"Q*bert spectator - {host}:{port}")
+    QBert.game_font = pygame.font.Font(None, QBert.DEFAULT_FONT_SIZE)
+    QBert.small_font = pygame.font.Font(None, QBert.SMALL_DEFAULT_FONT_SIZE)
+    session = QBert.GameSession() # Only used to hold and draw the watched state
+
+    client = SpectatorClient(host, port)
+    stream = asyncio.ensure_future(client.run())
+    while not stream.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                stream.cancel()
+        if client.snapshot is not None:
+            session.apply_snapshot(client.snapshot)
+            session.draw(screen)
+            pygame.display.flip()
+        await asyncio.sleep(1 / 30)
+    pygame.quit()
+
+
+def loopback_check(ticks=5000, watchers=4, tick_interval=0.001, stall=6.0):
+    """Plays random input into the game logic and checks every watcher rebuilds the final state,
+    and that a second server on the same port fails to start instead of hanging."""
+    import fuzzer # Headless game driver with a virtual clock
+
+    logging.disable(logging.CRITICAL)
+    game = fuzzer.load_game()
+    # Small socket buffers so the slow watcher runs into backpressure instead of kernel buffering
+    server = SpectatorServer(port=0, queue_limit=8, send_buffer=4096).start()
+    trace = fuzzer.generate_trace(random.Random(1), ticks)
+
+    async def watch_all():
+        clients = [SpectatorClient(port=server.port) for _ in range(watchers - 1)]
+        clients.append(SpectatorClient(port=server.port, recv_buffer=1024))
+        # The last watcher is deliberately slow to exercise the keyframe fallback
+        tasks = [asyncio.ensure_future(c.run(stall=stall if c is clients[-1] else 0)) for c in clients]
+        await asyncio.sleep(0.2)
+
+        session = fuzzer.new_session(game)
+        started = time.perf_counter()
+        for key, dt in trace:
+            fuzzer._clock.ticks += dt
+            session.update(fuzzer._clock.ticks, [fuzzer.KEY_CODES[key]] if key else [])
+            server.publish(session.snapshot())
+            await asyncio.sleep(tick_interval) # Let the watchers read while the "game" keeps ticking
+        publish_time = time.perf_counter() - started
+        final = session.snapshot()
+
+        deadline = time.monotonic() + 10
+        while any(c.snapshot != final for c in clients) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        return clients, publish_time, final
+
+    clients, publish_time, final = asyncio.run(watch_all())
+
+    # A second server on the same port must fail to start, not hang
+    try:
+        SpectatorServer(port=server.port).start().stop()
+        bind_ok = False
+        print("occupied port: MISMATCH, a second server started on it")
+    except OSError as e:
+        bind_ok = True
+        print(f"occupied port: OK  {e.__class__.__name__}: {e.strerror or e}")
+    server.stop()
+
+    ok = bind_ok
+    for i, client in enumerate(clients):
+        match = client.snapshot == final
+        ok &= match
+        print(f"watcher {i}: {'OK ' if match else 'MISMATCH'} keyframes={client.keyframes} "
+              f"deltas={client.deltas} bytes={client.bytes_received}")
+    print(f"{ticks} ticks published in {publish_time * 1000:.0f} ms, {server.deltas_dropped} deltas dropped for slow watchers")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a Q*bert game, or self-check the spectator stream.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    view_parser = sub.add_parser("view", help="open a window showing a live game")
+    view_parser.add_argument("--host", default="127.0.0.1")
+    view_parser.add_argument("--port", type=int, default=int(os.environ.get("QBERT_SPECTATOR_PORT", DEFAULT_PORT)))
+    loop_parser = sub.add_parser("loopback", help="stream a simulated game to local watchers and verify them")
+    loop_parser.add_argument("--ticks", type=int, default=5000)
+    loop_parser.add_argument("--watchers", type=int, default=4)
+    loop_parser.add_argument("--interval", type=float, default=0.001, help="seconds between simulated ticks")
+    loop_parser.add_argument("--stall", type=float, default=6.0, help="seconds the slow watcher stops reading")
+    args = parser.parse_args()
+
+    if args.command == "view":
+        asyncio.run(view(args.host, args.port))
+        return 0
+    return loopback_check(args.ticks, args.watchers, args.interval, args.stall)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""Gameplay telemetry: a compact event log and an offline analyzer.
+
+With QBERT_TELEMETRY_DIR set, the game appends one fixed-size binary record
+per event (moves, cube flips, deaths with their cause, disc rides, Coily
+being fooled, level starts/completions, game over) to rotated log files.
+emit() only packs the record and queues it; a background thread writes the
+queue in batches. The queue holds at most MAX_PENDING records; if a write
+fails (disk full, directory removed) the error is logged once and later
+events are dropped and counted, so the game never stalls or grows on it.
+
+    QBERT_TELEMETRY_DIR=telemetry python QBert.py
+    python telemetry.py analyze telemetry/          # death heatmaps, level timing percentiles
+
+The analyzer streams the logs in fixed-size chunks and keeps only counters
+and fixed-bucket histograms, so memory use does not grow with log size.
+
+File layout: a header (magic "QBEV", version u16, record size u16, wall-clock
+start time f64) followed by records of RECORD layout.
+"""
+import argparse
+import array
+import collections
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+
+logger = logging.getLogger("qbert.telemetry")
+
+LOG_MAGIC = b"QBEV"
+LOG_VERSION = 1
+FILE_HEADER = struct.Struct("<4sHHd")
+# type, detail (cause/side), row, col, level, pad, time in ms since the log started, value
+RECORD = struct.Struct("<BBbbHxxII")
+
+EVENT_GAME_START = 1
+EVENT_LEVEL_START = 2
+EVENT_MOVE = 3
+EVENT_CUBE_FLIP = 4       # detail: the cube's color step after the landing
+EVENT_DEATH = 5           # detail: DEATH_*
+EVENT_DISC_USE = 6        # detail: DISC_*
+EVENT_COILY_FOOLED = 7
+EVENT_LEVEL_COMPLETE = 8  # value: level duration in ms
+EVENT_GAME_OVER = 9       # value: final score
+EVENT_QUALITY_CHANGE = 10 # detail: new render quality level, value: mean frame work in microseconds
+EVENT_NAMES = {
+    EVENT_GAME_START: "game_start", EVENT_LEVEL_START: "level_start", EVENT_MOVE: "move",
+    EVENT_CUBE_FLIP: "cube_flip", EVENT_DEATH: "death", EVENT_DISC_USE: "disc_use",
+    EVENT_COILY_FOOLED: "coily_fooled", EVENT_LEVEL_COMPLETE: "level_complete", EVENT_GAME_OVER: "game_over",
+    EVENT_QUALITY_CHANGE: "quality_change",
+}
+
+DEATH_COILY = 1
+DEATH_BALL = 2
+DEATH_FALL = 3
+DEATH_CAUSES = {DEATH_COILY: "coily", DEATH_BALL: "ball", DEATH_FALL: "fall"}
+
+DISC_LEFT = 1
+DISC_RIGHT = 2
+
+MAX_FILE_BYTES = 16 * 1024 * 1024 # Rotate to a new file past this size
+FLUSH_INTERVAL = 1.0              # Seconds between batched writes
+FLUSH_BATCH = 4096                # Records that trigger an early write
+MAX_PENDING = 64 * 1024           # Queued records kept if the writer falls behind; older ones are dropped
+
+
+class TelemetryLog:
+    """Queues packed event records and writes them to rotated files from a background thread."""
+    def __init__(self, directory, max_file_bytes=MAX_FILE_BYTES, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self.level_started_ms = 0
+        self.records_written = 0
+        self.records_dropped = 0 # Queue overflow, or everything after a write error
+        self.failed = False      # Set once writing fails; events are dropped from then on
+        self._pending = collections.deque(maxlen=MAX_PENDING) # Packed records; deque appends/pops are thread-safe
+        self._file = None
+        self._file_index = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._writer = threading.Thread(target=self._run, name="qbert-telemetry", daemon=True)
+        self._writer.start()
+
+    def emit(self, event_type, level, row=0, col=0, detail=0, value=0):
+        """Records one event; called from the game thread, never touches the disk."""
+        if self.failed:
+            self.records_dropped += 1
+            return
+        now_ms = int((time.monotonic() - self.started) * 1000)
+        if event_type == EVENT_LEVEL_START:
+            self.level_started_ms = now_ms
+        elif event_type == EVENT_LEVEL_COMPLETE:
+            value = now_ms - self.level_started_ms
+        if len(self._pending) == MAX_PENDING:
+            self.records_dropped += 1 # The append below pushes out the oldest record
+        self._pending.append(RECORD.pack(event_type, detail, row, col, level, now_ms, value))
+        if len(self._pending) >= FLUSH_BATCH:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e: # Disk full, directory removed...: stop logging, keep the game running
+                self._fail(e)
+                return
+
+    def _fail(self, error):
+        self.failed = True
+        self.records_dropped += len(self._pending)
+        self._pending.clear()
+        logger.error("Telemetry writes to %s failed, dropping events from now on: %s", self.directory, error)
+
+    def flush(self):
+        """Writes every queued record in one batch, rotating files as they fill."""
+        batch = []
+        while self._pending:
+            batch.append(self._pending.popleft())
+        if not batch:
+            return
+        try:
+            if self._file is None or self._file.tell() >= self.max_file_bytes:
+                self._rotate()
+            self._file.write(b"".join(batch))
+            self._file.flush()
+        except OSError:
+            self.records_dropped += len(batch)
+            raise
+        self.records_written += len(batch)
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        self._file_index += 1
+        name = time.strftime("events-%Y%m%d-%H%M%S") + f"-{os.getpid()}-{self._file_index:04d}.qbev"
+        self._file = open(os.path.join(self.directory, name), "wb")
+        self._file.write(FILE_HEADER.pack(LOG_MAGIC, LOG_VERSION, RECORD.size, time.time()))
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._writer.join()
+        if not self.failed:
+            try:
+                self.flush()
+            except OSError as e:
+                self._fail(e)
+        if self.records_dropped:
+            logger.warning("Telemetry dropped %d events", self.records_dropped)
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass # Already reported; buffered bytes are lost either way
+            self._file = None
+
+
+# --- Offline analysis ---
+READ_CHUNK_RECORDS = 8192
+TIMING_BUCKET_MS = 1000  # Level duration histogram resolution
+TIMING_BUCKETS = 3600    # Up to an hour per level; longer levels land in the last bucket
+
+
+def iter_log_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".qbev"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def iter_records(path):
+    """Yields record tuples from one log file, reading it in fixed-size chunks."""
+    with open(path, "rb") as f:
+        magic, version, record_size, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != LOG_MAGIC or version != LOG_VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a version {LOG_VERSION} telemetry log")
+        while True:
+            chunk = f.read(RECORD.size * READ_CHUNK_RECORDS)
+            usable = len(chunk) - len(chunk) % RECORD.size # A crash can leave a partial last record
+            if not usable:
+                return
+            yield from RECORD.iter_unpack(chunk[:usable])
+
+
+def percentile_from_histogram(histogram, total, fraction):
+    if not total:
+        return None
+    rank = fraction * (total - 1)
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen > rank:
+            return (bucket + 0.5) * TIMING_BUCKET_MS / 1000
+    return None
+
+
+class Analysis:
+    """Running counters over any number of events; memory is bounded by pyramid size and level count."""
+    def __init__(self):
+        self.event_counts = collections.Counter()
+        self.deaths = collections.defaultdict(collections.Counter) # cause -> Counter((row, col))
+        self.level_times = {} # level -> array of TIMING_BUCKETS counts
+        self.level_completions = collections.Counter()
+        self.score_total = 0
+        self.quality_levels = collections.Counter() # Render quality level -> changes to it
+
+    def add(self, record):
+        event_type, detail, row, col, level, _, value = record
+        self.event_counts[event_type] += 1
+        if event_type == EVENT_DEATH:
+            self.deaths[detail][(row, col)] += 1
+        elif event_type == EVENT_LEVEL_COMPLETE:
+            histogram = self.level_times.get(level)
+            if histogram is None:
+                histogram = self.level_times[level] = array.array("I", bytes(4 * TIMING_BUCKETS))
+            histogram[min(value // TIMING_BUCKET_MS, TIMING_BUCKETS - 1)] += 1
+            self.level_completions[level] += 1
+        elif event_type == EVENT_GAME_OVER:
+            self.score_total += value
+        elif event_type == EVENT_QUALITY_CHANGE:
+            self.quality_levels[detail] += 1
+
+    def report(self, pyramid_rows=7):
+        lines = []
+        games = self.event_counts[EVENT_GAME_START]
+        game_overs = self.event_counts[EVENT_GAME_OVER]
+        lines.append(f"Games started: {games}, finished: {game_overs}"
+                     + (f", average final score {self.score_total / game_overs:.0f}" if game_overs else ""))
+        lines.append("Events: " + ", ".join(f"{EVENT_NAMES.get(t, t)}={n}" for t, n in sorted(self.event_counts.items())))
+
+        disc_uses = self.event_counts[EVENT_DISC_USE]
+        fooled = self.event_counts[EVENT_COILY_FOOLED]
+        if disc_uses:
+            lines.append(f"Disc rides: {disc_uses}, Coily fooled {fooled} times ({100 * fooled / disc_uses:.1f}%)")
+        if self.quality_levels:
+            lines.append("Render quality changes, by new level: "
+                         + ", ".join(f"{level}={n}" for level, n in sorted(self.quality_levels.items())))
+
+        for cause, name in DEATH_CAUSES.items():
+            counts = self.deaths.get(cause)
+            if not counts:
+                continue
+            lines.append("")
+            where = "cube jumped from" if cause == DEATH_FALL else "cube"
+            lines.append(f"Deaths by {name} ({sum(counts.values())}), per {where}:")
+            width = max(len(str(n)) for n in counts.values()) + 1
+            for row in range(pyramid_rows):
+                cells = "".join(f"{counts.get((row, col), 0):>{width}}" for col in range(row + 1))
+                lines.append(" " * (width * (pyramid_rows - row - 1) // 2) + cells)
+
+        if self.level_times:
+            lines.append("")
+            lines.append("Level completion time (s):   count    p50    p90    p99")
+            for level in sorted(self.level_times):
+                histogram, total = self.level_times[level], self.level_completions[level]
+                p50, p90, p99 = (percentile_from_histogram(histogram, total, f) for f in (0.5, 0.9, 0.99))
+                lines.append(f"  level {level:3}                {total:7} {p50:6.1f} {p90:6.1f} {p99:6.1f}")
+        return "\n".join(lines)
+
+
+def analyze(paths):
+    analysis = Analysis()
+    for path in iter_log_files(paths):
+        for record in iter_records(path):
+            analysis.add(record)
+    return analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze Q*bert telemetry logs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    analyze_parser = sub.add_parser("analyze", help="death heatmaps and level timing percentiles")
+    analyze_parser.add_argument("paths", nargs="+", help="log files or directories of .qbev files")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    analysis = analyze(args.paths)
+    print(analysis.report())
+    events = sum(analysis.event_counts.values())
+    print(f"\n{events} events analyzed in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())